@@ -1,38 +1,67 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# Первым импортом: отсюда отсчитывается время запуска
+from app.src.config import STARTUP, load_env
 import asyncio
+import signal
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from telegram import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import TelegramError
+from telegram import Bot, Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
 from app.src.google_books import GoogleBooksAPI
 from app.src.open_lib import OpenLibraryAPI
-from app.src.db import Database
-from dotenv import load_dotenv
+from app.src.db import Database, book_ref, parse_book_ref, provider_for
+from app.src.http_client import HttpClient
+from app.src.cache import TTLCache, SearchCache, shared_cache_from_env
+from app.src.dispatch import ChatOrderedUpdateProcessor
+from app.src.rate_limit import SendScheduler
+from app.src.providers import ProviderRouter
+from app.src.singleflight import SingleFlight
+from app.src.shared import ShardedIngress, UpdateWorker, backend_from_env
+from app.src.metrics import REGISTRY, MetricsServer, timed_handler
+from app.src.tracing import TRACER, span
 import logging
-import requests
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from html import escape
 
 
-load_dotenv()
+load_env()
+STARTUP.mark("imports")
 
 class BookBot:
     def __init__(self, engine=None, session=None):
-        self.google_api = GoogleBooksAPI()
-        self.open_lib_api = OpenLibraryAPI()
-        if not engine:
-            self.engine = create_engine(os.getenv("DB_URL"))
-        else:
-            self.engine = engine
-        Base = declarative_base()
-        Base.metadata.create_all(self.engine)
-        if not session:
-            self.session = sessionmaker(bind=self.engine)
-        else:
-            self.session = session
-        self.db = Database(engine, self.session)
-        self.application = Application.builder().token(os.getenv("TELEGRAM_TOKEN")).build()
-        
+        # Общий пул соединений для обоих API
+        self.http = HttpClient()
+        self.google_api = GoogleBooksAPI(self.http)
+        self.search_cache = SearchCache(shared=shared_cache_from_env())
+        # Записи книг из выдачи, чтобы добавление в избранное не ходило в сеть
+        self.book_cache = TTLCache(
+            int(os.getenv("BOOK_CACHE_SIZE", 10000)),
+            float(os.getenv("BOOK_CACHE_TTL", 3600))
+        )
+        # Одновременные одинаковые поиски и запросы книги по ID делят один запрос к API
+        self.flights = SingleFlight()
+        self.page_size = int(os.getenv("FAVORITES_PAGE_SIZE", 10))
+        # album - обложки альбомом и одно сообщение с кнопками, messages - сообщение на книгу
+        self.output_mode = os.getenv("OUTPUT_MODE", "album")
+        # Database сама создаёт синхронный или асинхронный движок по DB_URL.
+        # Схема проверяется при первом запросе, а не здесь
+        self.db = Database(engine, session)
+        self.engine = self.db.engine
+        self.session = self.db.Session
+        # Имена авторов OpenLibrary можно дополнительно хранить в БД
+        author_store = self.db if os.getenv("AUTHOR_CACHE_PERSIST", "1") == "1" else None
+        self.open_lib_api = OpenLibraryAPI(self.http, author_store=author_store)
+        # Порядок провайдеров задаёт приоритет: Google, затем OpenLibrary
+        self.search_router = ProviderRouter([self.google_api, self.open_lib_api])
+        # Разные чаты обрабатываются параллельно, сообщения одного чата - по порядку
+        self.update_processor = ChatOrderedUpdateProcessor(int(os.getenv("UPDATE_CONCURRENCY", 16)))
+        # Все исходящие запросы к Bot API проходят через лимиты Telegram
+        self.send_scheduler = SendScheduler()
+        # Application (HTTP-клиенты Bot API) создаётся при первом обращении
+        self.token = os.getenv("TELEGRAM_TOKEN")
+        self.api_url = telegram_api_url()
+        self._application = None
+
         self.reply_keyboard = ReplyKeyboardMarkup(
             keyboard=[
                 [KeyboardButton("ℹ Помощь")],
@@ -41,12 +70,38 @@ class BookBot:
             resize_keyboard=True,
             input_field_placeholder="Введите название книги"
         )
-        
-        self.application.add_handler(CommandHandler("start", self.start))
-        self.application.add_handler(MessageHandler(filters.Regex(r'^ℹ Помощь$'), self.help))
-        self.application.add_handler(MessageHandler(filters.Regex(r'^⭐ Избранное$'), self.show_favorites))
-        self.application.add_handler(MessageHandler(filters.TEXT, self.search_books))
-        self.application.add_handler(CallbackQueryHandler(self.handle_button_click))
+
+        # Датчики снимаются только при запросе /metrics и не нагружают обработку обновлений
+        REGISTRY.collector("bot", self._collect_metrics)
+        metrics_port = int(os.getenv("METRICS_PORT", 0))
+        self.metrics_server = MetricsServer(port=metrics_port) if metrics_port else None
+        STARTUP.mark("bot")
+
+    @property
+    def application(self):
+        if self._application is None:
+            self._application = self._build_application()
+        return self._application
+
+    def _build_application(self):
+        with STARTUP.phase("application"):
+            application = (
+                Application.builder()
+                .token(self.token)
+                .base_url(self.api_url + "/bot")
+                .base_file_url(self.api_url + "/file/bot")
+                .concurrent_updates(self.update_processor)
+                .rate_limiter(self.send_scheduler)
+                .post_init(self._post_init)
+                .post_shutdown(self._shutdown)
+                .build()
+            )
+            application.add_handler(CommandHandler("start", self.start))
+            application.add_handler(MessageHandler(filters.Regex(r'^ℹ Помощь$'), self.help))
+            application.add_handler(MessageHandler(filters.Regex(r'^⭐ Избранное$'), self.show_favorites))
+            application.add_handler(MessageHandler(filters.TEXT, self.search_books))
+            application.add_handler(CallbackQueryHandler(self.handle_button_click))
+        return application
 
     async def start(self, update, context):
         await update.message.reply_text(
@@ -65,6 +120,7 @@ class BookBot:
             reply_markup=self.reply_keyboard
         )
 
+    @timed_handler("search_books")
     async def search_books(self, update, context):
         query = update.message.text
         if not query:
@@ -72,26 +128,32 @@ class BookBot:
             return
         
         try:
-            books = await self.google_api.search_books(query)
+            books = await self.search_router.search(query, self._search_provider)
             if not books:
-                books = await self.open_lib_api.search_books(query)
-                if not books:
-                    await update.message.reply_text("Книги не найдены 😢\nПопробуйте другой запрос")
-                    return
+                await update.message.reply_text("Книги не найдены 😢\nПопробуйте другой запрос")
+                return
+
+            if self.output_mode == "album":
+                await self._send_covers(update.message, books)
+                msg, reply_markup = self._render_search_results(books)
+                await update.message.reply_text(
+                    msg,
+                    parse_mode="HTML",
+                    reply_markup=reply_markup
+                )
+                return
             
             for book in books:
-                book["user_id"] = update.effective_user.id
-                
-                msg = f"📖 <b>{book['title']}</b>\n👤 {book['authors']}\n\n{book.get('description', 'Описание отсутствует')[:500]}..."
+                msg = f"📖 <b>{book.title}</b>\n👤 {book.authors}\n\n{str(book.description or 'Описание отсутствует')[:500]}..."
                 
                 keyboard = [[
-                    InlineKeyboardButton("⭐ Добавить в избранное", callback_data=f"add_{book['id']}")
+                    InlineKeyboardButton("⭐ Добавить в избранное", callback_data=f"add_{book.id}")
                 ]]
                 reply_markup = InlineKeyboardMarkup(keyboard)
                 
-                if book.get("thumbnail"):
+                if book.thumbnail:
                     await update.message.reply_photo(
-                        photo=book["thumbnail"],
+                        photo=book.thumbnail,
                         caption=msg,
                         parse_mode="HTML",
                         reply_markup=reply_markup
@@ -107,142 +169,408 @@ class BookBot:
             logging.error(f"Ошибка поиска: {e}")
             await update.message.reply_text("Произошла ошибка при поиске")
 
+    def _render_search_results(self, books):
+        """Сводка результатов поиска с нумерованными кнопками добавления"""
+        lines = []
+        buttons = []
+        for number, book in enumerate(books, 1):
+            description = str(book.description or "Описание отсутствует")[:300]
+            lines.append(
+                f"{number}. 📖 <b>{escape(book.title or '')}</b>\n"
+                f"👤 {escape(book.authors or '')}\n{escape(description)}..."
+            )
+            buttons.append(InlineKeyboardButton(f"⭐ {number}", callback_data=f"add_{book.id}"))
+        keyboard = [buttons[i:i + 5] for i in range(0, len(buttons), 5)]
+        return "\n\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+    async def _send_covers(self, message, books):
+        """Отправляет обложки книг альбомами до 10 фото, подписывая номером из списка.
+
+        Обложки необязательны: ошибка отправки (например, недоступный URL картинки)
+        только логируется, чтобы список с кнопками всё равно дошёл до пользователя.
+        """
+        try:
+            await self._send_cover_albums(message, books)
+        except TelegramError as e:
+            logging.error(f"Ошибка отправки обложек: {e}")
+
+    async def _send_cover_albums(self, message, books):
+        covers = [
+            (number, book) for number, book in enumerate(books, 1) if book.thumbnail
+        ]
+        if len(covers) == 1:
+            # Альбом должен содержать минимум две фотографии
+            number, book = covers[0]
+            await message.reply_photo(
+                photo=book.thumbnail,
+                caption=f"{number}. <b>{escape(book.title or '')}</b>",
+                parse_mode="HTML"
+            )
+            return
+        for i in range(0, len(covers), 10):
+            await message.reply_media_group(media=[
+                InputMediaPhoto(
+                    media=book.thumbnail,
+                    caption=f"{number}. <b>{escape(book.title or '')}</b>",
+                    parse_mode="HTML"
+                )
+                for number, book in covers[i:i + 10]
+            ])
+
+    def _mark_added(self, markup, data):
+        """Заменяет нажатую кнопку добавления отметкой, сохраняя остальные"""
+        if not isinstance(markup, InlineKeyboardMarkup) or sum(len(row) for row in markup.inline_keyboard) < 2:
+            return InlineKeyboardMarkup([
+                [InlineKeyboardButton("✅ В избранном", callback_data="none")]
+            ])
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton(f"✅ {button.text.lstrip('⭐ ')}", callback_data="none")
+                if button.callback_data == data else button
+                for button in row
+            ]
+            for row in markup.inline_keyboard
+        ])
+
+    async def _search_provider(self, api, query, max_results=5):
+        """Ищет книги у провайдера, используя кэш результатов поиска"""
+        key = (api.PROVIDER, query, max_results, api.LANGUAGE)
+        books = await self.search_cache.get(*key)
+        if books is None:
+            async def fetch():
+                books = await api.search_books(query, max_results)
+                # Пустая выдача из-за сбоя провайдера не кэшируется
+                if books or not api.health.failing():
+                    await self.search_cache.set(*key, books)
+                return books
+            books = await self.flights.do(self.search_cache.make_key(*key), fetch)
+        # Кэш книг хранит те же неизменяемые записи, что и кэш выдачи, без копий
+        for book in books:
+            self.book_cache.set(book.id, book)
+        return books
+
+    @timed_handler("show_favorites")
     async def show_favorites(self, update, context):
         try:
-            favorites = await self.db.get_favorites(update.effective_user.id)
-            if not favorites:
+            page = await self.db.get_favorites_page(update.effective_user.id, limit=self.page_size)
+            if not page["books"]:
                 await update.message.reply_text("У вас пока нет избранных книг")
                 return
-            
-            for book in favorites:
-                msg = f"⭐ <b>{book['title']}</b>\n👤 {book['authors']}\n\n{book.get('description', '')[:500]}..."
-                
-                keyboard = [[
-                    InlineKeyboardButton("❌ Удалить из избранного", callback_data=f"remove_{book['id']}")
-                ]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                if book.get("thumbnail"):
-                    await update.message.reply_photo(
-                        photo=book["thumbnail"],
-                        caption=msg,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await update.message.reply_text(
-                        msg,
-                        parse_mode="HTML",
-                        reply_markup=reply_markup
-                    )
+
+            # Без обложек: страницы листаются правкой текста, и альбом первой
+            # страницы расходился бы с книгами на остальных
+            msg, reply_markup = self._render_favorites_page(page)
+            await update.message.reply_text(
+                msg,
+                parse_mode="HTML",
+                reply_markup=reply_markup
+            )
                     
         except Exception as e:
             logging.error(f"Ошибка получения избранного: {e}")
             await update.message.reply_text("Ошибка при загрузке избранного")
+
+    def _render_favorites_page(self, page):
+        """Текст страницы избранного со списком книг и кнопки удаления и навигации"""
+        lines = ["⭐ <b>Избранное</b>"]
+        remove_buttons = []
+        for number, book in enumerate(page["books"], 1):
+            lines.append(f"{number}. <b>{escape(book.title or '')}</b>\n👤 {escape(book.authors or '')}")
+            # Курсор начала страницы нужен, чтобы перерисовать её после удаления, а провайдер -
+            # чтобы удалить ту самую запись: ID тома Google тоже может начинаться с OL
+            ref = book_ref(book.provider or provider_for(book.id), book.id)
+            remove_buttons.append(InlineKeyboardButton(f"❌ {number}", callback_data=f"unfav_{page['start']}|{ref}"))
+        keyboard = [remove_buttons[i:i + 5] for i in range(0, len(remove_buttons), 5)]
+        navigation = []
+        if page["prev"]:
+            navigation.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"favprev_{page['prev']}"))
+        if page["next"]:
+            navigation.append(InlineKeyboardButton("Далее ➡️", callback_data=f"favnext_{page['next']}"))
+        if navigation:
+            keyboard.append(navigation)
+        return "\n\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+    async def _edit_favorites_page(self, query, user_id, cursor=None, direction="after"):
+        """Перерисовывает сообщение со страницей избранного"""
+        page = await self.db.get_favorites_page(user_id, cursor, direction, self.page_size)
+        if not page["books"] and cursor:
+            # Соседней страницы больше нет: показываем первую
+            page = await self.db.get_favorites_page(user_id, limit=self.page_size)
+        if not page["books"]:
+            await query.edit_message_text("У вас пока нет избранных книг")
+            return
+        msg, reply_markup = self._render_favorites_page(page)
+        await query.edit_message_text(msg, parse_mode="HTML", reply_markup=reply_markup)
+
+    @timed_handler("handle_button_click")
     async def handle_button_click(self, update, context):
         query = update.callback_query
-        await query.answer()
-    
         user_id = query.from_user.id
         data = query.data
-    
-        if data == "none":
-            return
+        # На callback можно ответить только один раз: текст предупреждения выбирается
+        # по ходу обработки, а ответ отправляется в конце
+        alert = None
         try:
+            if data == "none":
+                return
             action, book_id = data.split("_", 1)
         
             if action == "add":
                 book_data = await self._get_book_data(book_id)
                 if book_data:
-                    #print("if")        
-
-                    book_data["user_id"] = user_id
-                    await self.db.add_favorite(book_data)
+                    # Запись из кэша передаётся как есть, пользователь - отдельно
+                    await self.db.add_favorite(book_data, user_id)
                     await query.edit_message_reply_markup(
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("✅ В избранном", callback_data="none")]
-                        ])
+                        reply_markup=self._mark_added(query.message.reply_markup, data)
                     )
                 else:
-                    await query.answer("Не удалось найти данные книги", show_alert=True)
+                    alert = "Не удалось найти данные книги"
                 
             elif action == "remove":
                 success = await self.db.remove_favorite(user_id, book_id)
                 if success:
                     await query.message.delete()
                 else:
-                    await query.answer("Книга не найдена в избранном", show_alert=True)
+                    alert = "Книга не найдена в избранном"
+
+            elif action == "unfav":
+                if "|" in book_id:
+                    start, ref = book_id.split("|", 1)
+                else:
+                    # Кнопки, отправленные до появления провайдера в callback-данных
+                    start, ref = book_id.rsplit(":", 1)
+                provider, book_id = parse_book_ref(ref)
+                if not await self.db.remove_favorite(user_id, book_id, provider):
+                    alert = "Книга не найдена в избранном"
+                # Страница перерисовывается и тогда, когда книгу уже удалили раньше
+                await self._edit_favorites_page(query, user_id, start, "from")
+
+            elif action in ("favnext", "favprev"):
+                direction = "after" if action == "favnext" else "before"
+                await self._edit_favorites_page(query, user_id, book_id, direction)
                 
         except Exception as e:
             logging.error(f"Ошибка: {e}")
+        finally:
+            if alert:
+                await query.answer(alert, show_alert=True)
+            else:
+                await query.answer()
+
     async def _get_book_data(self, book_id):
+        """Получает данные книги по ID: из кэша выдачи, а при промахе из API"""
+        with span("get_book_data", book_id=book_id) as current:
+            book_data = self.book_cache.get(book_id)
+            current.set_tag("cached", book_data is not None)
+            if book_data is None:
+                book_data = await self.flights.do(f"book:{book_id}", lambda: self._fetch_and_cache(book_id))
+            return book_data
+
+    async def _fetch_and_cache(self, book_id):
+        book_data = await self._fetch_book_data(book_id)
+        if book_data:
+            self.book_cache.set(book_id, book_data)
+        return book_data
+
+    async def _fetch_book_data(self, book_id):
         """Получает полные данные книги по ID из доступных API"""
         try:
             # Пробуем получить из Google Books API
             if not book_id.startswith('OL'):  # Google Books ID обычно не начинается с OL
-                google_params = {
-                    "key": os.getenv("GOOGLE_BOOKS_API_KEY"),
-                    "q": f"{book_id}"
-                }
-                response = requests.get(self.google_api.BASE_URL, params=google_params)
-                response.raise_for_status()
-                data = response.json()
-                if data.get('items'):
-                    #print('items')
-                    item = data['items'][0]
-                    volume = item.get('volumeInfo', {})
-                    return {
-                        "id": item.get('id'),
-                        "title": volume.get('title'),
-                        "authors": ", ".join(volume.get('authors', ["Неизвестен"])),
-                        "description": volume.get('description', "Нет описания"),
-                        "thumbnail": volume.get('imageLinks', {}).get('thumbnail')
-                    }
+                book_data = await self.google_api.get_book(book_id)
+                if book_data:
+                    return book_data
     
             # Если не нашли в Google Books, пробуем Open Library
             if book_id.startswith('OL') or not book_id:  # Open Library ID обычно начинается с OL
-                with self.open_lib_api.session.get(
-                    f"{self.open_lib_api.BASE_URL}/works/{book_id}.json"
-                ) as response:
-                    response.raise_for_status()
-                    work_data = response.json()
-                    description = work_data.get('description')
-                    if isinstance(description, dict):
-                        description = description.get('value', "Нет описания")
-                    
-                    # Получаем обложку отдельно
-                    cover_id = work_data.get('covers', [None])[0]
-                    thumbnail = f"https://covers.openlibrary.org/b/id/{cover_id}-M.jpg" if cover_id else None
-                    
-                    # Получаем авторов
-                    authors = []
-                    if work_data.get('authors'):
-                        for author in work_data['authors']:
-                            if isinstance(author, dict) and author.get('author'):
-                                author_key = author['author'].get('key')
-                                if author_key:
-                                    with self.open_lib_api.session.get(
-                                        f"{self.open_lib_api.BASE_URL}{author_key}.json"
-                                    ) as author_resp:
-                                        author_resp.raise_for_status()
-                                        author_data = author_resp.json()
-                                        authors.append(author_data.get('name', 'Неизвестный автор'))
-                    
-                    return {
-                        "id": book_id,
-                        "title": work_data.get('title', 'Без названия'),
-                        "authors": ", ".join(authors) if authors else "Неизвестен",
-                        "description": description or "Нет описания",
-                        "thumbnail": thumbnail
-                    }
+                return await self.open_lib_api.get_book(book_id)
     
         except Exception as e:
-            print(f"Ошибка добавления в избранное: {e}")
+            logging.error(f"Ошибка добавления в избранное: {e}")
         return None
+
+    def _queue_depth(self):
+        # Сбор метрик не должен строить Application: до первого обращения очередь пуста
+        return self._application.update_queue.qsize() if self._application is not None else 0
+
+    def dispatch_stats(self):
+        """Глубина очереди обновлений, число обновлений в обработке, состояние провайдеров и очереди отправки"""
+        return {
+            "queue_depth": self._queue_depth(),
+            **self.update_processor.stats(),
+            "flights": self.flights.stats(),
+            "providers": {
+                api.PROVIDER: api.health.stats() for api in (self.google_api, self.open_lib_api)
+            },
+            "send": self.send_scheduler.stats()
+        }
+
+    def _collect_metrics(self):
+        """Текущие значения датчиков для /metrics"""
+        dispatch = self.update_processor.stats()
+        send = self.send_scheduler.stats()
+        caches = {
+            "search": self.search_cache.stats(),
+            "book": self.book_cache.stats(),
+            "author": self.open_lib_api.authors.cache.stats()
+        }
+        providers = (self.google_api, self.open_lib_api)
+        return [
+            ("bot_update_queue_depth", "Обновления, ожидающие в очереди Application",
+             [({}, self._queue_depth())]),
+            ("bot_updates_in_flight", "Обновления в обработке", [({}, dispatch["in_flight"])]),
+            ("bot_updates_waiting", "Обновления, ждущие свой чат или общий слот", [({}, dispatch["waiting"])]),
+            ("bot_send_waiting", "Исходящие запросы в очереди отправки", [({}, send["waiting"])]),
+            ("bot_send_retries_total", "Повторы исходящих запросов после RetryAfter",
+             [({}, send["retries"])], "counter"),
+            ("cache_hits_total", "Попадания в кэш",
+             [({"cache": name}, stats["hits"]) for name, stats in caches.items()], "counter"),
+            ("cache_misses_total", "Промахи кэша",
+             [({"cache": name}, stats["misses"]) for name, stats in caches.items()], "counter"),
+            ("cache_size", "Записей в кэше", [({"cache": name}, stats["size"]) for name, stats in caches.items()]),
+            ("singleflight_coalesced_total", "Запросы, присоединённые к уже выполняющимся",
+             [({}, self.flights.stats()["coalesced"])], "counter"),
+            ("upstream_breaker_open", "Автомат провайдера разомкнут (1) или нет (0)",
+             [({"provider": api.PROVIDER}, int(api.health.state != "closed")) for api in providers]),
+            ("upstream_timeout_seconds", "Текущий адаптивный таймаут провайдера",
+             [({"provider": api.PROVIDER}, api.health.timeout()) for api in providers]),
+            ("http_pool_waits_total", "Запросы к API книг, ждавшие свободное соединение пула",
+             [({}, self.http.stats()["pool_waits"])], "counter"),
+            ("db_pool_connections", "Соединения пула БД по состоянию",
+             [({"state": name}, value) for name, value in self.db.pool_stats().items()]),
+            ("bot_startup_seconds", "Длительность этапов запуска",
+             [({"phase": name}, seconds) for name, seconds in STARTUP.phases.items()]),
+        ]
+
+    async def _post_init(self, application):
+        # Инициализация Application: запрос getMe к Bot API
+        STARTUP.mark("initialize")
+        await self.db.check_schema()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+
+    async def _shutdown(self, application):
+        """Закрывает пулы HTTP-соединений и соединений с БД и выгружает оставшиеся трассы при остановке бота"""
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.http.close()
+        await self.db.close()
+        await TRACER.close()
+
+    async def run_webhook(self):
+        """Принимает обновления через встроенный webhook-сервер вместо long polling"""
+        path = os.getenv("WEBHOOK_PATH", "/telegram")
+        secret_token = os.getenv("WEBHOOK_SECRET")
+        server = webhook_server_from_env(self.application)
+        stop = stop_event()
+
+        async with self.application:
+            await self.application.start()
+            if os.getenv("WEBHOOK_URL"):
+                await self.application.bot.set_webhook(
+                    os.getenv("WEBHOOK_URL") + path,
+                    secret_token=secret_token,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            await self._post_init(self.application)
+            await server.start()
+            try:
+                await stop.wait()
+            finally:
+                await server.stop()
+                await self.application.stop()
+        await self._shutdown(self.application)
+
+    async def run_worker(self):
+        """Обрабатывает обновления своей очереди в общем хранилище (BOT_MODE=worker)"""
+        backend = backend_from_env()
+        if backend is None:
+            raise RuntimeError("Для режима worker нужен SHARED_BACKEND_URL")
+        worker = UpdateWorker(self.application, backend)
+        stop = stop_event()
+
+        async with self.application:
+            await self.application.start()
+            await self._post_init(self.application)
+            try:
+                await worker.run(stop)
+            finally:
+                await self.application.stop()
+        await self._shutdown(self.application)
+
     def run(self):
-        self.application.run_polling()
+        mode = os.getenv("BOT_MODE", "polling")
+        if mode == "webhook":
+            asyncio.run(self.run_webhook())
+        elif mode == "worker":
+            asyncio.run(self.run_worker())
+        else:
+            self.application.run_polling()
 
-if __name__ == "__main__":
-    bot = BookBot()
-    bot.run()
 
+def telegram_api_url():
+    """Адрес Bot API: по умолчанию api.telegram.org, либо свой сервер или стенд бенчмарка"""
+    return os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+
+def stop_event():
+    """Событие, которое устанавливается по SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+def webhook_server_from_env(application=None, ingress=None):
+    # aiohttp.web нужен только webhook-режимам
+    from app.src.webhook import WebhookServer
+    return WebhookServer(
+        application,
+        secret_token=os.getenv("WEBHOOK_SECRET"),
+        path=os.getenv("WEBHOOK_PATH", "/telegram"),
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", 8080)),
+        ingress=ingress
+    )
+
+
+async def run_ingress():
+    """Принимает webhook и раскладывает обновления по очередям WORKERS обработчиков (BOT_MODE=ingress).
+
+    Процессу приёма не нужны БД и API книг, поэтому BookBot он не создаёт.
+    """
+    backend = backend_from_env()
+    if backend is None:
+        raise RuntimeError("Для режима ingress нужен SHARED_BACKEND_URL")
+    server = webhook_server_from_env(ingress=ShardedIngress(backend))
+    metrics_port = int(os.getenv("METRICS_PORT", 0))
+    metrics_server = MetricsServer(port=metrics_port) if metrics_port else None
+    stop = stop_event()
+    if os.getenv("WEBHOOK_URL"):
+        async with Bot(os.getenv("TELEGRAM_TOKEN"), base_url=telegram_api_url() + "/bot") as bot:
+            await bot.set_webhook(
+                os.getenv("WEBHOOK_URL") + server.path,
+                secret_token=server.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+    await server.start()
+    if metrics_server is not None:
+        await metrics_server.start()
+    try:
+        await stop.wait()
+    finally:
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # httpx пишет в INFO каждый запрос к Bot API, включая getUpdates
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if os.getenv("BOT_MODE") == "ingress":
+        asyncio.run(run_ingress())
+    else:
+        bot = BookBot()
+        bot.run()
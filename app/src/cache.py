@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from app.src.config import load_env
+from app.src.records import BookRecord
+
+load_env()
+
+
+class TTLCache:
+    """LRU-кэш в памяти процесса с ограниченным размером и временем жизни записей"""
+
+    def __init__(self, maxsize=1024, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # ключ -> (время истечения, значение)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Возвращает значение и помечает его как недавно использованное"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет значение, вытесняя самые старые записи при переполнении"""
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class RedisCache:
+    """Общий уровень кэша в Redis, доступный нескольким процессам бота"""
+
+    def __init__(self, url, prefix="kpo:"):
+        # redis - необязательная зависимость, нужна только для общего кэша
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=max(1, int(ttl)))
+
+
+def shared_cache_from_env():
+    """Создаёт общий уровень кэша, если он настроен в окружении"""
+    # Общий кэш хранится в том же хранилище, что и очереди обработчиков
+    from app.src.shared import backend_from_env
+    return backend_from_env()
+
+
+def pack_books(books):
+    """Список книг для общего кэша: записи в виде списков значений, без имён полей"""
+    return [book.pack() for book in books]
+
+
+def unpack_books(values):
+    # Словари - формат записей, сохранённых до перехода на BookRecord
+    return [BookRecord.from_dict(value) if isinstance(value, dict) else BookRecord.unpack(value) for value in values]
+
+
+class SearchCache:
+    """Кэш результатов поиска: LRU в процессе плюс необязательный общий уровень.
+
+    В процессе хранятся сами записи BookRecord, в общем уровне - их компактная форма.
+    """
+
+    def __init__(self, maxsize=None, ttl=None, negative_ttl=None, shared=None):
+        self.ttl = float(ttl or os.getenv("SEARCH_CACHE_TTL", 6 * 3600))
+        # Пустые результаты кэшируются ненадолго
+        self.negative_ttl = float(negative_ttl or os.getenv("SEARCH_CACHE_NEGATIVE_TTL", 60))
+        self.local = TTLCache(int(maxsize or os.getenv("SEARCH_CACHE_SIZE", 2048)), self.ttl)
+        self.shared = shared
+        self.shared_hits = 0
+
+    @staticmethod
+    def make_key(provider, query, max_results, language):
+        """Ключ из нормализованного запроса, провайдера, лимита и языка"""
+        normalized = " ".join(query.lower().split())
+        return f"search:{provider}:{language}:{max_results}:{normalized}"
+
+    async def get(self, provider, query, max_results, language):
+        """Возвращает закэшированный список книг или None, если его нет"""
+        key = self.make_key(provider, query, max_results, language)
+        books = self.local.get(key)
+        if books is not None or self.shared is None:
+            return books
+        try:
+            books = await self.shared.get(key)
+            if books is not None:
+                books = unpack_books(books)
+        except Exception as e:
+            logging.error(f"Ошибка общего кэша: {e}")
+            return None
+        if books is not None:
+            self.shared_hits += 1
+            self.local.set(key, books, self._ttl_for(books))
+        return books
+
+    async def set(self, provider, query, max_results, language, books):
+        key = self.make_key(provider, query, max_results, language)
+        ttl = self._ttl_for(books)
+        self.local.set(key, books, ttl)
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, pack_books(books), ttl)
+            except Exception as e:
+                logging.error(f"Ошибка общего кэша: {e}")
+
+    def _ttl_for(self, books):
+        return self.ttl if books else self.negative_ttl
+
+    def stats(self):
+        return {**self.local.stats(), "shared_hits": self.shared_hits}
@@ -0,0 +1,63 @@
+import time
+import logging
+from contextlib import contextmanager
+
+_loaded = False
+
+
+def load_env():
+    """Загружает .env один раз на процесс; модули вызывают её при импорте"""
+    global _loaded
+    if _loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _loaded = True
+
+
+class StartupTimer:
+    """Разбивка времени запуска по этапам: импорты, создание бота, Application, схема БД, первое обновление.
+
+    Отсчёт идёт от импорта этого модуля, т.е. практически от старта процесса.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+        self.first_update = None
+
+    def mark(self, name):
+        """Записывает время от предыдущей отметки как этап name"""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        """Время блока как этап name (без учёта того, что было до него)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + now - started
+            self._last = now
+
+    def update_handled(self):
+        """Отмечает первое обработанное обновление и выводит разбивку запуска"""
+        if self.first_update is not None:
+            return
+        self.first_update = time.perf_counter() - self.started
+        logging.info(self.report())
+
+    def report(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in self.phases.items())
+        total = f"{self.first_update * 1000:.0f} мс до первого обновления" if self.first_update is not None else ""
+        return f"Запуск: {'; '.join(part for part in (phases, total) if part)}"
+
+    def stats(self):
+        return {"phases": dict(self.phases), "first_update": self.first_update}
+
+
+STARTUP = StartupTimer()
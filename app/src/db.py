@@ -1,77 +1,377 @@
-from sqlalchemy import create_engine, Column, String, Text, BigInteger
+from sqlalchemy import create_engine, Column, String, Text, BigInteger, DateTime, Index, ForeignKeyConstraint, and_, delete, literal, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
+from app.src.config import STARTUP, load_env
+from datetime import datetime, timedelta, timezone
 import os
+import time
+import asyncio
+from app.src.metrics import DB_LATENCY, DB_ERRORS
+from app.src.tracing import span
+from app.src.records import BookRecord
 
-load_dotenv()
+load_env()
 Base = declarative_base()
 
-class FavoriteBook(Base):
-    __tablename__ = "favorite_books"
-    id = Column(String, primary_key=True)  # ID книги из API
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def provider_for(book_id):
+    """Угадывает провайдера по ID книги, когда он неизвестен: ID OpenLibrary начинаются с OL.
+
+    Только для записей без провайдера и старых курсоров: ID тома Google тоже
+    может начинаться с OL, поэтому сохранённое избранное ищется по своему провайдеру.
+    """
+    return "openlibrary" if book_id.startswith("OL") else "google"
+
+# Однобуквенные коды провайдеров, чтобы курсоры помещались в 64 байта callback-данных
+PROVIDER_CODES = {"google": "g", "openlibrary": "o"}
+CODE_PROVIDERS = {code: provider for provider, code in PROVIDER_CODES.items()}
+
+def book_ref(provider, book_id):
+    """Ссылка на книгу в избранном: '<код провайдера>:<ID книги>'"""
+    return f"{PROVIDER_CODES.get(provider, provider)}:{book_id}"
+
+def parse_book_ref(ref):
+    """(провайдер, ID) из book_ref; в ссылке без кода провайдер определяется по ID"""
+    code, sep, book_id = ref.partition(":")
+    if not sep:
+        return provider_for(ref), ref
+    return CODE_PROVIDERS.get(code, code), book_id
+
+EPOCH = datetime(1970, 1, 1)
+
+def encode_cursor(added_at, provider, book_id):
+    """Позиция книги в избранном для keyset-пагинации: '<микросекунды>:<код провайдера>:<ID книги>'"""
+    return f"{(added_at - EPOCH) // timedelta(microseconds=1)}:{book_ref(provider, book_id)}"
+
+def decode_cursor(cursor):
+    """(added_at, провайдер, ID) из курсора; принимает и старые курсоры '<микросекунды>:<ID>'"""
+    micros, ref = cursor.split(":", 1)
+    return (EPOCH + timedelta(microseconds=int(micros)), *parse_book_ref(ref))
+
+class Book(Base):
+    """Общий каталог книг: метаданные хранятся один раз на книгу"""
+    __tablename__ = "books"
+    provider = Column(String, primary_key=True)  # google или openlibrary
+    book_id = Column(String, primary_key=True)  # ID книги из API
     title = Column(String)
     authors = Column(String)
     description = Column(Text)
     thumbnail_url = Column(String)
-    user_id = Column(BigInteger)  # ID пользователя Telegram
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+class FavoriteBook(Base):
+    """Связь пользователя с книгой из каталога"""
+    __tablename__ = "favorite_books"
+    user_id = Column(BigInteger, primary_key=True)  # ID пользователя Telegram
+    provider = Column(String, primary_key=True)
+    book_id = Column(String, primary_key=True)
+    added_at = Column(DateTime, nullable=False, default=utcnow)
+    __table_args__ = (
+        ForeignKeyConstraint(["provider", "book_id"], ["books.provider", "books.book_id"]),
+        # Список избранного пользователя в порядке добавления читается только из индекса
+        Index("idx_favorite_books_user_added", "user_id", "added_at", "provider", "book_id"),
+    )
+
+class Author(Base):
+    __tablename__ = "authors"
+    key = Column(String, primary_key=True)  # Ключ автора OpenLibrary, например /authors/OL1A
+    name = Column(String)
+
+def create_engine_from_env(url=None):
+    """Создаёт движок по DB_URL: асинхронный для async-драйверов (postgresql+asyncpg), иначе синхронный"""
+    url = make_url(url or os.getenv("DB_URL"))
+    is_async = url.get_dialect().is_async
+    kwargs = {}
+    if url.get_backend_name() != "sqlite":
+        kwargs = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"
+        }
+        statement_timeout = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))  # миллисекунды, 0 - без ограничения
+        if statement_timeout and url.get_backend_name() == "postgresql":
+            if url.get_driver_name() == "asyncpg":
+                kwargs["connect_args"] = {"server_settings": {"statement_timeout": str(statement_timeout)}}
+            else:
+                kwargs["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    if is_async:
+        # sqlalchemy.ext.asyncio нужен только асинхронным драйверам
+        from sqlalchemy.ext.asyncio import create_async_engine
+        return create_async_engine(url, **kwargs)
+    return create_engine(url, **kwargs)
+
+def upsert_insert(session):
+    """Возвращает insert с поддержкой ON CONFLICT для диалекта сессии или None"""
+    return {
+        "postgresql": postgresql.insert,
+        "sqlite": sqlite.insert
+    }.get(session.get_bind().dialect.name)
+
+def ensure_schema(connection, migrate=True):
+    """Проверяет, что все миграции применены; если нет - применяет их или, при migrate=False, падает"""
+    from app.src.migrations import upgrade, is_current
+    if is_current(connection):
+        return
+    if not migrate:
+        raise RuntimeError("Схема БД устарела: выполните python -m app.src.migrations")
+    upgrade(connection)
 
 class Database:
-    def __init__(self, engine=None, session=None):
+    def __init__(self, engine=None, session=None, migrate=None):
         if not engine:
-            self.engine = create_engine(os.getenv("DB_URL"))
+            self.engine = create_engine_from_env()
         else:
             self.engine = engine #create_engine(os.getenv("DB_URL"))
-        Base.metadata.create_all(self.engine)
+        # AsyncEngine оборачивает синхронный движок; проверка без импорта sqlalchemy.ext.asyncio
+        self.is_async = hasattr(self.engine, "sync_engine")
+        # Схема проверяется при запуске бота (check_schema) или при первом запросе.
+        # Миграции выполняет python -m app.src.migrations; DB_AUTO_MIGRATE=1 разрешает
+        # боту применить их самому, но на большой таблице это задержит первые запросы
+        self.migrate = os.getenv("DB_AUTO_MIGRATE", "0") == "1" if migrate is None else migrate
+        self._schema_ready = False
+        self._schema_lock = None
         if not session:
-            self.Session = sessionmaker(bind=self.engine)
+            if self.is_async:
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+                self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+            else:
+                self.Session = sessionmaker(bind=self.engine)
         else:
             self.Session = session #sessionmaker(bind=self.engine)
 
-    async def add_favorite(self, book_data: dict):
-        """Добавляет книгу в избранное"""
+    async def _run(self, fn):
+        """Выполняет fn(session) в синхронной сессии, не блокируя event loop в асинхронном режиме"""
+        # fn - вложенная функция метода: Database.<метод>.<locals>.<fn>
+        method = fn.__qualname__.split(".")[1] if "." in fn.__qualname__ else fn.__name__
+        started = time.perf_counter()
+        try:
+            with span(f"db.{method}"):
+                return await self._execute(fn)
+        except Exception:
+            DB_ERRORS.inc(method)
+            raise
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, method)
+
+    async def check_schema(self):
+        """Проверяет схему при запуске: устаревшая схема без DB_AUTO_MIGRATE останавливает бота сразу"""
+        await self._ensure_schema()
+
+    async def _ensure_schema(self):
+        if self._schema_lock is None:
+            self._schema_lock = asyncio.Lock()
+        async with self._schema_lock:
+            if self._schema_ready:
+                return
+            with STARTUP.phase("schema"):
+                if self.is_async:
+                    async with self.engine.begin() as conn:
+                        await conn.run_sync(ensure_schema, self.migrate)
+                else:
+                    with self.engine.begin() as conn:
+                        ensure_schema(conn, self.migrate)
+            self._schema_ready = True
+
+    async def _execute(self, fn):
+        if not self._schema_ready:
+            await self._ensure_schema()
+        if self.is_async:
+            async with self.Session() as session:
+                try:
+                    return await session.run_sync(fn)
+                except Exception as e:
+                    await session.rollback()
+                    raise e
         session = self.Session()
         try:
-            book = FavoriteBook(
-                id=book_data["id"],
-                title=book_data["title"],
-                authors=book_data["authors"],
-                description=book_data.get("description", ""),
-                thumbnail_url=book_data.get("thumbnail"),
-                user_id=book_data["user_id"]
-            )
-            session.merge(book)  # Используем merge вместо add для избежания дубликатов
-            session.commit()
-            return True
+            return fn(session)
         except Exception as e:
             session.rollback()
             raise e
         finally:
             session.close()
 
+    async def add_favorite(self, book_data, user_id=None):
+        """Добавляет книгу в избранное.
+
+        book_data - BookRecord или словарь с полями книги; если user_id не передан,
+        он берётся из book_data["user_id"].
+        """
+        if isinstance(book_data, dict):
+            if user_id is None:
+                user_id = book_data["user_id"]
+            book_data = BookRecord.from_dict(book_data)
+        provider = book_data.provider or provider_for(book_data.id)
+        book = {
+            "provider": provider,
+            "book_id": book_data.id,
+            "title": book_data.title,
+            "authors": book_data.authors,
+            "description": book_data.description or "",
+            "thumbnail_url": book_data.thumbnail
+        }
+        favorite = {"user_id": user_id, "provider": provider, "book_id": book_data.id}
+        def add(session):
+            insert = upsert_insert(session)
+            if insert is None:
+                # Диалекты без ON CONFLICT: merge с предварительным SELECT
+                session.merge(Book(**book))
+                session.merge(FavoriteBook(**favorite))
+            else:
+                # Метаданные обновляются в каталоге одной строкой на книгу
+                session.execute(
+                    insert(Book).values(**book).on_conflict_do_update(
+                        index_elements=["provider", "book_id"],
+                        set_={
+                            "title": book["title"],
+                            "authors": book["authors"],
+                            "description": book["description"],
+                            "thumbnail_url": book["thumbnail_url"],
+                            "updated_at": utcnow()
+                        }
+                    )
+                )
+                session.execute(insert(FavoriteBook).values(**favorite).on_conflict_do_nothing())
+            session.commit()
+            return True
+        return await self._run(add)
+
     async def get_favorites(self, user_id: int):
         """Получает все избранные книги пользователя"""
-        session = self.Session()
-        try:
-            books = session.query(FavoriteBook).filter_by(user_id=user_id).all()
-            return [{
-                "id": book.id,
-                "title": book.title,
-                "authors": book.authors,
-                "description": book.description,
-                "thumbnail": book.thumbnail_url
-            } for book in books]
-        finally:
-            session.close()
+        def get(session):
+            books = (
+                session.query(Book)
+                .join(FavoriteBook, and_(
+                    FavoriteBook.provider == Book.provider,
+                    FavoriteBook.book_id == Book.book_id
+                ))
+                .filter(FavoriteBook.user_id == user_id)
+                .order_by(FavoriteBook.added_at, FavoriteBook.provider, FavoriteBook.book_id)
+                .all()
+            )
+            return [
+                BookRecord(book.book_id, book.title, book.authors, book.description, book.thumbnail_url, book.provider)
+                for book in books
+            ]
+        return await self._run(get)
 
-    async def remove_favorite(self, user_id: int, book_id: str):
-        """Удаляет книгу из избранного"""
-        session = self.Session()
-        try:
-            book = session.query(FavoriteBook).filter_by(id=book_id, user_id=user_id).first()
-            if book:
-                session.delete(book)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+    async def get_favorites_page(self, user_id: int, cursor=None, direction="after", limit=10):
+        """Получает страницу избранного относительно курсора одним запросом.
+
+        direction: "after" - книги после курсора, "before" - книги перед ним,
+        "from" - книги начиная с курсора включительно (вторым запросом
+        проверяется, есть ли книги перед страницей).
+        """
+        key = tuple_(FavoriteBook.added_at, FavoriteBook.provider, FavoriteBook.book_id)
+        def get(session):
+            query = (
+                session.query(
+                    FavoriteBook.added_at, FavoriteBook.provider, Book.book_id, Book.title,
+                    Book.authors, Book.thumbnail_url
+                )
+                .join(Book, and_(
+                    FavoriteBook.provider == Book.provider,
+                    FavoriteBook.book_id == Book.book_id
+                ))
+                .filter(FavoriteBook.user_id == user_id)
+            )
+            if cursor:
+                added_at, provider, book_id = decode_cursor(cursor)
+                bound = tuple_(literal(added_at, DateTime), literal(provider), literal(book_id))
+                query = query.filter({"after": key > bound, "before": key < bound, "from": key >= bound}[direction])
+            if direction == "before":
+                query = query.order_by(FavoriteBook.added_at.desc(), FavoriteBook.provider.desc(), FavoriteBook.book_id.desc())
+            else:
+                query = query.order_by(FavoriteBook.added_at, FavoriteBook.provider, FavoriteBook.book_id)
+            # Лишняя строка показывает, есть ли книги за пределами страницы
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if direction == "before":
+                rows.reverse()
+                has_prev = has_more
+            elif direction == "after":
+                has_prev = bool(cursor)
+            else:
+                # Страница перерисовывается после удаления, и книги курсора уже может
+                # не быть: есть ли что-то перед страницей, видно только по самим строкам
+                has_prev = bool(cursor and rows) and session.query(FavoriteBook.book_id).filter(
+                    FavoriteBook.user_id == user_id,
+                    key < tuple_(literal(rows[0].added_at, DateTime), literal(rows[0].provider),
+                                 literal(rows[0].book_id))
+                ).first() is not None
+            cursors = [encode_cursor(row.added_at, row.provider, row.book_id) for row in rows]
+            return {
+                # Описание на странице избранного не показывается и не читается
+                "books": [
+                    BookRecord(row.book_id, row.title, row.authors, thumbnail=row.thumbnail_url,
+                               provider=row.provider)
+                    for row in rows
+                ],
+                "start": cursors[0] if cursors else None,
+                "prev": cursors[0] if cursors and has_prev else None,
+                "next": cursors[-1] if cursors and (has_more or direction == "before") else None
+            }
+        return await self._run(get)
+
+    async def remove_favorite(self, user_id: int, book_id: str, provider=None):
+        """Удаляет книгу из избранного; без provider он определяется по ID"""
+        provider = provider or provider_for(book_id)
+        def remove(session):
+            stmt = delete(FavoriteBook).where(
+                FavoriteBook.user_id == user_id,
+                FavoriteBook.provider == provider,
+                FavoriteBook.book_id == book_id
+            )
+            if session.get_bind().dialect.delete_returning:
+                removed = session.execute(stmt.returning(FavoriteBook.book_id)).first() is not None
+            else:
+                removed = session.execute(stmt).rowcount > 0
+            session.commit()
+            return removed
+        return await self._run(remove)
+
+    async def get_authors(self, keys):
+        """Возвращает известные имена авторов по ключам OpenLibrary"""
+        def get(session):
+            authors = session.query(Author).filter(Author.key.in_(list(keys))).all()
+            return {author.key: author.name for author in authors}
+        return await self._run(get)
+
+    async def save_authors(self, names: dict):
+        """Сохраняет имена авторов по ключам OpenLibrary"""
+        if not names:
+            return
+        def save(session):
+            insert = upsert_insert(session)
+            if insert is None:
+                for key, name in names.items():
+                    session.merge(Author(key=key, name=name))
+            else:
+                stmt = insert(Author).values([{"key": key, "name": name} for key, name in names.items()])
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={"name": stmt.excluded.name}
+                ))
+            session.commit()
+        return await self._run(save)
+
+    def pool_stats(self):
+        """Занятые и открытые соединения пула (для пулов без счётчиков - пустой словарь)"""
+        pool = self.engine.sync_engine.pool if self.is_async else self.engine.pool
+        stats = {}
+        for name in ("size", "checkedout", "overflow", "checkedin"):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[name] = method()
+        return stats
+
+    async def close(self):
+        """Закрывает пул соединений с БД"""
+        if self.is_async:
+            await self.engine.dispose()
+        else:
+            self.engine.dispose()
@@ -0,0 +1,93 @@
+import time
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+from app.src.tracing import start_trace
+from app.src.config import STARTUP
+
+
+class _NoLock:
+    """Асинхронный контекст без блокировки (contextlib.nullcontext не асинхронный в Python 3.8)"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обрабатывает обновления разных чатов параллельно, а одного чата - строго по очереди"""
+
+    def __init__(self, max_concurrent_updates, max_pending_updates=None):
+        # Семафор базового класса ограничивает только число принятых задач.
+        # Общий лимит обработки проверяется уже после блокировки чата, чтобы
+        # очередь одного чата не занимала слоты, нужные другим чатам
+        super().__init__(max_pending_updates or max_concurrent_updates * 100)
+        self.limit = max_concurrent_updates
+        self._slots = None
+        self._chats = {}  # ключ чата -> [Lock, число обновлений чата в работе]
+        self.in_flight = 0
+        self.waiting = 0
+
+    @property
+    def current_concurrent_updates(self):
+        return self.in_flight
+
+    @staticmethod
+    def chat_key(update):
+        """Ключ упорядочивания: чат, а для обновлений без чата - пользователь"""
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return chat.id
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return f"user:{user.id}"
+        return None
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.limit)
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    async def do_process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        # Трасса обновления включает ожидание очереди чата и общего слота
+        with start_trace("update", chat=key, update_id=getattr(update, "update_id", None)) as trace:
+            await self._process(key, coroutine, trace)
+        # Время от старта процесса до первого обработанного обновления
+        STARTUP.update_handled()
+
+    async def _process(self, key, coroutine, trace):
+        queued_at = time.perf_counter()
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        self.waiting += 1
+        started = False
+        try:
+            # Обновления без чата не упорядочиваются между собой
+            async with entry[0] if key is not None else _NoLock():
+                async with self._slots:
+                    self.waiting -= 1
+                    started = True
+                    trace.set_tag("queued_ms", round((time.perf_counter() - queued_at) * 1000, 1))
+                    self.in_flight += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            if not started:
+                self.waiting -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "active_chats": len(self._chats)
+        }
@@ -1,47 +1,84 @@
 import os
-import requests
-from dotenv import load_dotenv
+import asyncio
+import logging
+from app.src.config import load_env
+from app.src.http_client import HttpClient, HTTP_ERRORS
+from app.src.health import ProviderHealth
+from app.src.records import BookRecord
 
-load_dotenv()
+load_env()
 
 class GoogleBooksAPI:
     BASE_URL = "https://www.googleapis.com/books/v1/volumes"
+    PROVIDER = "google"
+    LANGUAGE = "ru"  # Ограничение на русские книги (опционально)
     
-    def __init__(self):
+    def __init__(self, http=None, batch_concurrency=None):
         self.api_key = os.getenv("GOOGLE_BOOKS_API_KEY")
+        self.http = http or HttpClient()
+        # Адрес API можно подменить, например на локальный стенд бенчмарка
+        self.BASE_URL = os.getenv("GOOGLE_BOOKS_URL", self.BASE_URL)
+        self.batch_concurrency = int(batch_concurrency or os.getenv("GOOGLE_BATCH_CONCURRENCY", 10))
+        # Статистика запросов, автомат отключения и адаптивный таймаут
+        self.health = ProviderHealth(self.PROVIDER)
     
     async def search_books(self, query, max_results=5):
         params = {
             "q": query,
             "key": self.api_key,
             "maxResults": max_results,
-            "langRestrict": "ru"  # Ограничение на русские книги (опционально)
+            "langRestrict": self.LANGUAGE
         }
         
         try:
-            response = requests.get(self.BASE_URL, params=params)
-            response.raise_for_status()
-            return self._parse_results(response.json())
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {e}")
+            data = await self.health.call(self.http.get_json, self.BASE_URL, params=params, endpoint="search")
+            return self._parse_results(data)
+        except HTTP_ERRORS as e:
+            logging.error(f"Ошибка поиска в Google Books: {e}")
             return []
 
+    async def get_book(self, volume_id):
+        """Получает книгу по ID тома, None если том не найден"""
+        try:
+            item = await self.health.call(
+                self.http.get_json,
+                f"{self.BASE_URL}/{volume_id}",
+                params={"key": self.api_key},
+                endpoint="volume"
+            )
+            return self._parse_item(item)
+        except HTTP_ERRORS as e:
+            logging.error(f"Ошибка получения тома {volume_id} из Google Books: {e}")
+            return None
+
+    async def get_books(self, volume_ids):
+        """Получает несколько книг по ID параллельно, сохраняя порядок"""
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def fetch(volume_id):
+            async with semaphore:
+                return await self.get_book(volume_id)
+
+        return list(await asyncio.gather(*(fetch(volume_id) for volume_id in volume_ids)))
+
     def _parse_results(self, data):
-        books = []
-        for item in data.get("items", []):
-            volume = item.get("volumeInfo", {})
-            books.append({
-                "id": item.get("id"),
-                "title": volume.get("title"),
-                "authors": ", ".join(volume.get("authors", ["Неизвестен"])),
-                "description": volume.get("description", "Нет описания"),
-                "thumbnail": volume.get("imageLinks", {}).get("thumbnail")
-            })
-        return books
+        return [self._parse_item(item) for item in data.get("items", [])]
+
+    def _parse_item(self, item):
+        volume = item.get("volumeInfo", {})
+        return BookRecord(
+            item.get("id"),
+            title=volume.get("title"),
+            authors=", ".join(volume.get("authors", ["Неизвестен"])),
+            description=volume.get("description", "Нет описания"),
+            thumbnail=volume.get("imageLinks", {}).get("thumbnail"),
+            provider=self.PROVIDER
+        )
 
 # Пример использования
 if __name__ == "__main__":
+    import asyncio
     api = GoogleBooksAPI()
-    books = api.search_books("Гарри Поттер")
+    books = asyncio.run(api.search_books("Гарри Поттер"))
     for book in books:
-        print(f"{book['title']} by {book['authors']}")
+        print(f"{book.title} by {book.authors}")
@@ -0,0 +1,185 @@
+import os
+import time
+import math
+import asyncio
+import logging
+from collections import deque
+import aiohttp
+from app.src.config import load_env
+from app.src.http_client import HTTP_ERRORS
+from app.src.metrics import UPSTREAM_LATENCY
+from app.src.tracing import span
+
+load_env()
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Провайдер временно отключён автоматом; клиенты API обрабатывают это как ошибку запроса"""
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def request_status(error):
+    """Метка статуса запроса для метрик: HTTP-код, timeout или error"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return str(error.status)
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+
+def is_provider_failure(error):
+    """Ошибки клиента (404 и т.п.) не говорят о неисправности провайдера, 429 и 5xx - говорят"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, HTTP_ERRORS)
+
+
+class ProviderHealth:
+    """Скользящая статистика запросов к провайдеру, автомат отключения и адаптивный таймаут.
+
+    Автомат размыкается, когда доля ошибок в окне превышает error_rate; через
+    cooldown секунд пропускается один пробный запрос, успех которого замыкает
+    автомат. Таймаут запроса - p99 успешных ответов, умноженный на
+    timeout_factor, в пределах [timeout_min, timeout_max].
+    """
+
+    def __init__(self, name, window=None, window_seconds=None, min_calls=None, error_rate=None,
+                 cooldown=None, timeout_min=None, timeout_max=None, timeout_factor=None,
+                 clock=time.monotonic):
+        self.name = name
+        self.window_seconds = float(window_seconds or os.getenv("PROVIDER_BREAKER_WINDOW_SECONDS", 60))
+        self.min_calls = int(min_calls or os.getenv("PROVIDER_BREAKER_MIN_CALLS", 10))
+        self.error_rate = float(error_rate or os.getenv("PROVIDER_BREAKER_ERROR_RATE", 0.5))
+        self.cooldown = float(cooldown or os.getenv("PROVIDER_BREAKER_COOLDOWN", 30))
+        self.timeout_min = float(timeout_min or os.getenv("PROVIDER_TIMEOUT_MIN", 1))
+        self.timeout_max = float(timeout_max or os.getenv("PROVIDER_TIMEOUT_MAX", 10))
+        self.timeout_factor = float(timeout_factor or os.getenv("PROVIDER_TIMEOUT_FACTOR", 3))
+        self._clock = clock
+        # (время, успех, длительность) последних запросов
+        self._samples = deque(maxlen=int(window or os.getenv("PROVIDER_BREAKER_WINDOW", 100)))
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def _prune(self):
+        horizon = self._clock() - self.window_seconds
+        while self._samples and self._samples[0][0] < horizon:
+            self._samples.popleft()
+
+    def available(self):
+        """Можно ли сейчас обращаться к провайдеру (не резервирует пробный запрос)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self._clock() - self.opened_at >= self.cooldown
+        return not self._probing
+
+    def allow(self):
+        """Разрешает запрос; в полуоткрытом состоянии пропускает только один пробный"""
+        if self.state == OPEN and self._clock() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def failing(self):
+        """Последний запрос к провайдеру завершился ошибкой или автомат не замкнут"""
+        return self.state != CLOSED or self.consecutive_failures > 0
+
+    def record(self, ok, latency):
+        self._samples.append((self._clock(), ok, latency))
+        if ok:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                logging.info(f"Провайдер {self.name} снова доступен")
+                self.state = CLOSED
+                self._samples.clear()
+            return
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self._trip()
+            return
+        self._prune()
+        calls = len(self._samples)
+        errors = sum(1 for _, success, _ in self._samples if not success)
+        if self.state == CLOSED and calls >= self.min_calls and errors / calls >= self.error_rate:
+            self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = self._clock()
+        self.trips += 1
+        logging.warning(f"Провайдер {self.name} отключён на {self.cooldown:.0f} с из-за ошибок")
+
+    def _latencies(self):
+        self._prune()
+        return [latency for _, ok, latency in self._samples if ok]
+
+    def timeout(self):
+        """Таймаут по наблюдаемым задержкам; пока данных мало - верхняя граница"""
+        latencies = self._latencies()
+        if len(latencies) < self.min_calls:
+            return self.timeout_max
+        return min(self.timeout_max, max(self.timeout_min, percentile(latencies, 99) * self.timeout_factor))
+
+    async def call(self, fn, *args, timeout=None, endpoint="other", **kwargs):
+        """Вызывает fn(*args, timeout=..., **kwargs) с учётом автомата и записывает результат"""
+        if not self.allow():
+            UPSTREAM_LATENCY.observe(0.0, self.name, endpoint, "circuit_open")
+            raise CircuitOpenError(f"Провайдер {self.name} временно отключён")
+        limit = self.timeout() if timeout is None else min(timeout, self.timeout())
+        started = self._clock()
+        status = "ok"
+        try:
+            with span(f"{self.name}.{endpoint}", timeout=limit):
+                result = await fn(*args, timeout=limit, **kwargs)
+        except Exception as e:
+            status = request_status(e)
+            if is_provider_failure(e):
+                self.record(False, self._clock() - started)
+            elif self.state == HALF_OPEN:
+                # Провайдер ответил, пусть и ошибкой клиента: он работает
+                self.record(True, self._clock() - started)
+            raise
+        except BaseException:
+            status = "cancelled"
+            raise
+        finally:
+            # Отменённый пробный запрос (например, проигравший в hedged-поиске) освобождает место
+            self._probing = False
+            UPSTREAM_LATENCY.observe(self._clock() - started, self.name, endpoint, status)
+        self.record(True, self._clock() - started)
+        return result
+
+    def stats(self):
+        self._prune()
+        calls = len(self._samples)
+        errors = sum(1 for _, ok, _ in self._samples if not ok)
+        latencies = [latency for _, ok, latency in self._samples if ok]
+        return {
+            "state": self.state,
+            "calls": calls,
+            "error_rate": errors / calls if calls else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "timeout": self.timeout(),
+            "trips": self.trips
+        }
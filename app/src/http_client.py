@@ -0,0 +1,107 @@
+import asyncio
+import os
+import logging
+import aiohttp
+from app.src.config import load_env
+
+load_env()
+
+# Ошибки транспорта, которые клиенты API считают неудачным запросом
+HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _setting(value, name, default):
+    """Переданное значение, а если оно не задано (None) - переменная окружения"""
+    return os.getenv(name, default) if value is None else value
+
+
+class HttpClient:
+    """Общий асинхронный HTTP-клиент с пулом keep-alive соединений"""
+
+    def __init__(self, pool_size=None, per_host=None, connect_timeout=None,
+                 read_timeout=None, keepalive_timeout=None):
+        # Явно переданный 0 (например, limit=0 - пул без ограничения) не заменяется настройкой
+        self.pool_size = int(_setting(pool_size, "HTTP_POOL_SIZE", 100))
+        self.per_host = int(_setting(per_host, "HTTP_POOL_PER_HOST", 20))
+        self.connect_timeout = float(_setting(connect_timeout, "HTTP_CONNECT_TIMEOUT", 5))
+        self.read_timeout = float(_setting(read_timeout, "HTTP_READ_TIMEOUT", 10))
+        self.keepalive_timeout = float(_setting(keepalive_timeout, "HTTP_KEEPALIVE_TIMEOUT", 30))
+        self._session = None
+        self._loop = None
+        # Счётчики пула: открытые соединения и запросы, ждавшие свободного соединения
+        self.connections_created = 0
+        self.pool_waits = 0
+        self.waiting = 0
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_queued_start.append(self._on_queued_start)
+        trace.on_connection_queued_end.append(self._on_queued_end)
+        trace.on_connection_create_end.append(self._on_created)
+        return trace
+
+    async def _on_queued_start(self, session, context, params):
+        self.pool_waits += 1
+        self.waiting += 1
+
+    async def _on_queued_end(self, session, context, params):
+        self.waiting -= 1
+
+    async def _on_created(self, session, context, params):
+        self.connections_created += 1
+
+    def stats(self):
+        """Открытые за всё время соединения и ожидания свободного соединения пула"""
+        return {
+            "connections_created": self.connections_created,
+            "pool_waits": self.pool_waits,
+            "waiting": self.waiting
+        }
+
+    async def _get_session(self):
+        """Лениво создаёт сессию в текущем event loop; сессию прежнего цикла закрывает"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is not loop:
+            stale, self._session = self._session, None
+            try:
+                await stale.close()
+            except Exception as e:
+                # Соединения закрытого цикла событий уже не закрыть через него
+                logging.warning(f"Не удалось закрыть сессию прежнего цикла событий: {e}")
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    connect=self.connect_timeout,
+                    sock_read=self.read_timeout
+                ),
+                trace_configs=[self._trace_config()]
+            )
+            self._loop = loop
+        return self._session
+
+    async def get_json(self, url, params=None, timeout=None):
+        """Выполняет GET-запрос и возвращает разобранный JSON"""
+        session = await self._get_session()
+        kwargs = {}
+        if params:
+            # aiohttp не принимает None в параметрах запроса
+            kwargs["params"] = {k: v for k, v in params.items() if v is not None}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)
+        async with session.get(url, **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
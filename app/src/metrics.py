@@ -0,0 +1,223 @@
+import time
+import bisect
+import logging
+from functools import wraps
+from app.src.tracing import span
+
+# Границы гистограмм задержек в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    TYPE = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами: наблюдение - бинарный поиск и два сложения"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # метки -> [счётчики корзин..., сумма, количество]
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[index] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def count(self, *labels):
+        entry = self._values.get(labels)
+        return entry[-1] if entry else 0
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        for labels, entry in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, [("le", _format_value(float(bound)))])
+                yield self.name + "_bucket", bucket_labels, cumulative
+            yield self.name + "_bucket", _format_labels(self.labelnames, labels, [("le", "+Inf")]), entry[-1]
+            yield self.name + "_sum", _format_labels(self.labelnames, labels), entry[-2]
+            yield self.name + "_count", _format_labels(self.labelnames, labels), entry[-1]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Registry:
+    """Набор метрик и функций, снимающих значения датчиков в момент запроса /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, key, fn):
+        """Регистрирует fn() -> [(имя, документация, [(словарь меток, значение), ...])] для датчиков.
+
+        Необязательный четвёртый элемент - тип "counter" для значений, которые только
+        растут (имя тогда оканчивается на _total, чтобы к ним был применим rate()).
+        Повторная регистрация с тем же ключом заменяет прежнюю функцию.
+        """
+        self._collectors[key] = fn
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus 0.0.4"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for key, fn in list(self._collectors.items()):
+            try:
+                gauges = fn()
+            except Exception as e:
+                logging.error(f"Ошибка сбора метрик {key}: {e}")
+                continue
+            for name, documentation, values, *kind in gauges:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind[0] if kind else 'gauge'}")
+                for labels, value in values:
+                    lines.append(f"{name}{_format_labels((), (), labels.items())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Время обработки обновления обработчиком", ("handler",)
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Необработанные исключения в обработчиках", ("handler",)
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Время запроса к API книг", ("provider", "endpoint", "status")
+)
+DB_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "Время выполнения метода Database", ("method",)
+)
+DB_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Ошибки методов Database", ("method",)
+)
+
+
+def timed_handler(name):
+    """Декоратор обработчика Telegram: гистограмма задержек и счётчик исключений"""
+    def decorate(handler):
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(f"handler.{name}"):
+                    return await handler(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorate
+
+
+async def handle_metrics(request, registry=REGISTRY):
+    from aiohttp import web
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+class MetricsServer:
+    """Отдельный HTTP-сервер с /metrics для режимов без webhook-сервера.
+
+    aiohttp.web импортируется только при запуске сервера, а не при импорте модуля.
+    """
+
+    def __init__(self, host="0.0.0.0", port=9100, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    def make_app(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", lambda request: handle_metrics(request, self.registry))
+        return app
+
+    async def start(self):
+        from aiohttp import web
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
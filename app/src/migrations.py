@@ -0,0 +1,123 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from sqlalchemy import bindparam, inspect, text, Table, Column, String, Text, BigInteger, DateTime, Index, MetaData
+from app.src.db import Base, Book, FavoriteBook, utcnow
+
+# Таблица с именами уже применённых миграций
+migrations_table = Table(
+    "schema_migrations", MetaData(),
+    Column("name", String, primary_key=True)
+)
+
+
+def favorite_book_columns(connection):
+    return {column["name"] for column in inspect(connection).get_columns("favorite_books")}
+
+
+def favorite_books_composite_key(connection):
+    """Переводит favorite_books с ключа id на составной ключ (user_id, book_id)"""
+    if "book_id" in favorite_book_columns(connection):
+        return
+    # Схема favorite_books после этой миграции. Новая таблица создаётся под
+    # временным именем, чтобы не конфликтовать с ограничениями старой
+    new_table = Table(
+        "favorite_books_new", MetaData(),
+        Column("user_id", BigInteger, primary_key=True),
+        Column("book_id", String, primary_key=True),
+        Column("title", String),
+        Column("authors", String),
+        Column("description", Text),
+        Column("thumbnail_url", String),
+        Column("added_at", DateTime, nullable=False),
+        Index("idx_favorite_books_user_added", "user_id", "added_at", "book_id")
+    )
+    new_table.create(connection)
+    # Время добавления - наивное UTC, как у utcnow() в приложении: CURRENT_TIMESTAMP
+    # в PostgreSQL даёт местное время сервера, и такие строки сортировались бы
+    # в страницах избранного не на своих местах
+    connection.execute(text(
+        "INSERT INTO favorite_books_new "
+        "(user_id, book_id, title, authors, description, thumbnail_url, added_at) "
+        "SELECT user_id, id, title, authors, description, thumbnail_url, :added_at "
+        "FROM favorite_books WHERE user_id IS NOT NULL"
+    ).bindparams(bindparam("added_at", utcnow(), type_=DateTime)))
+    connection.execute(text("DROP TABLE favorite_books"))
+    connection.execute(text("ALTER TABLE favorite_books_new RENAME TO favorite_books"))
+
+
+def books_catalog(connection):
+    """Выносит метаданные книг из favorite_books в общий каталог books"""
+    if "title" not in favorite_book_columns(connection):
+        return
+    provider = "CASE WHEN book_id LIKE 'OL%' THEN 'openlibrary' ELSE 'google' END"
+    Book.__table__.create(connection, checkfirst=True)
+    # Для книги, сохранённой несколькими пользователями, берём одну версию метаданных
+    connection.execute(text(
+        "INSERT INTO books (provider, book_id, title, authors, description, thumbnail_url, updated_at) "
+        f"SELECT {provider}, book_id, MAX(title), MAX(authors), MAX(description), "
+        "MAX(thumbnail_url), MAX(added_at) "
+        "FROM favorite_books GROUP BY book_id"
+    ))
+    connection.execute(text("DROP INDEX idx_favorite_books_user_added"))
+    metadata = MetaData()
+    Book.__table__.to_metadata(metadata)
+    new_table = FavoriteBook.__table__.to_metadata(metadata, name="favorite_books_new")
+    new_table.create(connection)
+    connection.execute(text(
+        "INSERT INTO favorite_books_new (user_id, provider, book_id, added_at) "
+        f"SELECT user_id, {provider}, book_id, added_at FROM favorite_books"
+    ))
+    connection.execute(text("DROP TABLE favorite_books"))
+    connection.execute(text("ALTER TABLE favorite_books_new RENAME TO favorite_books"))
+
+
+# Миграции выполняются по порядку; каждая применяется только к существующим данным.
+# Новые таблицы и колонки тоже добавляются миграцией: при запуске бот сверяет
+# только этот список с schema_migrations и схему целиком не сравнивает
+MIGRATIONS = [
+    ("0001_favorite_books_composite_key", favorite_books_composite_key, "favorite_books"),
+    ("0002_books_catalog", books_catalog, "favorite_books"),
+]
+
+
+def is_current(connection):
+    """Все миграции уже применены (быстрая проверка при запуске бота)"""
+    if not inspect(connection).has_table("schema_migrations"):
+        return False
+    applied = set(connection.execute(migrations_table.select()).scalars())
+    return all(name in applied for name, _, _ in MIGRATIONS)
+
+
+def upgrade(connection):
+    """Применяет недостающие миграции и создаёт отсутствующие таблицы"""
+    migrations_table.create(connection, checkfirst=True)
+    applied = set(connection.execute(migrations_table.select()).scalars())
+    tables = set(inspect(connection).get_table_names())
+    for name, migrate, table in MIGRATIONS:
+        if name in applied:
+            continue
+        # Для новой БД мигрировать нечего: таблицы создаст create_all
+        if table in tables:
+            migrate(connection)
+        connection.execute(migrations_table.insert().values(name=name))
+    Base.metadata.create_all(connection)
+
+
+async def upgrade_async(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    import asyncio
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from app.src.db import create_engine_from_env
+    engine = create_engine_from_env()
+    if isinstance(engine, AsyncEngine):
+        asyncio.run(upgrade_async(engine))
+    else:
+        with engine.begin() as conn:
+            upgrade(conn)
+    print("Схема БД обновлена")
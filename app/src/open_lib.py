@@ -1,59 +1,181 @@
 import os
-import requests
-from dotenv import load_dotenv
+import asyncio
+import logging
+from app.src.config import load_env
+from app.src.http_client import HttpClient, HTTP_ERRORS
+from app.src.cache import TTLCache
+from app.src.health import ProviderHealth
+from app.src.records import BookRecord
+
+load_env()
+
+
+class AuthorResolver:
+    """Разрешает ключи авторов OpenLibrary в имена с долгоживущим кэшем"""
+
+    def __init__(self, api, store=None, maxsize=None, ttl=None):
+        self.api = api
+        # Хранилище с методами get_authors/save_authors, например Database
+        self.store = store
+        self.cache = TTLCache(
+            int(maxsize or os.getenv("AUTHOR_CACHE_SIZE", 50000)),
+            float(ttl or os.getenv("AUTHOR_CACHE_TTL", 7 * 24 * 3600))
+        )
+
+    async def resolve(self, keys):
+        """Возвращает словарь ключ -> имя; неразрешённые ключи отсутствуют"""
+        keys = list(dict.fromkeys(keys))  # Убираем дубликаты, сохраняя порядок
+        names = {}
+        missing = []
+        for key in keys:
+            name = self.cache.get(key)
+            if name is None:
+                missing.append(key)
+            else:
+                names[key] = name
+
+        if missing and self.store is not None:
+            try:
+                stored = await self.store.get_authors(missing)
+            except Exception as e:
+                logging.error(f"Ошибка чтения авторов из БД: {e}")
+                stored = {}
+            for key, name in stored.items():
+                self.cache.set(key, name)
+            names.update(stored)
+            missing = [key for key in missing if key not in stored]
+
+        if missing:
+            # Все недостающие авторы запрашиваются одной параллельной волной
+            fetched = await asyncio.gather(*(self._fetch_name(key) for key in missing))
+            new_names = {key: name for key, name in zip(missing, fetched) if name}
+            for key, name in new_names.items():
+                self.cache.set(key, name)
+            names.update(new_names)
+            if new_names and self.store is not None:
+                try:
+                    await self.store.save_authors(new_names)
+                except Exception as e:
+                    logging.error(f"Ошибка сохранения авторов в БД: {e}")
+        return names
+
+    async def _fetch_name(self, key):
+        try:
+            author_data = await self.api.details_health.call(
+                self.api.http.get_json, f"{self.api.BASE_URL}{key}.json", endpoint="author"
+            )
+            return author_data.get("name", "Неизвестный автор")
+        except HTTP_ERRORS as e:
+            logging.warning(f"Ошибка получения автора {key} из OpenLibrary: {e}")
+            return None
 
-load_dotenv()
 
 class OpenLibraryAPI:
     BASE_URL = "https://openlibrary.org"
+    PROVIDER = "openlibrary"
+    LANGUAGE = "rus"  # Фильтр по русским книгам
     
-    def __init__(self):
+    def __init__(self, http=None, detail_concurrency=None, detail_timeout=None, author_store=None):
         # OpenLibrary не требует API ключа, но можно добавить кастомные настройки
-        self.session = requests.Session()
+        self.http = http or HttpClient()
+        self.BASE_URL = os.getenv("OPENLIBRARY_URL", self.BASE_URL)
+        self.health = ProviderHealth(self.PROVIDER)
+        # Детали и авторы - необязательное обогащение с коротким таймаутом: их таймауты
+        # не должны размыкать автомат поиска и отключать кэширование пустой выдачи
+        self.details_health = ProviderHealth(f"{self.PROVIDER}_details")
+        self.authors = AuthorResolver(self, author_store)
+        # Сколько запросов деталей выполняется одновременно и сколько ждать каждый
+        self.detail_concurrency = int(detail_concurrency or os.getenv("OPENLIB_DETAIL_CONCURRENCY", 5))
+        self.detail_timeout = float(detail_timeout or os.getenv("OPENLIB_DETAIL_TIMEOUT", 3))
     
     async def search_books(self, query, max_results=5):
         params = {
             "q": query,
             "limit": max_results,
-            "language": "rus"  # Фильтр по русским книгам
+            "language": self.LANGUAGE
         }
         
         try:
-            response = self.session.get(
+            data = await self.health.call(
+                self.http.get_json,
                 f"{self.BASE_URL}/search.json",
                 params=params,
-                timeout=10
+                endpoint="search"
             )
-            response.raise_for_status()
-            return self._parse_results(response.json())
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {e}")
+            return await self._parse_results(data)
+        except HTTP_ERRORS as e:
+            logging.error(f"Ошибка поиска в OpenLibrary: {e}")
             return []
 
-    def _parse_results(self, data):
-        books = []
-        for doc in data.get("docs", []):
-            # Получаем полные данные о книге (включая описание)
-            book_data = self._get_book_details(doc.get("key")) if doc.get("key") else {}
-            
-            books.append({
-                "id": doc.get("key", "").split("/")[-1],  # Извлекаем ID из ключа
-                "title": doc.get("title", "Без названия"),
-                "authors": ", ".join(doc.get("author_name", ["Неизвестен"])[:200]),
-                "description": book_data.get("description", "Нет описания"),
-                "thumbnail": self._get_cover_url(doc.get("cover_i"))
-            })
-        return books
-
-    def _get_book_details(self, book_key):
-        """Получает детализированную информацию о книге"""
+    async def _parse_results(self, data):
+        docs = data.get("docs", [])
+        semaphore = asyncio.Semaphore(self.detail_concurrency)
+
+        async def fetch_details(doc):
+            if not doc.get("key"):
+                return {}
+            async with semaphore:
+                return await self._get_book_details(doc["key"])
+
+        # Получаем полные данные о книгах (включая описание) параллельно
+        details = await asyncio.gather(*(fetch_details(doc) for doc in docs))
+
+        return [
+            BookRecord(
+                doc.get("key", "").split("/")[-1],  # Извлекаем ID из ключа
+                title=doc.get("title", "Без названия"),
+                authors=", ".join(doc.get("author_name", ["Неизвестен"])[:200]),
+                # В JSON работы описание чаще всего словарь {"type": ..., "value": ...}
+                description=self._clean_description(book_data.get("description", "Нет описания")),
+                thumbnail=self._get_cover_url(doc.get("cover_i")),
+                provider=self.PROVIDER
+            )
+            for doc, book_data in zip(docs, details)
+        ]
+
+    async def get_book(self, work_id):
+        """Получает книгу по ID работы вместе с именами авторов"""
+        try:
+            work_data = await self.health.call(
+                self.http.get_json, f"{self.BASE_URL}/works/{work_id}.json", endpoint="work"
+            )
+        except HTTP_ERRORS as e:
+            logging.error(f"Ошибка получения работы {work_id} из OpenLibrary: {e}")
+            return None
+
+        author_keys = [
+            author["author"]["key"]
+            for author in work_data.get("authors", [])
+            if isinstance(author, dict) and isinstance(author.get("author"), dict)
+            and author["author"].get("key")
+        ]
+        names = await self.authors.resolve(author_keys) if author_keys else {}
+        authors = [names[key] for key in dict.fromkeys(author_keys) if key in names]
+
+        description = work_data.get("description")
+        if isinstance(description, dict):
+            description = description.get("value", "Нет описания")
+
+        return BookRecord(
+            work_id,
+            title=work_data.get("title", "Без названия"),
+            authors=", ".join(authors) if authors else "Неизвестен",
+            description=description or "Нет описания",
+            thumbnail=self._get_cover_url(work_data.get("covers", [None])[0]),
+            provider=self.PROVIDER
+        )
+
+    async def _get_book_details(self, book_key):
+        """Получает детализированную информацию о книге, не дольше detail_timeout"""
         try:
-            response = self.session.get(
-                f"{self.BASE_URL}{book_key}.json",
-                timeout=5
+            return await asyncio.wait_for(
+                self.details_health.call(
+                    self.http.get_json, f"{self.BASE_URL}{book_key}.json",
+                    timeout=self.detail_timeout, endpoint="details"
+                ),
+                self.detail_timeout
             )
-            return response.json()
-        except:
+        except Exception:
             return {}
 
     def _get_cover_url(self, cover_id):
@@ -70,9 +192,10 @@ class OpenLibraryAPI:
 
 # Пример использования (аналогично GoogleBooksAPI)
 if __name__ == "__main__":
+    import asyncio
     api = OpenLibraryAPI()
-    books = api.search_books("Гарри Поттер")
+    books = asyncio.run(api.search_books("Гарри Поттер"))
     for book in books:
-        print(f"{book['title']} by {book['authors']}")
-        print(f"Cover: {book['thumbnail']}")
+        print(f"{book.title} by {book.authors}")
+        print(f"Cover: {book.thumbnail}")
         print("---")
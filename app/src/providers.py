@@ -0,0 +1,146 @@
+import os
+import asyncio
+import logging
+from app.src.config import load_env
+from app.src.tracing import span
+
+load_env()
+
+SEQUENTIAL = "sequential"
+HEDGED = "hedged"
+PARALLEL = "parallel"
+
+
+class ProvidersUnavailable(Exception):
+    """Ни один провайдер не ответил: в отличие от пустой выдачи, это ошибка поиска"""
+
+
+def dedup_key(book):
+    """Одна и та же книга у разных провайдеров имеет разные ID, поэтому сравниваем название и авторов"""
+    return (
+        " ".join(str(book.title or "").lower().split()),
+        " ".join(str(book.authors or "").lower().split())
+    )
+
+
+def merge_results(results, max_results):
+    """Объединяет выдачи провайдеров по порядку приоритета без повторов"""
+    merged = []
+    seen = set()
+    for books in results:
+        for book in books:
+            key = dedup_key(book)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(book)
+    return merged[:max_results]
+
+
+class ProviderRouter:
+    """Стратегия опроса провайдеров книг при поиске.
+
+    sequential - следующий провайдер опрашивается, только если предыдущий
+    ничего не нашёл (прежнее поведение); hedged - следующий провайдер
+    запускается, если предыдущий не ответил за hedge_delay секунд, и
+    побеждает первый непустой ответ; parallel - опрашиваются все провайдеры,
+    выдачи объединяются без повторов.
+    """
+
+    def __init__(self, providers, mode=None, hedge_delay=None, timeouts=None):
+        self.providers = list(providers)
+        self.mode = mode or os.getenv("SEARCH_STRATEGY", HEDGED)
+        if self.mode not in (SEQUENTIAL, HEDGED, PARALLEL):
+            raise ValueError(f"Неизвестная стратегия поиска: {self.mode}")
+        self.hedge_delay = float(os.getenv("SEARCH_HEDGE_DELAY", 1.0) if hedge_delay is None else hedge_delay)
+        self.timeouts = {
+            api.PROVIDER: float(os.getenv(f"SEARCH_TIMEOUT_{api.PROVIDER.upper()}", 5))
+            for api in self.providers
+        }
+        self.timeouts.update(timeouts or {})
+        self.wins = {api.PROVIDER: 0 for api in self.providers}
+        self.hedges = 0
+
+    async def _call(self, fetch, api, query, max_results):
+        """Запрос к одному провайдеру с его таймаутом; при ошибке или таймауте возвращает None"""
+        health = getattr(api, "health", None)
+        if health is not None and not health.available():
+            # Автомат провайдера разомкнут: не тратим время на заведомо неудачный запрос
+            return None
+        try:
+            with span(f"search.{api.PROVIDER}") as current:
+                books = await asyncio.wait_for(fetch(api, query, max_results), self.timeouts[api.PROVIDER])
+                current.set_tag("results", len(books) if books else 0)
+            # Клиенты API отдают пустую выдачу и при сбое запроса
+            if not books and health is not None and health.failing():
+                return None
+            return books
+        except asyncio.TimeoutError:
+            logging.warning(f"Провайдер {api.PROVIDER} не ответил за {self.timeouts[api.PROVIDER]} с")
+        except Exception as e:
+            logging.error(f"Ошибка провайдера {api.PROVIDER}: {e}")
+        return None
+
+    def _won(self, api, books):
+        if books:
+            self.wins[api.PROVIDER] += 1
+        return books
+
+    async def search(self, query, fetch, max_results=5):
+        """Ищет книги; fetch(api, query, max_results) выполняет запрос к одному провайдеру"""
+        if self.mode == PARALLEL:
+            results = await asyncio.gather(*(
+                self._call(fetch, api, query, max_results) for api in self.providers
+            ))
+            for api, books in zip(self.providers, results):
+                self._won(api, books)
+            answered = [books for books in results if books is not None]
+        elif self.mode == SEQUENTIAL:
+            answered = []
+            for api in self.providers:
+                books = await self._call(fetch, api, query, max_results)
+                if books:
+                    return self._won(api, books)
+                if books is not None:
+                    answered.append(books)
+        else:
+            books, answered = await self._hedged(query, fetch, max_results)
+            if books:
+                return books
+        if not answered:
+            raise ProvidersUnavailable("Ни один провайдер книг не ответил")
+        return merge_results(answered, max_results)
+
+    async def _hedged(self, query, fetch, max_results):
+        """Возвращает первую непустую выдачу и список ответов провайдеров"""
+        pending = {}  # задача -> провайдер
+        waiting = list(self.providers)
+        answered = []
+        try:
+            while waiting or pending:
+                if waiting:
+                    api = waiting.pop(0)
+                    pending[asyncio.ensure_future(self._call(fetch, api, query, max_results))] = api
+                    if len(pending) > 1:
+                        self.hedges += 1
+                # Пока есть кого запускать, ждём ответа не дольше hedge_delay
+                done, _ = await asyncio.wait(
+                    set(pending), timeout=self.hedge_delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                # Одновременные ответы разбираются в порядке приоритета провайдеров
+                for task in sorted(done, key=lambda task: self.providers.index(pending[task])):
+                    api = pending.pop(task)
+                    books = task.result()
+                    if books:
+                        return self._won(api, books), answered
+                    if books is not None:
+                        answered.append(books)
+                    # Пустой ответ или ошибка: следующий провайдер запускается сразу
+            return None, answered
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        return {"mode": self.mode, "wins": dict(self.wins), "hedges": self.hedges}
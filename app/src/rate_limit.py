@@ -0,0 +1,232 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+from datetime import timedelta
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from app.src.config import load_env
+from app.src.tracing import span
+
+load_env()
+
+# Приоритеты отправки: чем меньше число, тем раньше запрос получает глобальный лимит
+INTERACTIVE = 0
+BULK = 1
+
+
+
+class TokenBucket:
+    """Маркерная корзина: rate сообщений в секунду с всплеском до capacity"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.resume_at = 0.0  # до этого момента отправка запрещена из-за retry_after
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def reserve(self, cost=1):
+        """Резервирует cost маркеров и возвращает, сколько секунд ждать до отправки"""
+        now = self._refill()
+        self.tokens -= cost
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.resume_at - now)
+
+    def pause(self, seconds):
+        """Запрещает отправку на seconds секунд после ответа RetryAfter"""
+        self.resume_at = max(self.resume_at, self._clock() + seconds)
+
+    def blocked_for(self):
+        return max(0.0, self.resume_at - self._clock())
+
+    def idle(self):
+        """Корзина полна и не на паузе: её можно удалить без потери состояния"""
+        return self._refill() >= self.resume_at and self.tokens >= self.capacity
+
+
+class SendScheduler(BaseRateLimiter):
+    """Планировщик исходящих запросов к Bot API с лимитами на чат и на бота.
+
+    Сначала запрос ждёт маркер своего чата, затем встаёт в общую очередь,
+    где ответы пользователю обгоняют массовые отправки (rate_limit_args
+    {"priority": BULK}). Обложки поиска и избранного - часть ответа
+    пользователю и идут с приоритетом INTERACTIVE. RetryAfter
+    ставит на паузу чат (или всю отправку для запросов без чата) и
+    повторяет запрос, а не теряет его.
+    """
+
+    def __init__(self, global_rate=None, chat_rate=None, chat_burst=None,
+                 group_rate=None, max_retries=None, clock=time.monotonic):
+        # Лимит бота делится между процессами-обработчиками; лимиты чатов остаются
+        # локальными, потому что каждый чат закреплён за одним обработчиком
+        workers = int(os.getenv("WORKERS", 1))
+        self.global_rate = global_rate or float(os.getenv("SEND_GLOBAL_RATE", 30)) / workers
+        self.chat_rate = chat_rate or float(os.getenv("SEND_CHAT_RATE", 1))
+        self.chat_burst = chat_burst or float(os.getenv("SEND_CHAT_BURST", 3))
+        # Лимит групп задаётся в сообщениях в минуту
+        self.group_rate = group_rate or float(os.getenv("SEND_GROUP_RATE", 20)) / 60
+        self.max_retries = int(os.getenv("SEND_MAX_RETRIES", 5)) if max_retries is None else max_retries
+        self._clock = clock
+        self._global = TokenBucket(self.global_rate, self.global_rate, clock)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._queue = []  # (приоритет, номер, стоимость, future)
+        self._seq = 0
+        self._worker = None
+        self.sent = 0
+        self.retries = 0
+        self.waiting = 0
+        self._waits = {INTERACTIVE: [0, 0.0, 0.0], BULK: [0, 0.0, 0.0]}  # число, сумма, максимум
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for *_, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    @staticmethod
+    def priority_for(endpoint, rate_limit_args):
+        """Приоритет из rate_limit_args ({"priority": ...} или число), иначе INTERACTIVE.
+
+        Приоритет не выводится из метода: альбом и фото обложек в поиске - первая
+        часть ответа, за которой бот ждёт сводку с кнопками.
+        """
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            return rate_limit_args["priority"]
+        if isinstance(rate_limit_args, int):
+            return rate_limit_args
+        return INTERACTIVE
+
+    @staticmethod
+    def cost_for(data):
+        """Цена запроса в глобальном лимите: альбом расходует его как отдельные сообщения"""
+        media = data.get("media")
+        return len(media) if isinstance(media, list) and media else 1
+
+    @staticmethod
+    def retry_delay(error):
+        """Секунды из RetryAfter: в PTB 21 retry_after - число, в новых версиях - timedelta"""
+        retry_after = error.retry_after
+        if isinstance(retry_after, timedelta):
+            return retry_after.total_seconds()
+        return float(retry_after)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 1024:
+                # Полные корзины ничем не отличаются от новых
+                for key in [key for key, value in self._chats.items() if value.idle()]:
+                    del self._chats[key]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst, self._clock)
+        return bucket
+
+    async def _run_queue(self):
+        """Выдаёт глобальные маркеры ожидающим запросам в порядке приоритета"""
+        while self._queue:
+            _, _, cost, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            wait = self._global.reserve(cost)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if not future.done():
+                future.set_result(None)
+        self._worker = None
+
+    async def _acquire_global(self, priority, cost):
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._queue, (priority, self._seq, cost, future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_queue())
+        await future
+
+    def _record_wait(self, priority, waited):
+        stats = self._waits.setdefault(priority, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+        priority = self.priority_for(endpoint, rate_limit_args)
+        cost = self.cost_for(data)
+        # Запросы без чата (answerCallbackQuery, getUpdates) не расходуют лимит сообщений
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        with span(f"telegram.{endpoint}") as current:
+            return await self._send(callback, args, kwargs, endpoint, bucket, priority, cost, current)
+
+    async def _send(self, callback, args, kwargs, endpoint, bucket, priority, cost, current):
+        for attempt in range(self.max_retries + 1):
+            started = self._clock()
+            self.waiting += 1
+            try:
+                if bucket is not None:
+                    # В чате альбом - одно сообщение: иначе обложки поиска съедают всю
+                    # корзину и задерживают следующий за ними ответ с кнопками
+                    wait = bucket.reserve(1)
+                    while wait > 0:
+                        await asyncio.sleep(wait)
+                        wait = bucket.blocked_for()
+                    await self._acquire_global(priority, cost)
+                else:
+                    wait = self._global.blocked_for()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+            waited = self._clock() - started
+            self._record_wait(priority, waited)
+            current.set_tag("queued_ms", round(waited * 1000, 1))
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    logging.error(f"Не удалось отправить {endpoint} после {attempt} повторов: {e}")
+                    raise
+                self.retries += 1
+                current.set_tag("retries", attempt + 1)
+                delay = self.retry_delay(e) + 0.1
+                logging.warning(f"Ограничение Telegram для {endpoint}, повтор через {delay:.1f} с")
+                (bucket or self._global).pause(delay)
+
+    def stats(self):
+        """Число отправленных и ожидающих запросов, повторы и время ожидания в очереди"""
+        waits = {}
+        for priority, name in ((INTERACTIVE, "interactive"), (BULK, "bulk")):
+            count, total, peak = self._waits.get(priority, [0, 0.0, 0.0])
+            waits[name] = {
+                "count": count,
+                "avg_wait": total / count if count else 0.0,
+                "max_wait": peak
+            }
+        return {
+            "sent": self.sent,
+            "waiting": self.waiting,
+            "retries": self.retries,
+            "chats": len(self._chats),
+            "wait": waits
+        }
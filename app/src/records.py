@@ -0,0 +1,82 @@
+class BookRecord:
+    """Книга из выдачи провайдера, кэша или избранного.
+
+    Неизменяемая запись со __slots__: у экземпляра нет своего словаря атрибутов,
+    поэтому записи в кэшах занимают в несколько раз меньше памяти, чем словари
+    с теми же полями, и одну запись можно без копирования отдавать в кэш, БД и
+    отрисовку. Для кода, который работает с книгой как со словарём, доступно
+    чтение book["title"] и book.get("thumbnail").
+    """
+
+    __slots__ = ("id", "title", "authors", "description", "thumbnail", "provider")
+    FIELDS = __slots__
+
+    def __init__(self, id, title=None, authors=None, description=None, thumbnail=None, provider=None):
+        # Поля задаются дескрипторами слотов в обход __setattr__, который запрещает
+        # изменение; это заметно быстрее object.__setattr__ на каждое поле
+        set_id, set_title, set_authors, set_description, set_thumbnail, set_provider = _SETTERS
+        set_id(self, id)
+        set_title(self, title)
+        set_authors(self, authors)
+        set_description(self, description)
+        set_thumbnail(self, thumbnail)
+        set_provider(self, provider)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BookRecord неизменяема, используйте replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError("BookRecord неизменяема")
+
+    def replace(self, **changes):
+        """Копия записи с изменёнными полями"""
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(changes)
+        return BookRecord(**values)
+
+    def pack(self):
+        """Компактное представление для JSON: список значений полей без имён"""
+        return [self.id, self.title, self.authors, self.description, self.thumbnail, self.provider]
+
+    @classmethod
+    def unpack(cls, values):
+        return cls(*values)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Запись из словаря с полями книги; лишние ключи (например user_id) отбрасываются"""
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        """Как dict.get; пустое (None) поле считается отсутствующим"""
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self.FIELDS and getattr(self, key) is not None
+
+    def __eq__(self, other):
+        if not isinstance(other, BookRecord):
+            return NotImplemented
+        return self.pack() == other.pack()
+
+    def __hash__(self):
+        return hash(tuple(self.pack()))
+
+    def __reduce__(self):
+        # pickle и copy создают запись через конструктор, а не через __setattr__
+        return (BookRecord, tuple(self.pack()))
+
+    def __repr__(self):
+        return f"BookRecord(id={self.id!r}, title={self.title!r}, provider={self.provider!r})"
+
+
+_SETTERS = tuple(getattr(BookRecord, field).__set__ for field in BookRecord.FIELDS)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import zlib
+import asyncio
+import logging
+from telegram import Update
+from app.src.config import load_env
+from app.src.cache import RedisCache
+from app.src.dispatch import ChatOrderedUpdateProcessor
+
+load_env()
+
+
+class MemoryBackend:
+    """Общее хранилище в памяти процесса: замена Redis для тестов и запуска в одном процессе"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._data = {}  # ключ -> (время истечения, значение в JSON)
+        self._queues = {}
+
+    async def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            del self._data[key]
+            return None
+        return json.loads(entry[1])
+
+    async def set(self, key, value, ttl):
+        # Значения сериализуются, как в Redis, чтобы процессы не делили изменяемые объекты
+        self._data[key] = (self._clock() + ttl, json.dumps(value, ensure_ascii=False))
+
+    def _queue(self, name):
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = self._queues[name] = asyncio.Queue()
+        return queue
+
+    async def push(self, name, item):
+        await self._queue(name).put(json.dumps(item, ensure_ascii=False))
+
+    async def pop(self, name, timeout=1.0):
+        """Забирает элемент очереди, ожидая не дольше timeout; None, если очередь пуста"""
+        try:
+            raw = await asyncio.wait_for(self._queue(name).get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return json.loads(raw)
+
+    async def qsize(self, name):
+        return self._queue(name).qsize()
+
+
+class RedisBackend(RedisCache):
+    """Общее хранилище в Redis: кэш и очереди обновлений для нескольких процессов бота"""
+
+    async def push(self, name, item):
+        await self.client.lpush(self.prefix + name, json.dumps(item, ensure_ascii=False))
+
+    async def pop(self, name, timeout=1.0):
+        # BRPOP принимает таймаут в секундах; 0 означает бесконечное ожидание
+        result = await self.client.brpop(self.prefix + name, timeout=max(1, int(timeout)))
+        return None if result is None else json.loads(result[1])
+
+    async def qsize(self, name):
+        return await self.client.llen(self.prefix + name)
+
+
+def backend_from_env():
+    """Общее хранилище по SHARED_BACKEND_URL (redis://... или memory://), иначе None"""
+    url = os.getenv("SHARED_BACKEND_URL") or os.getenv("CACHE_REDIS_URL")
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    return RedisBackend(url)
+
+
+def queue_name(worker_id):
+    return f"updates:{worker_id}"
+
+
+def shard_for(key, workers):
+    """Номер обработчика для ключа чата; crc32 одинаков во всех процессах, в отличие от hash()"""
+    if key is None:
+        return 0
+    return zlib.crc32(str(key).encode()) % workers
+
+
+class ShardedIngress:
+    """Распределяет входящие обновления по очередям обработчиков по ключу чата.
+
+    Все обновления одного чата попадают к одному обработчику, поэтому порядок
+    внутри чата сохраняет его ChatOrderedUpdateProcessor, а разные чаты
+    обрабатываются разными процессами.
+    """
+
+    def __init__(self, backend, workers=None):
+        self.backend = backend
+        self.workers = int(workers or os.getenv("WORKERS", 1))
+        self.routed = [0] * self.workers
+
+    async def route(self, data):
+        """Кладёт обновление в очередь обработчика его чата и возвращает номер обработчика"""
+        update = Update.de_json(data, None)
+        shard = shard_for(ChatOrderedUpdateProcessor.chat_key(update), self.workers)
+        await self.backend.push(queue_name(shard), data)
+        self.routed[shard] += 1
+        return shard
+
+    async def stats(self):
+        return {
+            "routed": list(self.routed),
+            "queues": [await self.backend.qsize(queue_name(shard)) for shard in range(self.workers)]
+        }
+
+
+class UpdateWorker:
+    """Забирает обновления своей очереди и передаёт их в Application по порядку"""
+
+    def __init__(self, application, backend, worker_id=None, poll_timeout=1.0):
+        self.application = application
+        self.backend = backend
+        self.worker_id = int(os.getenv("WORKER_ID", 0) if worker_id is None else worker_id)
+        self.poll_timeout = poll_timeout
+        self.consumed = 0
+
+    async def run(self, stop):
+        """Работает, пока не установлено событие stop"""
+        name = queue_name(self.worker_id)
+        while not stop.is_set():
+            try:
+                data = await self.backend.pop(name, self.poll_timeout)
+            except Exception as e:
+                logging.error(f"Ошибка чтения очереди {name}: {e}")
+                await asyncio.sleep(self.poll_timeout)
+                continue
+            if data is None:
+                continue
+            try:
+                update = Update.de_json(data, self.application.bot)
+            except Exception as e:
+                logging.error(f"Некорректное обновление в очереди {name}: {e}")
+                continue
+            await self.application.update_queue.put(update)
+            self.consumed += 1
@@ -0,0 +1,47 @@
+import asyncio
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые запросы в один вызов.
+
+    Пока запрос с ключом выполняется, остальные вызовы с тем же ключом
+    ждут его результат (или исключение) вместо собственного запроса.
+    Результат не хранится после завершения: за свежестью следят кэши.
+    """
+
+    def __init__(self):
+        self._flights = {}  # ключ -> [задача, число присоединившихся]
+        self.flights = 0
+        self.coalesced = 0
+        self.max_coalesced = 0
+
+    async def do(self, key, fn):
+        """Возвращает результат fn() для ключа, выполняя не больше одного fn одновременно"""
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn())
+            flight = self._flights[key] = [task, 0]
+            self.flights += 1
+            task.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            flight[1] += 1
+            self.coalesced += 1
+        # Отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(flight[0])
+
+    def _finish(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        self.max_coalesced = max(self.max_coalesced, flight[1])
+        task = flight[0]
+        if not task.cancelled():
+            # Исключение уже получили ожидающие; без этого asyncio пишет в лог при сборке задачи
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "flights": self.flights,
+            "coalesced": self.coalesced,
+            "max_coalesced": self.max_coalesced
+        }
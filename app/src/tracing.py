@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+from contextvars import ContextVar
+from app.src.config import load_env
+
+load_env()
+
+SERVICE_NAME = "book-bot"
+
+# Текущий спан задачи; дочерние задачи asyncio наследуют его вместе с контекстом
+_current = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Интервал трассы; завершённые спаны выгружаются в формате Zipkin v2"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "tags", "start", "duration", "_started", "_token")
+
+    def __init__(self, trace, name, parent_id=None, tags=None):
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.tags = {key: str(value) for key, value in (tags or {}).items()}
+        self.start = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set_tag(self, key, value):
+        self.tags[key] = str(value)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.tags["error"] = str(exc) or exc_type.__name__
+        _current.reset(self._token)
+        self.trace.finish(self)
+        return False
+
+    def to_zipkin(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(1, int(self.duration * 1_000_000)),
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": self.tags
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """Спаны одного обновления; выгружаются вместе после завершения корневого"""
+
+    __slots__ = ("tracer", "trace_id", "spans", "open")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.spans = []
+        self.open = 0
+
+    def finish(self, span):
+        self.spans.append(span)
+        self.open -= 1
+        if self.open == 0:
+            # Спаны, завершённые позже (например, в общей задаче single-flight), уйдут отдельно
+            spans, self.spans = self.spans, []
+            self.tracer.export(spans)
+
+
+class _NullSpan:
+    """Заглушка для необрабатываемых трасс: вход и выход ничего не стоят"""
+
+    __slots__ = ()
+
+    def set_tag(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class FileExporter:
+    """Пишет спаны в файл по одному JSON-объекту Zipkin v2 на строку.
+
+    В цикле событий строки копятся в буфере, и фоновая задача дописывает их
+    в файл через пул потоков: запись на диск не останавливает обработку обновлений.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self._task = None
+
+    def export(self, spans):
+        self._buffer.extend(json.dumps(span.to_zipkin(), ensure_ascii=False) + "\n" for span in spans)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне цикла событий (скрипты, тесты) блокировать нечего
+            self._write(self._take())
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flush())
+
+    def _take(self):
+        lines, self._buffer = self._buffer, []
+        return lines
+
+    def _write(self, lines):
+        if lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        while self._buffer:
+            await loop.run_in_executor(None, self._write, self._take())
+
+    async def close(self):
+        """Дописывает буфер в файл"""
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self._flush()
+
+
+class ZipkinExporter:
+    """Отправляет спаны в коллектор Zipkin/Jaeger/OpenTelemetry (POST /api/v2/spans)"""
+
+    def __init__(self, url, http=None):
+        self.url = url
+        self.http = http
+        self._own_http = False  # сессию, созданную здесь, закрывает close()
+        self._tasks = set()
+
+    def export(self, spans):
+        try:
+            task = asyncio.get_running_loop().create_task(self._send([span.to_zipkin() for span in spans]))
+        except RuntimeError:
+            return
+        # Ссылка на задачу нужна, чтобы её не собрал сборщик мусора до отправки
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, payload):
+        import aiohttp
+        try:
+            if self.http is None:
+                self.http = aiohttp.ClientSession()
+                self._own_http = True
+            async with self.http.post(self.url, json=payload, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                response.raise_for_status()
+        except Exception as e:
+            logging.error(f"Ошибка отправки трасс: {e}")
+
+    async def close(self):
+        """Дожидается отправки выгруженных трасс и закрывает свою HTTP-сессию"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_http and self.http is not None:
+            await self.http.close()
+            self.http = None
+            self._own_http = False
+
+
+class Tracer:
+    """Трассировка обновлений: корневой спан на обновление и вложенные спаны операций.
+
+    sample_rate - доля трассируемых обновлений (0 - трассировка выключена).
+    """
+
+    def __init__(self, sample_rate=0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.exported = 0
+
+    def start_trace(self, name, **tags):
+        """Корневой спан новой трассы с вероятностью sample_rate"""
+        if self.exporter is None or not self.sample_rate or random.random() >= self.sample_rate:
+            return NULL_SPAN
+        trace = Trace(self)
+        trace.open += 1
+        return Span(trace, name, tags=tags)
+
+    def span(self, name, **tags):
+        """Дочерний спан текущей трассы; вне трассы ничего не записывает"""
+        parent = _current.get()
+        if parent is None:
+            return NULL_SPAN
+        parent.trace.open += 1
+        return Span(parent.trace, name, parent.span_id, tags)
+
+    def export(self, spans):
+        self.exported += len(spans)
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logging.error(f"Ошибка выгрузки трасс: {e}")
+
+    async def close(self):
+        """Дожидается выгрузки завершённых трасс и освобождает ресурсы экспортёра"""
+        close = getattr(self.exporter, "close", None)
+        if close is not None:
+            await close()
+
+
+def tracer_from_env():
+    """Трассировщик по TRACE_SAMPLE_RATE и TRACE_FILE / TRACE_ZIPKIN_URL"""
+    exporter = None
+    if os.getenv("TRACE_ZIPKIN_URL"):
+        exporter = ZipkinExporter(os.getenv("TRACE_ZIPKIN_URL"))
+    elif os.getenv("TRACE_FILE"):
+        exporter = FileExporter(os.getenv("TRACE_FILE"))
+    return Tracer(float(os.getenv("TRACE_SAMPLE_RATE", 0)), exporter)
+
+
+TRACER = tracer_from_env()
+
+
+def span(name, **tags):
+    return TRACER.span(name, **tags)
+
+
+def start_trace(name, **tags):
+    return TRACER.start_trace(name, **tags)
+
+
+def slow_traces(path, min_ms=1000):
+    """Медленные трассы из файла: [(мс, корневой спан, [(имя спана, мс), ...])], самые долгие первыми"""
+    traces = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            span = json.loads(line)
+            traces.setdefault(span["traceId"], []).append(span)
+    result = []
+    for spans in traces.values():
+        root = next((span for span in spans if "parentId" not in span), None)
+        if root is None or root["duration"] < min_ms * 1000:
+            continue
+        children = sorted(
+            ((span["name"], span["duration"] / 1000) for span in spans if span is not root),
+            key=lambda item: -item[1]
+        )
+        result.append((root["duration"] / 1000, root, children))
+    return sorted(result, key=lambda item: -item[0])
+
+
+if __name__ == "__main__":
+    # python -m app.src.tracing traces.jsonl [мин. длительность в мс]
+    for duration, root, children in slow_traces(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 1000):
+        print(f"{root['traceId']} {root['name']} {duration:.0f} мс {root['tags']}")
+        for name, ms in children:
+            print(f"    {name}: {ms:.0f} мс")
@@ -0,0 +1,76 @@
+import hmac
+import logging
+from aiohttp import web
+from telegram import Update
+
+# Заголовок, в котором Telegram передаёт secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Встроенный HTTP-сервер, принимающий обновления Telegram через webhook.
+
+    Обновления кладутся в очередь Application, а если задан ingress - в
+    общие очереди обработчиков (ShardedIngress). Порт открыт для Telegram,
+    поэтому без секрета сервер не создаётся, а /metrics отдаёт отдельный
+    MetricsServer на METRICS_PORT.
+    """
+
+    def __init__(self, application=None, secret_token=None, path="/telegram", host="0.0.0.0", port=8080,
+                 ingress=None):
+        if not secret_token:
+            raise RuntimeError("Для webhook нужен WEBHOOK_SECRET: без него обновление может прислать кто угодно")
+        self.application = application
+        self.ingress = ingress
+        self.secret_token = secret_token
+        self.path = path
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.health)
+        return app
+
+    async def handle_update(self, request):
+        """Проверяет секрет, кладёт обновление в очередь Application и сразу отвечает"""
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, None if self.ingress is not None else self.application.bot)
+        except Exception as e:
+            logging.error(f"Некорректное обновление webhook: {e}")
+            return web.Response(status=400)
+        if self.ingress is not None:
+            try:
+                await self.ingress.route(data)
+            except Exception as e:
+                # Telegram повторит доставку обновления, на которое не получил 200
+                logging.error(f"Ошибка передачи обновления обработчикам: {e}")
+                return web.Response(status=503)
+            return web.Response(text="ok")
+        await self.application.update_queue.put(update)
+        return web.Response(text="ok")
+
+    async def health(self, request):
+        if self.ingress is not None:
+            return web.json_response({"status": "ok", **await self.ingress.stats()})
+        return web.json_response({
+            "status": "ok",
+            "queue": self.application.update_queue.qsize()
+        })
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
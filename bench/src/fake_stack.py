@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import socket
+import asyncio
+import itertools
+from collections import Counter, OrderedDict
+from aiohttp import web
+
+FIXTURES_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixtures"))
+
+
+def load_fixture(name, directory=FIXTURES_DIR):
+    with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def book_ids(provider, query, count=5):
+    """ID книг выдачи стенда: один запрос всегда даёт одни и те же книги, разные запросы - разные"""
+    seed = zlib.crc32(query.strip().lower().encode())
+    if provider == "google":
+        return [f"bk{seed:08x}{n}" for n in range(count)]
+    return [f"OL{seed % 10 ** 8 * 10 + n}W" for n in range(count)]
+
+
+class FakeService:
+    """Локальный HTTP-сервер с задержкой и ошибками по заданному профилю.
+
+    Задержка ответа - latency * e^N(0, jitter), то есть логнормальная с медианой
+    latency; доля error_rate ответов заменяется ошибкой. Генератор случайных
+    чисел детерминирован по seed.
+    """
+
+    NAME = "service"
+
+    def __init__(self, latency=0.05, jitter=0.3, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(f"{self.NAME}:{seed}")
+        self.requests = Counter()
+        self.errors = 0
+        self.url = None
+        self._runner = None
+
+    def routes(self):
+        return []
+
+    def error_response(self):
+        return web.json_response({"error": {"code": 503, "message": "Backend Error"}}, status=503)
+
+    def endpoint(self, request):
+        return request.match_info.route.name or request.path
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        self.requests[self.endpoint(request)] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * math.exp(self._rng.gauss(0, self.jitter)))
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            return self.error_response()
+        return await handler(request)
+
+    async def start(self, host="127.0.0.1"):
+        app = web.Application(middlewares=[self._inject])
+        for method, path, handler, name in self.routes():
+            app.router.add_route(method, path, handler, name=name)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        # Порт выбирает ОС, поэтому стенды можно запускать параллельно
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((host, 0))
+        await web.SockSite(self._runner, sock).start()
+        self.url = f"http://{host}:{sock.getsockname()[1]}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self):
+        return {"requests": dict(self.requests), "errors": self.errors}
+
+
+class FakeGoogleBooks(FakeService):
+    """Google Books API: поиск томов и том по ID из записанных ответов"""
+
+    NAME = "google"
+
+    def __init__(self, *args, fixtures=FIXTURES_DIR, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search_template = load_fixture("google_search", fixtures)
+        self.volume_template = load_fixture("google_volume", fixtures)
+
+    def routes(self):
+        return [
+            ("GET", "/books/v1/volumes", self.search, "search"),
+            ("GET", "/books/v1/volumes/{volume_id}", self.volume, "volume"),
+        ]
+
+    async def search(self, request):
+        limit = int(request.query.get("maxResults", 10))
+        items = self.search_template["items"][:limit]
+        ids = book_ids(self.NAME, request.query.get("q", ""), len(items))
+        return web.json_response({
+            **self.search_template,
+            "items": [{**item, "id": volume_id} for item, volume_id in zip(items, ids)]
+        })
+
+    async def volume(self, request):
+        return web.json_response({**self.volume_template, "id": request.match_info["volume_id"]})
+
+
+class FakeOpenLibrary(FakeService):
+    """OpenLibrary: поиск, работы и авторы из записанных ответов"""
+
+    NAME = "openlibrary"
+
+    def __init__(self, *args, fixtures=FIXTURES_DIR, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search_template = load_fixture("openlibrary_search", fixtures)
+        self.work_template = load_fixture("openlibrary_work", fixtures)
+        self.author_template = load_fixture("openlibrary_author", fixtures)
+
+    def routes(self):
+        return [
+            ("GET", "/search.json", self.search, "search"),
+            ("GET", "/works/{work_id}.json", self.work, "work"),
+            ("GET", "/authors/{author_id}.json", self.author, "author"),
+        ]
+
+    async def search(self, request):
+        limit = int(request.query.get("limit", 100))
+        docs = self.search_template["docs"][:limit]
+        ids = book_ids(self.NAME, request.query.get("q", ""), len(docs))
+        return web.json_response({
+            **self.search_template,
+            "q": request.query.get("q", ""),
+            "docs": [{**doc, "key": f"/works/{work_id}"} for doc, work_id in zip(docs, ids)]
+        })
+
+    async def work(self, request):
+        return web.json_response({**self.work_template, "key": f"/works/{request.match_info['work_id']}"})
+
+    async def author(self, request):
+        return web.json_response({**self.author_template, "key": f"/authors/{request.match_info['author_id']}"})
+
+
+class FakeTelegram(FakeService):
+    """Bot API: принимает любые методы, на отправку отвечает сообщением, ошибки - 429 с retry_after.
+
+    Запоминает inline-клавиатуры последних сообщений каждого чата, чтобы
+    виртуальные пользователи нажимали кнопки, которые бот им действительно показал.
+    """
+
+    NAME = "telegram"
+    KEPT_MESSAGES = 5
+
+    def __init__(self, *args, retry_after=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+        self._message_ids = itertools.count(1)
+        self._keyboards = {}  # chat_id -> {message_id: inline_keyboard}
+        self._updates = []  # обновления для getUpdates
+        self._updates_added = None
+
+    def routes(self):
+        return [("POST", "/bot{token}/{method}", self.call, None)]
+
+    def error_response(self):
+        return web.json_response({
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {self.retry_after}",
+            "parameters": {"retry_after": self.retry_after}
+        }, status=429)
+
+    def endpoint(self, request):
+        # Запросы считаются по методу Bot API, а не по маршруту
+        return request.match_info.get("method", request.path)
+
+    def _message(self, chat_id, message_id=None, **fields):
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": 1718000000,
+            "chat": {"id": int(chat_id or 0), "type": "group" if int(chat_id or 0) < 0 else "private"},
+            **fields
+        }
+
+    def _remember(self, chat_id, message_id, reply_markup):
+        if chat_id is None:
+            return
+        keyboards = self._keyboards.setdefault(int(chat_id), OrderedDict())
+        keyboards.pop(message_id, None)
+        keyboards[message_id] = json.loads(reply_markup)["inline_keyboard"] if reply_markup else []
+        while len(keyboards) > self.KEPT_MESSAGES:
+            keyboards.popitem(last=False)
+
+    def buttons(self, chat_id, prefix):
+        """Кнопки последних сообщений чата с callback_data на prefix: [(message_id, клавиатура, data)]"""
+        found = []
+        for message_id, keyboard in self._keyboards.get(chat_id, {}).items():
+            for row in keyboard:
+                for button in row:
+                    if button.get("callback_data", "").startswith(prefix):
+                        found.append((message_id, keyboard, button["callback_data"]))
+        return found
+
+    def push_update(self, update):
+        """Обновление, которое бот получит через getUpdates (long polling)"""
+        self._updates.append(update)
+        if self._updates_added is not None:
+            self._updates_added.set()
+
+    async def _get_updates(self, data):
+        offset = int(data.get("offset") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates:
+            # Long polling: ждём новое обновление, но не дольше секунды
+            self._updates_added = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), min(float(data.get("timeout") or 0), 1))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates
+
+    async def call(self, request):
+        method = request.match_info["method"]
+        data = await request.post()
+        chat_id = data.get("chat_id")
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = await self._get_updates(data)
+        elif method == "sendMediaGroup":
+            media = json.loads(data.get("media", "[]"))
+            result = [self._message(chat_id, photo=[]) for _ in media]
+        elif method in ("sendMessage", "sendPhoto"):
+            result = self._message(chat_id, text=data.get("text", data.get("caption", "")))
+            self._remember(chat_id, result["message_id"], data.get("reply_markup"))
+        elif method in ("editMessageText", "editMessageReplyMarkup"):
+            result = self._message(chat_id, int(data["message_id"]), text=data.get("text", ""))
+            self._remember(chat_id, result["message_id"], data.get("reply_markup"))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class FakeStack:
+    """Google Books, OpenLibrary и Bot API на локальных портах с отдельным профилем каждого"""
+
+    def __init__(self, google=None, openlibrary=None, telegram=None, seed=0, fixtures=FIXTURES_DIR):
+        self.google = FakeGoogleBooks(**{"latency": 0.15, **(google or {})}, seed=seed, fixtures=fixtures)
+        self.openlibrary = FakeOpenLibrary(**{"latency": 0.4, **(openlibrary or {})}, seed=seed, fixtures=fixtures)
+        self.telegram = FakeTelegram(**{"latency": 0.03, **(telegram or {})}, seed=seed)
+        self.services = (self.google, self.openlibrary, self.telegram)
+
+    async def start(self):
+        for service in self.services:
+            await service.start()
+
+    async def stop(self):
+        for service in self.services:
+            await service.stop()
+
+    def env(self):
+        """Переменные окружения, направляющие бота на стенд"""
+        return {
+            "GOOGLE_BOOKS_URL": f"{self.google.url}/books/v1/volumes",
+            "OPENLIBRARY_URL": self.openlibrary.url,
+            "TELEGRAM_API_URL": self.telegram.url
+        }
+
+    def stats(self):
+        return {service.NAME: service.stats() for service in self.services}
+
+
+async def record(query, directory=FIXTURES_DIR):
+    """Записывает настоящие ответы Google Books и OpenLibrary на запрос в файлы стенда"""
+    from app.src.http_client import HttpClient
+    http = HttpClient()
+    try:
+        responses = {}
+        responses["google_search"] = await http.get_json(
+            "https://www.googleapis.com/books/v1/volumes",
+            params={"q": query, "maxResults": 5, "langRestrict": "ru"}
+        )
+        volume_id = responses["google_search"]["items"][0]["id"]
+        responses["google_volume"] = await http.get_json(f"https://www.googleapis.com/books/v1/volumes/{volume_id}")
+        responses["openlibrary_search"] = await http.get_json(
+            "https://openlibrary.org/search.json", params={"q": query, "limit": 5, "language": "rus"}
+        )
+        work_key = responses["openlibrary_search"]["docs"][0]["key"]
+        responses["openlibrary_work"] = await http.get_json(f"https://openlibrary.org{work_key}.json")
+        author_key = responses["openlibrary_work"]["authors"][0]["author"]["key"]
+        responses["openlibrary_author"] = await http.get_json(f"https://openlibrary.org{author_key}.json")
+    finally:
+        await http.close()
+    for name, data in responses.items():
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    # python -m bench.src.fake_stack "Мастер и Маргарита" - перезаписать ответы стенда
+    asyncio.run(record(sys.argv[1]))
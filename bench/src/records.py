@@ -0,0 +1,130 @@
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from html import escape
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from app.src.records import BookRecord
+from app.src.bot import BookBot
+from app.src.db import book_ref
+
+
+def sample_values(count):
+    """Значения полей count книг; строки создаются один раз и общие для обоих вариантов записей"""
+    return [
+        (f"book{n}", f"Книга {n}", f"Автор {n % 97}", f"Описание книги {n} " * 8,
+         f"http://books.example/covers/{n}.jpg" if n % 3 else None, "google")
+        for n in range(count)
+    ]
+
+
+def as_dicts(values):
+    # Так записи строились до BookRecord: литерал словаря на каждую книгу
+    return [
+        {"id": id, "title": title, "authors": authors, "description": description,
+         "thumbnail": thumbnail, "provider": provider}
+        for id, title, authors, description, thumbnail, provider in values
+    ]
+
+
+def as_records(values):
+    return [BookRecord(*row) for row in values]
+
+
+def allocated(build, values):
+    """Байты, выделенные под контейнеры записей (без самих строк)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = build(values)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del records
+    return after - before
+
+
+def best_time(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def render_favorites(page):
+    """Страница избранного так, как её рисует бот"""
+    return BookBot._render_favorites_page(None, page)
+
+
+def render_favorites_dicts(page):
+    # Отрисовка до перехода на BookRecord: те же строки из словарей
+    lines = ["⭐ <b>Избранное</b>"]
+    remove_buttons = []
+    for number, book in enumerate(page["books"], 1):
+        lines.append(f"{number}. <b>{escape(book['title'] or '')}</b>\n👤 {escape(book['authors'] or '')}")
+        remove_buttons.append(InlineKeyboardButton(
+            f"❌ {number}", callback_data=f"unfav_{page['start']}|{book_ref(book['provider'], book['id'])}"
+        ))
+    keyboard = [remove_buttons[i:i + 5] for i in range(0, len(remove_buttons), 5)]
+    return "\n\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+
+def measure(count=10000, page_size=50, repeat=5):
+    """Память, время создания, размер в общем кэше и отрисовка для словарей и BookRecord"""
+    values = sample_values(count)
+    dict_bytes = allocated(as_dicts, values)
+    record_bytes = allocated(as_records, values)
+    dicts, records = as_dicts(values), as_records(values)
+
+    pages = [
+        {"start": "1:book0", "prev": None, "next": None, "books": books[i:i + page_size]}
+        for books in (dicts, records) for i in range(0, len(books), page_size)
+    ]
+    dict_pages, record_pages = pages[:len(pages) // 2], pages[len(pages) // 2:]
+    render_dicts = best_time(lambda: [render_favorites_dicts(page) for page in dict_pages], repeat)
+    render_records = best_time(lambda: [render_favorites(page) for page in record_pages], repeat)
+
+    return {
+        "count": count,
+        "bytes_per_dict": round(dict_bytes / count, 1),
+        "bytes_per_record": round(record_bytes / count, 1),
+        "saved_bytes_per_record": round((dict_bytes - record_bytes) / count, 1),
+        "build_dicts_ms": round(best_time(lambda: as_dicts(values), repeat) * 1000, 2),
+        "build_records_ms": round(best_time(lambda: as_records(values), repeat) * 1000, 2),
+        "json_bytes_per_dict": round(len(json.dumps(dicts, ensure_ascii=False).encode()) / count, 1),
+        "json_bytes_per_record": round(
+            len(json.dumps([book.pack() for book in records], ensure_ascii=False).encode()) / count, 1
+        ),
+        "render_dicts_ms": round(render_dicts * 1000, 2),
+        "render_records_ms": round(render_records * 1000, 2),
+        "render_speedup": round(render_dicts / render_records, 2) if render_records else 0.0
+    }
+
+
+def format_results(results):
+    return "\n".join([
+        f"{results['count']} записей книг: словарь / BookRecord",
+        f"Память на запись: {results['bytes_per_dict']} / {results['bytes_per_record']} байт "
+        f"(экономия {results['saved_bytes_per_record']} байт)",
+        f"Создание: {results['build_dicts_ms']} / {results['build_records_ms']} мс",
+        f"Общий кэш (JSON) на запись: {results['json_bytes_per_dict']} / {results['json_bytes_per_record']} байт",
+        f"Отрисовка избранного: {results['render_dicts_ms']} / {results['render_records_ms']} мс "
+        f"(ускорение x{results['render_speedup']})"
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память и отрисовка записей книг: словари против BookRecord")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    print(format_results(measure(args.count, args.page_size, args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
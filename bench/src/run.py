@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import platform
+import resource
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from telegram import Update
+from app.src import tracing
+from app.src.health import percentile
+from bench.src.fake_stack import FakeStack
+from bench.src.workload import synthetic_updates
+
+RESULTS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results"))
+
+DEFAULTS = {
+    "updates": 1000,
+    "users": 200,
+    "rate": 0.0,  # обновлений в секунду, 0 - все сразу
+    "seed": 0,
+    "google_latency": 0.15,
+    "openlibrary_latency": 0.4,
+    "telegram_latency": 0.03,
+    "jitter": 0.3,
+    "google_errors": 0.0,
+    "openlibrary_errors": 0.0,
+    "telegram_errors": 0.0,
+    "send_limits": True,  # лимиты Telegram на отправку, как в боевом боте; --no-send-limits измеряет сам бот
+    "db_url": None,
+    "timeout": 300.0
+}
+
+# Лимиты отправки, которые заведомо не достигаются на стенде
+UNLIMITED_SENDS = {
+    "SEND_GLOBAL_RATE": "1000000",
+    "SEND_CHAT_RATE": "1000000",
+    "SEND_CHAT_BURST": "1000000",
+    "SEND_GROUP_RATE": "1000000000"
+}
+
+
+@contextmanager
+def patched_env(values):
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class SpanCollector:
+    """Экспортёр трасс в память: длительности спанов по именам и время завершения обновлений"""
+
+    def __init__(self):
+        self.durations = {}
+        self.finished = {}  # update_id -> время завершения корневого спана
+
+    def export(self, spans):
+        for span in spans:
+            self.durations.setdefault(span.name, []).append(span.duration * 1000)
+            if span.parent_id is None:
+                self.finished[span.tags.get("update_id")] = span.start + span.duration
+
+
+def summarize(values):
+    """Количество и перцентили задержки в миллисекундах"""
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) or 0, 2),
+        "p95": round(percentile(values, 95) or 0, 2),
+        "p99": round(percentile(values, 99) or 0, 2),
+        "max": round(max(values, default=0), 2)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def make_stack(config):
+    return FakeStack(
+        google={"latency": config["google_latency"], "jitter": config["jitter"],
+                "error_rate": config["google_errors"]},
+        openlibrary={"latency": config["openlibrary_latency"], "jitter": config["jitter"],
+                     "error_rate": config["openlibrary_errors"]},
+        telegram={"latency": config["telegram_latency"], "jitter": config["jitter"],
+                  "error_rate": config["telegram_errors"]},
+        seed=config["seed"]
+    )
+
+
+def bot_env(config, stack, directory):
+    """Окружение BookBot, направленное на стенд"""
+    return {
+        "TELEGRAM_TOKEN": "123456:bench",
+        # По умолчанию настоящая БД в файле SQLite, а не в памяти
+        "DB_URL": config["db_url"] or f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        # БД стенда создаётся заново, схему бот применяет сам
+        "DB_AUTO_MIGRATE": "1",
+        "METRICS_PORT": "0",
+        "SHARED_BACKEND_URL": "",
+        "CACHE_REDIS_URL": "",
+        **stack.env(),
+        **({} if config["send_limits"] else UNLIMITED_SENDS)
+    }
+
+
+async def run_benchmark(**config):
+    """Запускает BookBot против локального стенда и возвращает результаты замера"""
+    from app.src.bot import BookBot
+    config = {**DEFAULTS, **config}
+    stack = make_stack(config)
+    updates = list(synthetic_updates(config["updates"], config["users"], seed=config["seed"]))
+    collector = SpanCollector()
+    tracer = tracing.TRACER
+
+    await stack.start()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            with patched_env(bot_env(config, stack, directory)):
+                # Каждое обновление трассируется: из спанов берутся задержки обработчиков
+                tracing.TRACER = tracing.Tracer(1.0, collector)
+                bot = BookBot()
+                results = await _drive(bot, updates, collector, config["rate"], config["timeout"])
+        finally:
+            tracing.TRACER = tracer
+            await stack.stop()
+
+    results.update({
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config,
+        "upstream": stack.stats()
+    })
+    return results
+
+
+async def _drive(bot, updates, collector, rate, timeout):
+    application = bot.application
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    enqueued = {}
+    await application.initialize()
+    await application.start()
+    try:
+        started = time.time()
+        for n, data in enumerate(updates):
+            if rate:
+                delay = started + n / rate - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            enqueued[str(data["update_id"])] = time.time()
+            await application.update_queue.put(Update.de_json(data, application.bot))
+
+        deadline = time.monotonic() + timeout
+        while len(collector.finished) < len(updates) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        duration = max(collector.finished.values(), default=started) - started
+        stats = bot.dispatch_stats()
+        caches = {"search": bot.search_cache.stats(), "book": bot.book_cache.stats()}
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await bot._shutdown(application)
+    after = resource.getrusage(resource.RUSAGE_SELF)
+
+    processed = len(collector.finished)
+    end_to_end = [
+        (finished - enqueued[update_id]) * 1000
+        for update_id, finished in collector.finished.items() if update_id in enqueued
+    ]
+    handlers = {
+        name.split(".", 1)[1]: summarize(values)
+        for name, values in sorted(collector.durations.items()) if name.startswith("handler.")
+    }
+    spans = {
+        name: summarize(values)
+        for name, values in sorted(collector.durations.items())
+        if not name.startswith("handler.") and name != "update"
+    }
+    cpu = (after.ru_utime - usage.ru_utime) + (after.ru_stime - usage.ru_stime)
+    return {
+        "updates": len(updates),
+        "processed": processed,
+        "duration_s": round(duration, 3),
+        "throughput": round(processed / duration, 2) if duration > 0 else 0.0,
+        "end_to_end": summarize(end_to_end),
+        "handlers": handlers,
+        "spans": spans,
+        "resources": {
+            "cpu_s": round(cpu, 3),
+            "cpu_per_update_ms": round(cpu * 1000 / processed, 3) if processed else 0.0,
+            # ru_maxrss в Linux - килобайты
+            "max_rss_mb": round(after.ru_maxrss / 1024, 1)
+        },
+        "bot": {"caches": caches, "flights": stats["flights"], "send": stats["send"]}
+    }
+
+
+def save_results(results, directory=RESULTS_DIR, prefix=""):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{prefix}{stamp}-{results['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1, default=str)
+    return path
+
+
+def compare_results(old, new, threshold=0.1, noise_ms=1.0):
+    """Регрессии new относительно old: падение пропускной способности или рост перцентилей больше threshold.
+
+    Рост задержки меньше noise_ms миллисекунд не считается регрессией.
+    """
+    regressions = []
+    if old["throughput"] and new["throughput"] < old["throughput"] * (1 - threshold):
+        regressions.append(f"throughput: {old['throughput']} -> {new['throughput']} обн/с")
+    series = [("end_to_end", old["end_to_end"], new["end_to_end"])]
+    series += [
+        (f"handler {name}", old["handlers"][name], summary)
+        for name, summary in new["handlers"].items() if name in old["handlers"]
+    ]
+    for name, before, after in series:
+        for key in ("p50", "p95", "p99"):
+            if after[key] - before[key] > max(noise_ms, before[key] * threshold):
+                regressions.append(f"{name} {key}: {before[key]} -> {after[key]} мс")
+    return regressions
+
+
+def format_results(results):
+    lines = [
+        f"Коммит {results['commit']}: {results['processed']}/{results['updates']} обновлений "
+        f"за {results['duration_s']} с, {results['throughput']} обн/с",
+        f"{'':32}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    ]
+    rows = [("end_to_end", results["end_to_end"])]
+    rows += [(f"handler.{name}", summary) for name, summary in results["handlers"].items()]
+    rows += list(results["spans"].items())
+    for name, summary in rows:
+        lines.append(
+            f"{name:32}{summary['count']:>8}{summary['p50']:>10}{summary['p95']:>10}"
+            f"{summary['p99']:>10}{summary['max']:>10}"
+        )
+    resources = results["resources"]
+    lines.append(
+        f"CPU {resources['cpu_s']} с ({resources['cpu_per_update_ms']} мс на обновление), "
+        f"RSS {resources['max_rss_mb']} МБ"
+    )
+    return "\n".join(lines)
+
+
+def add_config_arguments(parser, defaults):
+    """Параметр командной строки --имя-параметра на каждый ключ defaults"""
+    for key, default in defaults.items():
+        if isinstance(default, bool):
+            # Включённое по умолчанию отключается флагом --no-имя-параметра
+            flag = f"--no-{key.replace('_', '-')}" if default else f"--{key.replace('_', '-')}"
+            parser.add_argument(flag, dest=key, action="store_false" if default else "store_true")
+        else:
+            parser.add_argument(f"--{key.replace('_', '-')}", type=type(default) if default is not None else str,
+                                default=default)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк бота на локальном стенде Google Books / OpenLibrary / Bot API")
+    add_config_arguments(parser, DEFAULTS)
+    parser.add_argument("--output", default=RESULTS_DIR, help="каталог для сохранения результатов")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="сравнить два сохранённых результата вместо запуска")
+    parser.add_argument("--baseline", help="сохранённый результат, с которым сравнить новый замер")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+        new = asyncio.run(run_benchmark(**{key: getattr(args, key) for key in DEFAULTS}))
+        print(format_results(new))
+        if not args.no_save:
+            print(f"Результаты сохранены в {save_results(new, args.output)}")
+        if not args.baseline:
+            return 0
+        with open(args.baseline, encoding="utf-8") as f:
+            old = json.load(f)
+
+    regressions = compare_results(old, new, args.threshold)
+    for line in regressions:
+        print(f"Регрессия: {line}")
+    if not regressions:
+        print(f"Регрессий относительно {old['commit']} нет")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+import gc
+import os
+import sys
+import random
+import asyncio
+import argparse
+import logging
+import platform
+import resource
+import tempfile
+import itertools
+from collections import Counter
+from datetime import datetime, timezone
+from telegram import Update
+from app.src import tracing
+from bench.src.run import (
+    DEFAULTS as BENCH_DEFAULTS, RESULTS_DIR, make_stack, bot_env, patched_env, summarize,
+    git_commit, save_results, add_config_arguments
+)
+from bench.src.traffic import BehaviorModel, SEARCH, ADD, VIEW, NEXT_PAGE, REMOVE, END, READS
+from bench.src.workload import message_update, callback_update
+
+DEFAULTS = {
+    "duration": 3600.0,  # секунд
+    "rate": 10.0,  # обновлений в секунду вне пиков
+    "users": 10000,
+    "think_time": 5.0,  # средняя пауза пользователя между действиями, с
+    "zipf_s": 1.1,
+    "catalog": 2000,
+    "model": None,  # JSON с моделью поведения, см. BehaviorModel.from_file
+    "peak_factor": 3.0,  # во сколько раз растёт поток в пик
+    "peak_period": 900.0,  # пик повторяется каждые peak_period секунд
+    "peak_length": 60.0,
+    "interval": 60.0,  # окно статистики, с
+    "warmup": 0.1,  # доля прогона, не учитываемая в трендах
+    "max_memory_growth": 50.0,  # МБ в час
+    "max_latency_drift": 1.5,  # рост p95 от начала к концу прогона
+    "seed": 0,
+    **{key: BENCH_DEFAULTS[key] for key in (
+        "google_latency", "openlibrary_latency", "telegram_latency", "jitter",
+        "google_errors", "openlibrary_errors", "telegram_errors", "send_limits", "db_url"
+    )}
+}
+
+# Сколько ждать ответа бота на одно обновление
+UPDATE_TIMEOUT = 60
+
+
+def current_rss_mb():
+    """Текущий резидентный объём процесса; вне Linux - пиковый"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def slope(xs, ys):
+    """Наклон прямой наименьших квадратов"""
+    if len(xs) < 2:
+        return 0.0
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+class WindowCollector:
+    """Экспортёр трасс: будит ждущих ответа на обновление и копит длительности текущего окна"""
+
+    def __init__(self):
+        self.pending = {}  # update_id -> Future
+        self.window = {}
+        self.errors = 0
+
+    def export(self, spans):
+        for span in spans:
+            self.window.setdefault(span.name, []).append(span.duration * 1000)
+            if span.parent_id is None:
+                if "error" in span.tags:
+                    self.errors += 1
+                future = self.pending.pop(span.tags.get("update_id"), None)
+                if future is not None and not future.done():
+                    future.set_result(span.duration)
+
+    def drain(self):
+        window, self.window = self.window, {}
+        return window
+
+
+class Soak:
+    """Длительный прогон BookBot потоком сессий виртуальных пользователей.
+
+    Сессии приходят пуассоновским потоком так, чтобы в среднем давать rate
+    обновлений в секунду, в пики - rate * peak_factor. Пользователь отправляет
+    следующее действие после ответа бота и паузы на раздумье; кнопки он нажимает
+    те, что бот показал ему на стенде Bot API.
+    """
+
+    def __init__(self, bot, stack, model, config, on_sample=None):
+        self.bot = bot
+        self.application = bot.application
+        self.telegram = stack.telegram
+        self.model = model
+        self.config = config
+        self.on_sample = on_sample
+        self.rng = random.Random(config["seed"])
+        self.collector = WindowCollector()
+        self.mean_actions = model.mix(seed=config["seed"])["actions_per_session"]
+        self.active = set()
+        self.actions = Counter()
+        self.fallbacks = Counter()
+        self.lost = 0
+        self.samples = []
+        self._update_ids = itertools.count(1)
+
+    def rate_at(self, elapsed):
+        """Целевой поток обновлений в момент elapsed: пик в конце каждого периода"""
+        rate = self.config["rate"]
+        if self.config["peak_period"] and elapsed % self.config["peak_period"] >= (
+                self.config["peak_period"] - self.config["peak_length"]):
+            return rate * self.config["peak_factor"]
+        return rate
+
+    def build(self, action, user_id):
+        """Обновление для действия; без нужной кнопки на экране действие заменяется ближайшим"""
+        update_id = next(self._update_ids)
+        prefix = {ADD: "add_", REMOVE: "unfav_", NEXT_PAGE: "favnext_"}.get(action)
+        if prefix is not None:
+            buttons = self.telegram.buttons(user_id, prefix)
+            if buttons:
+                message_id, keyboard, data = self.rng.choice(buttons)
+                return action, callback_update(update_id, user_id, data, message_id, keyboard)
+            self.fallbacks[action] += 1
+            action = SEARCH if action == ADD else VIEW
+        if action == VIEW:
+            return action, message_update(update_id, user_id, "⭐ Избранное")
+        return SEARCH, message_update(update_id, user_id, self.model.query(self.rng))
+
+    async def send(self, data):
+        """Отдаёт обновление боту и ждёт окончания его обработки"""
+        future = asyncio.get_running_loop().create_future()
+        key = str(data["update_id"])
+        self.collector.pending[key] = future
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        try:
+            await asyncio.wait_for(future, UPDATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.collector.pending.pop(key, None)
+            self.lost += 1
+
+    async def session(self, user_id):
+        state = "start"
+        try:
+            while True:
+                action = self.model.next_action(state, self.rng)
+                if action == END:
+                    return
+                state, data = self.build(action, user_id)
+                self.actions[state] += 1
+                await self.send(data)
+                await asyncio.sleep(self.model.think(self.rng))
+        finally:
+            self.active.discard(user_id)
+
+    def sample(self, elapsed, interval):
+        window = self.collector.drain()
+        updates = window.get("update", [])
+        dispatch = self.bot.update_processor.stats()
+        sample = {
+            "t": round(elapsed, 1),
+            "target_rate": self.rate_at(elapsed),
+            "throughput": round(len(updates) / interval, 2),
+            "latency": summarize(updates),
+            "handlers": {
+                name.split(".", 1)[1]: summarize(values)["p95"]
+                for name, values in sorted(window.items()) if name.startswith("handler.")
+            },
+            "sessions": len(self.active),
+            "queue_depth": self.application.update_queue.qsize(),
+            "waiting": dispatch["waiting"],
+            "rss_mb": round(current_rss_mb(), 1),
+            "objects": len(gc.get_objects()),
+            "tasks": len(asyncio.all_tasks()),
+            "http": self.bot.http.stats(),
+            "db_pool": self.bot.db.pool_stats(),
+            "caches": {
+                "search": self.bot.search_cache.stats()["size"],
+                "book": self.bot.book_cache.stats()["size"],
+                "author": self.bot.open_lib_api.authors.cache.stats()["size"]
+            },
+            "send_chats": self.bot.send_scheduler.stats()["chats"],
+            "errors": self.collector.errors,
+            "lost": self.lost
+        }
+        self.samples.append(sample)
+        if self.on_sample is not None:
+            self.on_sample(sample)
+
+    async def _sampler(self, started, stop):
+        loop = asyncio.get_running_loop()
+        last = started
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.config["interval"])
+            except asyncio.TimeoutError:
+                pass
+            now = loop.time()
+            if now - last > 0:
+                self.sample(now - started, now - last)
+            last = now
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(self._sampler(started, stop))
+        sessions = set()
+        try:
+            while True:
+                elapsed = loop.time() - started
+                if elapsed >= self.config["duration"]:
+                    break
+                await asyncio.sleep(self.rng.expovariate(self.rate_at(elapsed) / self.mean_actions))
+                user_id = self.rng.randint(1, self.config["users"])
+                if user_id in self.active:
+                    continue
+                self.active.add(user_id)
+                task = asyncio.create_task(self.session(user_id))
+                sessions.add(task)
+                task.add_done_callback(sessions.discard)
+            for task in list(sessions):
+                task.cancel()
+            await asyncio.gather(*sessions, return_exceptions=True)
+            # Уже отправленные обновления дорабатываются до конца
+            deadline = loop.time() + UPDATE_TIMEOUT
+            while self.collector.pending and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            stop.set()
+            await sampler
+        return self.report()
+
+    def report(self):
+        """Итоги прогона: тренды памяти и задержки после прогрева и найденные проблемы"""
+        config = self.config
+        steady = [sample for sample in self.samples if sample["t"] > config["duration"] * config["warmup"]]
+        if len(steady) < 2:
+            steady = self.samples
+        hours = [sample["t"] / 3600 for sample in steady]
+        memory_growth = slope(hours, [sample["rss_mb"] for sample in steady])
+        objects_growth = slope(hours, [sample["objects"] for sample in steady])
+        p95 = [sample["latency"]["p95"] for sample in steady if sample["latency"]["count"]]
+        third = max(len(p95) // 3, 1)
+        head = sorted(p95[:third])
+        tail = sorted(p95[-third:])
+        # Медианы p95 первой и последней трети окон устойчивее отдельных всплесков
+        drift = tail[len(tail) // 2] / head[len(head) // 2] if head and head[len(head) // 2] else 1.0
+        last = self.samples[-1] if self.samples else {"http": self.bot.http.stats(), "errors": 0}
+        db_checked_out = max((sample["db_pool"].get("checkedout", 0) for sample in self.samples), default=0)
+
+        problems = []
+        if memory_growth > config["max_memory_growth"]:
+            problems.append(f"память растёт на {memory_growth:.1f} МБ/ч")
+        if drift > config["max_latency_drift"]:
+            problems.append(f"p95 задержки вырос в {drift:.2f} раза")
+        if last["http"]["pool_waits"]:
+            problems.append(f"пул HTTP исчерпан: {last['http']['pool_waits']} запросов ждали соединения")
+        if self.lost:
+            problems.append(f"{self.lost} обновлений без ответа за {UPDATE_TIMEOUT} с")
+        if last["errors"]:
+            problems.append(f"{last['errors']} обновлений завершились исключением")
+
+        total = sum(self.actions.values()) or 1
+        reads = sum(self.actions[action] for action in READS)
+        return {
+            "updates": total,
+            "actions": dict(self.actions),
+            "fallbacks": dict(self.fallbacks),
+            "read_write_ratio": round(reads / max(total - reads, 1), 2),
+            "memory_growth_mb_per_hour": round(memory_growth, 1),
+            "objects_growth_per_hour": round(objects_growth),
+            "latency_drift": round(drift, 2),
+            "db_max_checked_out": db_checked_out,
+            "http": last["http"],
+            "lost": self.lost,
+            "problems": problems,
+            "samples": self.samples
+        }
+
+
+async def run_soak(on_sample=None, **config):
+    """Длительный прогон BookBot на стенде с моделью поведения пользователей"""
+    from app.src.bot import BookBot
+    config = {**DEFAULTS, **config}
+    overrides = {key: config[key] for key in ("think_time", "zipf_s", "catalog")}
+    if config["model"]:
+        model = BehaviorModel.from_file(config["model"], **overrides)
+    else:
+        model = BehaviorModel(**overrides)
+    stack = make_stack(config)
+    collector_tracer = tracing.TRACER
+
+    await stack.start()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            with patched_env(bot_env(config, stack, directory)):
+                bot = BookBot()
+                soak = Soak(bot, stack, model, config, on_sample)
+                tracing.TRACER = tracing.Tracer(1.0, soak.collector)
+                await bot.application.initialize()
+                await bot.application.start()
+                try:
+                    report = await soak.run()
+                finally:
+                    await bot.application.stop()
+                    await bot.application.shutdown()
+                    await bot._shutdown(bot.application)
+        finally:
+            tracing.TRACER = collector_tracer
+            await stack.stop()
+
+    report.update({
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config,
+        "upstream": stack.stats()
+    })
+    return report
+
+
+def format_sample(sample):
+    latency = sample["latency"]
+    return (
+        f"{sample['t']:>8.0f} с  {sample['throughput']:>7} обн/с (цель {sample['target_rate']:g})  "
+        f"p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} мс  "
+        f"RSS {sample['rss_mb']} МБ  сессий {sample['sessions']}  очередь {sample['queue_depth']}  "
+        f"ожидания пула HTTP {sample['http']['pool_waits']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Длительный прогон бота моделью поведения пользователей")
+    add_config_arguments(parser, DEFAULTS)
+    parser.add_argument("--output", default=RESULTS_DIR, help="каталог для сохранения результатов")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_soak(
+        on_sample=lambda sample: print(format_sample(sample), flush=True),
+        **{key: getattr(args, key) for key in DEFAULTS}
+    ))
+    print(
+        f"Обновлений {report['updates']}, чтений на запись {report['read_write_ratio']}, "
+        f"рост памяти {report['memory_growth_mb_per_hour']} МБ/ч, дрейф p95 x{report['latency_drift']}"
+    )
+    if not args.no_save:
+        print(f"Результаты сохранены в {save_results(report, args.output, prefix='soak-')}")
+    for problem in report["problems"]:
+        print(f"Проблема: {problem}")
+    return 1 if report["problems"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+import statistics
+from bench.src.run import DEFAULTS, make_stack, bot_env
+from bench.src.workload import message_update
+
+BOT_SCRIPT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app", "src", "bot.py"))
+
+
+async def cold_start(stack, env, update_id, timeout=60):
+    """Запускает bot.py отдельным процессом и ждёт ответа на /start: (секунды, вывод процесса)"""
+    before = stack.telegram.requests["sendMessage"]
+    stack.telegram.push_update(message_update(update_id, 1, "/start"))
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, BOT_SCRIPT, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        while stack.telegram.requests["sendMessage"] == before:
+            if process.returncode is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError("Бот не ответил на /start")
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGTERM)
+        output, _ = await process.communicate()
+    return elapsed, output.decode(errors="replace")
+
+
+async def measure(runs=5):
+    """Время от запуска процесса бота до первого обработанного обновления по runs запускам"""
+    stack = make_stack({**DEFAULTS, "google_latency": 0, "openlibrary_latency": 0, "telegram_latency": 0})
+    await stack.start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, **bot_env(DEFAULTS, stack, directory), "BOT_MODE": "polling"}
+            results = [await cold_start(stack, env, update_id) for update_id in range(1, runs + 1)]
+    finally:
+        await stack.stop()
+    times = [elapsed for elapsed, _ in results]
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "min_ms": round(min(times) * 1000, 1),
+        "output": results[-1][1]
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Холодный запуск бота до первого обработанного обновления")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+    result = asyncio.run(measure(args.runs))
+    print(f"Холодный запуск до ответа на /start: медиана {result['median_ms']} мс, "
+          f"минимум {result['min_ms']} мс ({result['runs']} запусков)")
+    startup = [line for line in result["output"].splitlines() if "Запуск" in line]
+    if startup:
+        print(startup[-1])
+
+
+if __name__ == "__main__":
+    main()
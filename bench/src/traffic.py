@@ -0,0 +1,89 @@
+import json
+import random
+import itertools
+from bench.src.workload import QUERIES
+
+SEARCH = "search"
+ADD = "add"
+VIEW = "view"
+NEXT_PAGE = "next_page"
+REMOVE = "remove"
+END = "end"
+
+READS = (SEARCH, VIEW, NEXT_PAGE)
+WRITES = (ADD, REMOVE)
+
+# Вероятности следующего действия после текущего; сессия начинается с поиска.
+# Дают около трёх чтений на одну запись, как в рабочем трафике бота.
+DEFAULT_TRANSITIONS = {
+    "start": {SEARCH: 1.0},
+    SEARCH: {ADD: 0.28, SEARCH: 0.32, VIEW: 0.15, END: 0.25},
+    ADD: {ADD: 0.15, SEARCH: 0.3, VIEW: 0.25, END: 0.3},
+    VIEW: {REMOVE: 0.25, NEXT_PAGE: 0.15, SEARCH: 0.2, END: 0.4},
+    NEXT_PAGE: {REMOVE: 0.3, NEXT_PAGE: 0.15, END: 0.55},
+    REMOVE: {REMOVE: 0.2, VIEW: 0.1, SEARCH: 0.2, END: 0.5},
+}
+
+
+class BehaviorModel:
+    """Модель поведения пользователя: цепь Маркова действий, паузы и популярность запросов.
+
+    Паузы между действиями распределены экспоненциально со средним think_time
+    секунд. Запросы выбираются из каталога catalog запросов с вероятностью,
+    пропорциональной 1 / ранг^zipf_s.
+    """
+
+    def __init__(self, transitions=None, think_time=5.0, zipf_s=1.1, catalog=2000):
+        self.transitions = {
+            state: (list(choices), list(itertools.accumulate(choices.values())))
+            for state, choices in (transitions or DEFAULT_TRANSITIONS).items()
+        }
+        self.think_time = think_time
+        self.zipf_s = zipf_s
+        # Известные названия - самые популярные, дальше длинный хвост редких запросов
+        self.queries = (QUERIES + [f"книга {n}" for n in range(1, catalog + 1)])[:max(catalog, 1)]
+        self._query_weights = list(itertools.accumulate(
+            1 / rank ** zipf_s for rank in range(1, len(self.queries) + 1)
+        ))
+
+    @classmethod
+    def from_file(cls, path, **overrides):
+        """Модель из JSON с ключами transitions, think_time, zipf_s, catalog"""
+        with open(path, encoding="utf-8") as f:
+            return cls(**{**json.load(f), **overrides})
+
+    def next_action(self, state, rng):
+        actions, weights = self.transitions.get(state, ([END], [1]))
+        return rng.choices(actions, cum_weights=weights)[0]
+
+    def think(self, rng):
+        return rng.expovariate(1 / self.think_time) if self.think_time else 0.0
+
+    def query(self, rng):
+        return rng.choices(self.queries, cum_weights=self._query_weights)[0]
+
+    def session(self, rng, limit=100):
+        """Действия одной сессии без учёта ответов бота"""
+        actions = []
+        state = "start"
+        while len(actions) < limit:
+            state = self.next_action(state, rng)
+            if state == END:
+                break
+            actions.append(state)
+        return actions
+
+    def mix(self, sessions=10000, seed=0):
+        """Средняя длина сессии и доли действий, оценённые моделированием"""
+        rng = random.Random(seed)
+        counts = dict.fromkeys(READS + WRITES, 0)
+        for _ in range(sessions):
+            for action in self.session(rng):
+                counts[action] += 1
+        total = sum(counts.values()) or 1
+        reads = sum(counts[action] for action in READS)
+        return {
+            "actions_per_session": total / sessions,
+            "read_write_ratio": reads / max(total - reads, 1),
+            "shares": {action: count / total for action, count in counts.items()}
+        }
@@ -0,0 +1,83 @@
+import time
+import asyncio
+import argparse
+from types import SimpleNamespace
+from app.src.dispatch import ChatOrderedUpdateProcessor
+from app.src.shared import MemoryBackend, ShardedIngress, UpdateWorker
+from bench.src.workload import message_update
+
+
+def chat_updates(count, chats):
+    """count текстовых сообщений, по кругу из chats личных чатов"""
+    return [message_update(n, 1000 + n % chats, f"Query {n}") for n in range(count)]
+
+
+async def run_workers(workers, updates, per_worker_concurrency=4, handle_time=0.01):
+    """Прогоняет обновления через приём и workers обработчиков с общим хранилищем в памяти.
+
+    Возвращает (секунды, обработанные (номер обработчика, чат, update_id) в порядке обработки,
+    число обновлений, разложенных приёмом по каждому обработчику).
+    """
+    backend = MemoryBackend()
+    ingress = ShardedIngress(backend, workers=workers)
+    handled = []
+
+    async def handle(worker_id, update):
+        await asyncio.sleep(handle_time)
+        handled.append((worker_id, update.effective_chat.id, update.update_id))
+
+    async def consume(worker_id, application, processor, count):
+        # Упрощённый Application: обновления из очереди отдаются обработчику обновлений
+        await processor.initialize()
+        tasks = []
+        while len(tasks) < count:
+            update = await application.update_queue.get()
+            tasks.append(asyncio.create_task(processor.process_update(update, handle(worker_id, update))))
+        await asyncio.gather(*tasks)
+
+    for data in updates:
+        await ingress.route(data)
+    stop = asyncio.Event()
+    start = time.perf_counter()
+    runners = []
+    consumers = []
+    for worker_id in range(workers):
+        application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+        runners.append(asyncio.create_task(UpdateWorker(application, backend, worker_id, poll_timeout=0.05).run(stop)))
+        consumers.append(consume(
+            worker_id, application, ChatOrderedUpdateProcessor(per_worker_concurrency), ingress.routed[worker_id]
+        ))
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*runners)
+    return elapsed, handled, list(ingress.routed)
+
+
+async def measure(worker_counts=(1, 2, 4), updates=256, chats=64, per_worker_concurrency=4, handle_time=0.01):
+    """Пропускная способность (обновлений в секунду) для каждого числа обработчиков"""
+    batch = chat_updates(updates, chats)
+    results = {}
+    for workers in worker_counts:
+        elapsed, _, routed = await run_workers(workers, batch, per_worker_concurrency, handle_time)
+        results[workers] = {"updates_per_second": round(len(batch) / elapsed, 1), "routed": routed}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пропускная способность приёма и обработчиков в зависимости от их числа")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=256)
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4, help="обновлений одновременно на обработчик")
+    parser.add_argument("--handle-ms", type=float, default=10.0, help="время обработки одного обновления")
+    args = parser.parse_args(argv)
+    results = asyncio.run(measure(args.workers, args.updates, args.chats, args.concurrency, args.handle_ms / 1000))
+    base = results[args.workers[0]]["updates_per_second"]
+    for workers, result in results.items():
+        print(f"{workers} обработчиков: {result['updates_per_second']} обновлений/с "
+              f"(x{result['updates_per_second'] / base:.2f}), по очередям {result['routed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+from bench.src.fake_stack import book_ids
+
+SEARCH = "search"
+ADD = "add"
+FAVORITES = "favorites"
+
+# Доли действий в потоке обновлений
+DEFAULT_MIX = {SEARCH: 0.6, ADD: 0.3, FAVORITES: 0.1}
+
+QUERIES = [
+    "Мастер и Маргарита", "Преступление и наказание", "Война и мир", "Анна Каренина",
+    "Мёртвые души", "Евгений Онегин", "Отцы и дети", "Герой нашего времени",
+    "Собачье сердце", "Идиот", "Братья Карамазовы", "Горе от ума", "Обломов",
+    "Тихий Дон", "Доктор Живаго", "Двенадцать стульев", "Золотой телёнок",
+    "Пикник на обочине", "Трудно быть богом", "Понедельник начинается в субботу",
+    "Мы", "Белая гвардия", "Вишнёвый сад", "Капитанская дочка", "Ревизор",
+    "Гарри Поттер", "Властелин колец", "1984", "Три товарища", "Маленький принц",
+]
+
+
+def message_update(update_id, user_id, text):
+    """Текстовое сообщение пользователя в личном чате с ботом"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1718000000,
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text
+        }
+    }
+
+
+def callback_update(update_id, user_id, data, message_id, keyboard):
+    """Нажатие кнопки data под сообщением message_id с клавиатурой keyboard"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": user,
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": 1718000000,
+                "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+                "text": "Результаты поиска",
+                "reply_markup": {"inline_keyboard": keyboard}
+            }
+        }
+    }
+
+
+def synthetic_updates(count, users=100, mix=None, seed=0):
+    """Поток обновлений Bot API: поиски, добавления в избранное из выдачи и просмотры избранного.
+
+    Популярность запросов убывает как 1/ранг, поэтому часть поисков повторяется.
+    Добавляется книга из последней выдачи пользователя; пока он ничего не искал,
+    вместо добавления выполняется поиск.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    actions, action_weights = zip(*mix.items())
+    query_weights = [1 / rank for rank in range(1, len(QUERIES) + 1)]
+    last_query = {}
+    for update_id in range(1, count + 1):
+        user_id = rng.randint(1, users)
+        action = rng.choices(actions, action_weights)[0]
+        if action == ADD and user_id in last_query:
+            ids = book_ids("google", last_query[user_id])
+            # Сообщение с кнопками добавления, как его рисует _render_search_results
+            keyboard = [[{"text": f"⭐ {n}", "callback_data": f"add_{item}"} for n, item in enumerate(ids, 1)]]
+            yield callback_update(update_id, user_id, f"add_{rng.choice(ids)}", update_id, keyboard)
+        elif action == FAVORITES:
+            yield message_update(update_id, user_id, "⭐ Избранное")
+        else:
+            query = rng.choices(QUERIES, query_weights)[0]
+            last_query[user_id] = query
+            yield message_update(update_id, user_id, query)
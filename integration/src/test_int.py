@@ -3,6 +3,7 @@ from unittest.mock import AsyncMock, MagicMock, patch, ANY
 from telegram import Update, Message, CallbackQuery, User, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 from app.src.bot import BookBot
+from app.src.records import BookRecord
 import asyncio
 
 # Фикстуры
@@ -37,13 +38,13 @@ def mock_db():
     return db
 
 # Тестовые данные
-TEST_BOOK = {
-    "id": "test_id_123",
-    "title": "Гарри Поттер и Философский камень",
-    "authors": "Дж. К. Роулинг",
-    "description": "Книга о мальчике-волшебнике...",
-    "thumbnail": "http://example.com/cover.jpg"
-}
+TEST_BOOK = BookRecord(
+    "test_id_123",
+    title="Гарри Поттер и Философский камень",
+    authors="Дж. К. Роулинг",
+    description="Книга о мальчике-волшебнике...",
+    thumbnail="http://example.com/cover.jpg"
+)
 
 # Тест
 @pytest.mark.asyncio
@@ -84,22 +85,23 @@ async def test_search_and_add_to_favorites(mock_update, mock_callback_update, mo
             
             # Проверяем сохранение в БД
             args, _ = mock_db.add_favorite.call_args
-            saved_book = args[0]
+            saved_book, saved_user_id = args
             
             # Проверяем ключевые поля
             assert saved_book['id'] == TEST_BOOK['id']
             assert saved_book['title'] == TEST_BOOK['title']
             assert saved_book['authors'] == TEST_BOOK['authors']
             assert saved_book['thumbnail'] == TEST_BOOK['thumbnail']
-            assert 'user_id' in saved_book  # Проверяем наличие поля
+            assert saved_user_id is mock_callback_update.callback_query.from_user.id
     
     # 7. Тестируем просмотр избранного
-    mock_db.get_favorites.return_value = [TEST_BOOK]
+    mock_db.get_favorites_page = AsyncMock(return_value={
+        "books": [TEST_BOOK], "start": f"1:{TEST_BOOK['id']}", "prev": None, "next": None
+    })
     await bot.show_favorites(mock_update, mock_context)
     
-    # Проверяем основные параметры вывода
-    args, kwargs = mock_update.message.reply_photo.call_args
-    assert kwargs['photo'] == TEST_BOOK['thumbnail']
-    assert TEST_BOOK['title'] in kwargs['caption']
-    assert TEST_BOOK['authors'] in kwargs['caption']
+    # Проверяем основные параметры вывода: страница избранного одним сообщением
+    args, kwargs = mock_update.message.reply_text.call_args
+    assert TEST_BOOK['title'] in args[0]
+    assert TEST_BOOK['authors'] in args[0]
     assert isinstance(kwargs['reply_markup'], InlineKeyboardMarkup)
@@ -0,0 +1,79 @@
+import pytest
+from bench.src.fake_stack import FakeStack, book_ids
+from bench.src.workload import synthetic_updates
+from bench.src.run import run_benchmark, compare_results
+from bench.src.startup import measure
+from bench.src import records, workers
+from app.src.http_client import HttpClient
+
+
+def test_synthetic_updates_are_reproducible():
+    first = list(synthetic_updates(50, users=5, seed=1))
+    assert first == list(synthetic_updates(50, users=5, seed=1))
+    assert first != list(synthetic_updates(50, users=5, seed=2))
+    # Добавлять можно только книги из выдачи стенда на последний поиск пользователя
+    clicks = [update["callback_query"] for update in first if "callback_query" in update]
+    assert clicks
+    for click in clicks:
+        buttons = click["message"]["reply_markup"]["inline_keyboard"][0]
+        assert click["data"] in [button["callback_data"] for button in buttons]
+
+
+@pytest.mark.asyncio
+async def test_fake_stack_replays_fixtures():
+    stack = FakeStack(google={"latency": 0}, openlibrary={"latency": 0, "error_rate": 1.0}, telegram={"latency": 0})
+    await stack.start()
+    http = HttpClient()
+    try:
+        data = await http.get_json(stack.env()["GOOGLE_BOOKS_URL"], params={"q": "Война и мир", "maxResults": 3})
+        assert [item["id"] for item in data["items"]] == book_ids("google", "Война и мир", 3)
+        with pytest.raises(Exception):
+            await http.get_json(f"{stack.openlibrary.url}/search.json", params={"q": "Война и мир"})
+    finally:
+        await http.close()
+        await stack.stop()
+    assert stack.stats()["google"]["requests"] == {"search": 1}
+    assert stack.stats()["openlibrary"]["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_benchmark_drives_real_bot():
+    results = await run_benchmark(
+        updates=60, users=10, google_latency=0.01, openlibrary_latency=0.01, telegram_latency=0.001
+    )
+    assert results["processed"] == 60
+    assert results["throughput"] > 0
+    assert set(results["handlers"]) == {"search_books", "handle_button_click", "show_favorites"}
+    assert results["end_to_end"]["p99"] >= results["end_to_end"]["p50"] > 0
+    # Все исходящие запросы бота дошли до стенда Bot API, а поиск - до Google Books
+    telegram = results["upstream"]["telegram"]["requests"]
+    assert telegram["sendMessage"] >= results["handlers"]["search_books"]["count"]
+    assert results["upstream"]["google"]["requests"]["search"] >= 1
+
+    assert compare_results(results, results) == []
+    slower = {**results, "throughput": results["throughput"] / 2}
+    assert compare_results(results, slower)
+
+
+@pytest.mark.asyncio
+async def test_cold_start_to_first_update():
+    # Отдельный процесс бота получает /start через getUpdates стенда и отвечает на него
+    result = await measure(runs=1)
+    assert result["median_ms"] > 0
+    assert "до первого обновления" in result["output"]
+
+
+def test_book_records_are_smaller_than_dicts():
+    result = records.measure(count=2000, page_size=50, repeat=1)
+    assert result["bytes_per_record"] < result["bytes_per_dict"] / 2
+    assert result["json_bytes_per_record"] < result["json_bytes_per_dict"]
+    assert result["render_records_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_workers_throughput_report():
+    result = await workers.measure(worker_counts=(1, 2), updates=32, chats=8, handle_time=0.001)
+    assert set(result) == {1, 2}
+    assert result[1]["routed"] == [32]
+    assert sum(result[2]["routed"]) == 32
+    assert all(entry["updates_per_second"] > 0 for entry in result.values())
@@ -1,22 +1,29 @@
 import pytest
 import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from unittest.mock import AsyncMock, MagicMock, patch, PropertyMock
 from telegram import Update, Message, CallbackQuery, User, Chat, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 from app.src.bot import BookBot
+from app.src.records import BookRecord
+from app.src.shared import shard_for
+from bench.src.workers import run_workers, chat_updates
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
 import os
 
 @pytest.fixture
 def mock_engine():
-    return MagicMock()
+    return create_engine("sqlite:///:memory:")
 
 @pytest.fixture
 def mock_session(mock_engine):
-    return MagicMock()
+    return sessionmaker(bind=mock_engine)
 
 @pytest.fixture
 def bot(mock_engine, mock_session):
-    with patch.dict('os.environ', {"TELEGRAM_TOKEN": "test_token", "DB_URL": "sqlite:///:memory:"}):
+    with patch.dict('os.environ', {"TELEGRAM_TOKEN": "test_token", "DB_URL": "sqlite:///:memory:", "DB_AUTO_MIGRATE": "1"}):
         return BookBot(engine=mock_engine, session=mock_session)
 
 @pytest.fixture
@@ -56,13 +63,13 @@ def mock_context():
 @pytest.mark.asyncio
 async def test_multiple_search_requests(bot, mock_update, mock_context):
     """Тестирование обработки множественных одновременных поисковых запросов"""
-    bot.google_api.search_books = AsyncMock(return_value=[{
-        "id": "test1",
-        "title": "Test Book",
-        "authors": "Test Author",
-        "description": "Test Description",
-        "thumbnail": None
-    }])
+    bot.google_api.search_books = AsyncMock(return_value=[BookRecord(
+        "test1",
+        title="Test Book",
+        authors="Test Author",
+        description="Test Description",
+        thumbnail=None
+    )])
     
     bot.open_lib_api.search_books = AsyncMock(return_value=[])
     
@@ -88,7 +95,10 @@ async def test_multiple_search_requests(bot, mock_update, mock_context):
     
     await asyncio.gather(*tasks)
     
-    assert bot.google_api.search_books.await_count == num
+    # Все задачи видят один и тот же запрос: к API уходит один вызов,
+    # остальные присоединяются к нему или берут результат из кэша
+    assert bot.google_api.search_books.await_count == 1
+    assert bot.search_cache.stats()["hits"] + bot.flights.stats()["coalesced"] == num - 1
     
     assert mock_update.message.reply_text.await_count == num
     
@@ -103,17 +113,20 @@ async def test_multiple_search_requests(bot, mock_update, mock_context):
 @pytest.mark.asyncio
 async def test_high_load_favorites(bot, mock_update, mock_context):
     """Тестирование загрузки избранного при большом количестве книг"""
-    # Создаем мок для 100 книг в избранном
     num = 1000
-    mock_favorites = [{
-        "id": f"test{i}",
-        "title": f"Test Book {i}",
-        "authors": f"Test Author {i}",
-        "description": f"Test Description {i}",
-        "thumbnail": None if i % 2 else f"http://example.com/cover_{i}.jpg"
-    } for i in range(num)]
-    
-    bot.db.get_favorites = AsyncMock(return_value=mock_favorites)
+    user_id = mock_update.effective_user.id
+    for i in range(num):
+        await bot.db.add_favorite({
+            "id": f"test{i}",
+            "title": f"Test Book {i}",
+            "authors": f"Test Author {i}",
+            "description": f"Test Description {i}",
+            "thumbnail": None if i % 2 else f"http://example.com/cover_{i}.jpg",
+            "user_id": user_id
+        })
+
+    statements = []
+    event.listen(bot.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
     
     # Мокаем методы сообщения
     mock_update.message = MagicMock(spec=Message)
@@ -121,15 +134,34 @@ async def test_high_load_favorites(bot, mock_update, mock_context):
     mock_update.message.chat.id = 123
     mock_update.message.reply_text = AsyncMock()
     mock_update.message.reply_photo = AsyncMock()
+    mock_update.message.reply_media_group = AsyncMock()
     mock_update.message._bot = mock_context.bot
     
-    # Вызываем показ избранного
+    # Вызываем показ избранного: одна страница - один запрос к БД и одно сообщение без обложек
     await bot.show_favorites(mock_update, mock_context)
-    
-    # Проверяем, что все книги были обработаны
-    assert bot.db.get_favorites.await_count == 1
-    assert mock_update.message.reply_text.await_count == num / 2  # Для книг без thumbnail
-    assert mock_update.message.reply_photo.await_count == num / 2  # Для книг с thumbnail
+    assert len(statements) == 1
+    assert mock_update.message.reply_media_group.await_count == 0
+    assert mock_update.message.reply_text.await_count == 1
+    assert mock_update.message.reply_photo.await_count == 0
+
+    # Листаем все страницы: стоимость глубоких страниц та же, что и первой
+    markup = mock_update.message.reply_text.call_args.kwargs["reply_markup"]
+    query = mock_update.callback_query
+    query.answer = AsyncMock()
+    query.edit_message_text = AsyncMock()
+    pages = 1
+    while True:
+        next_data = [b.callback_data for row in markup.inline_keyboard for b in row if b.callback_data.startswith("favnext_")]
+        if not next_data:
+            break
+        statements.clear()
+        query.data = next_data[0]
+        await bot.handle_button_click(mock_update, mock_context)
+        assert len(statements) == 1
+        markup = query.edit_message_text.call_args.kwargs["reply_markup"]
+        pages += 1
+    assert pages == num // bot.page_size
+    assert query.edit_message_text.await_count == pages - 1
 
 @pytest.mark.asyncio
 async def test_error_handling_under_load(bot, mock_update, mock_context):
@@ -158,3 +190,76 @@ async def test_error_handling_under_load(bot, mock_update, mock_context):
     assert mock_update.message.reply_text.await_count == num
     for call in mock_update.message.reply_text.call_args_list:
         assert "ошибка" in call[0][0].lower() or "error" in call[0][0].lower()
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_overlap(bot, mock_update, mock_context):
+    """Одновременные поиски через локальный фейковый Google Books не выстраиваются в очередь"""
+    num = 10
+    in_flight = 0
+    peak = 0
+    all_arrived = asyncio.Event()
+
+    async def volumes(request):
+        # Ответ задерживается, пока не придут все запросы: при очереди на клиенте они не сойдутся
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        if in_flight == num:
+            all_arrived.set()
+        try:
+            await asyncio.wait_for(all_arrived.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+        in_flight -= 1
+        return web.json_response({"items": [{
+            "id": "test1",
+            "volumeInfo": {"title": "Test Book", "authors": ["Test Author"]}
+        }]})
+
+    app = web.Application()
+    app.router.add_get("/books/v1/volumes", volumes)
+    server = TestServer(app)
+    await server.start_server()
+    bot.google_api.BASE_URL = str(server.make_url("/books/v1/volumes"))
+
+    def create_mock_update(text):
+        update = MagicMock(spec=Update)
+        update.effective_user = mock_update.effective_user
+        update.message = MagicMock(spec=Message)
+        update.message.text = text
+        update.message.reply_text = AsyncMock()
+        update.message.reply_photo = AsyncMock()
+        return update
+
+    updates = [create_mock_update(f"Test Query {i}") for i in range(num)]
+    try:
+        await asyncio.gather(*(bot.search_books(u, mock_context) for u in updates))
+    finally:
+        await bot.http.close()
+        await server.close()
+
+    for update in updates:
+        update.message.reply_text.assert_awaited_once()
+    assert peak == num
+
+
+@pytest.mark.asyncio
+async def test_workers_shard_chats_and_keep_chat_order():
+    """Чат целиком достаётся одному обработчику, нагрузка делится между всеми, порядок внутри чата сохраняется.
+
+    Пропускная способность по числу обработчиков замеряется в python -m bench.src.workers.
+    """
+    workers = 4
+    updates = chat_updates(256, chats=64)
+
+    _, handled, routed = await run_workers(workers, updates)
+
+    assert len(handled) == len(updates)
+    assert sum(routed) == len(updates)
+    assert all(routed)
+    for worker_id in range(workers):
+        assert sum(1 for worker, _, _ in handled if worker == worker_id) == routed[worker_id]
+    for chat_id in {chat_id for _, chat_id, _ in handled}:
+        assert {worker for worker, chat, _ in handled if chat == chat_id} == {shard_for(chat_id, workers)}
+        ids = [update_id for _, chat, update_id in handled if chat == chat_id]
+        assert ids == sorted(ids)
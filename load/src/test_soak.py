@@ -0,0 +1,69 @@
+import os
+import random
+import pytest
+from collections import Counter
+from bench.src.traffic import BehaviorModel, SEARCH, ADD, END
+from bench.src.soak import run_soak, slope
+
+# SOAK_DURATION=14400 превращает тест в многочасовой прогон с проверкой трендов
+SOAK_DURATION = float(os.getenv("SOAK_DURATION", 8))
+SOAK_RATE = float(os.getenv("SOAK_RATE", 30))
+
+
+def test_behavior_model_mix():
+    model = BehaviorModel()
+    mix = model.mix(sessions=20000)
+    assert 2.5 < mix["read_write_ratio"] < 3.5
+    assert mix["actions_per_session"] > 1
+
+    rng = random.Random(0)
+    # Каждая сессия начинается с поиска и добавляет только после поиска
+    for _ in range(100):
+        actions = model.session(rng)
+        assert actions[0] == SEARCH
+        assert END not in actions
+    assert not any(model.session(rng)[0] == ADD for _ in range(100))
+
+
+def test_query_popularity_is_zipf():
+    model = BehaviorModel(catalog=500)
+    rng = random.Random(1)
+    counts = Counter(model.query(rng) for _ in range(20000))
+    top = [count for _, count in counts.most_common(3)]
+    # Частота убывает с рангом, а хвост каталога всё же запрашивается
+    assert top[0] > top[1] > top[2]
+    assert counts[model.queries[0]] == top[0]
+    assert len(counts) > 200
+
+
+def test_slope():
+    assert slope([0, 1, 2], [1, 3, 5]) == 2
+    assert slope([1], [5]) == 0
+
+
+@pytest.mark.asyncio
+async def test_soak():
+    """Поток сессий с паузами и пиками через настоящий бот на стенде"""
+    long_run = SOAK_DURATION >= 600
+    report = await run_soak(
+        duration=SOAK_DURATION,
+        rate=SOAK_RATE,
+        users=10000 if long_run else 300,
+        think_time=5.0 if long_run else 0.2,
+        interval=60.0 if long_run else 1.0,
+        peak_period=900.0 if long_run else 4.0,
+        peak_length=60.0 if long_run else 1.0,
+        google_latency=0.05,
+        openlibrary_latency=0.1,
+        telegram_latency=0.01
+    )
+
+    assert report["lost"] == 0
+    assert len(report["samples"]) >= SOAK_DURATION / (60.0 if long_run else 1.0) - 1
+    assert report["actions"][SEARCH] > 0 and report["actions"][ADD] > 0
+    assert report["http"]["pool_waits"] == 0
+    # Кнопки нажимаются по сообщениям, которые бот действительно отправил
+    assert report["upstream"]["telegram"]["requests"]["editMessageReplyMarkup"] == report["actions"][ADD]
+    if long_run:
+        # В коротком прогоне рост памяти - это прогрев кэшей, тренды осмысленны только на длинном
+        assert report["problems"] == []
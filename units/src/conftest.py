@@ -0,0 +1,15 @@
+import pytest
+
+
+class FakeClock:
+    """Часы для тестов с ручным сдвигом времени: clock.now += секунды"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
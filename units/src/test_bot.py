@@ -3,10 +3,13 @@ import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.append(project_root)
 import pytest
-from unittest.mock import AsyncMock, MagicMock, patch
-from telegram import Update, Message, CallbackQuery, Chat, User, PhotoSize
+from unittest.mock import AsyncMock, MagicMock, patch, ANY
+from telegram import Update, Message, CallbackQuery, Chat, User, PhotoSize, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import CallbackContext
+from telegram.error import BadRequest
 from app.src.bot import BookBot
+from app.src.metrics import REGISTRY
+from app.src.records import BookRecord
 import asyncio
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
@@ -20,7 +23,8 @@ def bot():
         Base.metadata.create_all(engine)
         Session = sessionmaker(bind=engine)
 
-        return BookBot(engine, Session)
+        with patch.dict(os.environ, {"TELEGRAM_TOKEN": "123:test"}):
+            return BookBot(engine, Session)
 
 @pytest.fixture
 def update():
@@ -74,13 +78,13 @@ async def test_search_books_no_results(bot, update, context):
 
 @pytest.mark.asyncio
 async def test_search_books_with_google_results(bot, update, context):
-    test_book = {
-        "title": "Test Book",
-        "authors": "Test Author",
-        "description": "Test Description",
-        "id": "test_id",
-        "thumbnail": "http://test.com/image.jpg"
-    }
+    test_book = BookRecord(
+        "test_id",
+        title="Test Book",
+        authors="Test Author",
+        description="Test Description",
+        thumbnail="http://test.com/image.jpg"
+    )
     bot.google_api.search_books = AsyncMock(return_value=[test_book])
     
     await bot.search_books(update, context)
@@ -88,12 +92,12 @@ async def test_search_books_with_google_results(bot, update, context):
 
 @pytest.mark.asyncio
 async def test_search_books_with_openlib_results(bot, update, context):
-    test_book = {
-        "title": "Test Book",
-        "authors": "Test Author",
-        "description": "Test Description",
-        "id": "test_id"
-    }
+    test_book = BookRecord(
+        "test_id",
+        title="Test Book",
+        authors="Test Author",
+        description="Test Description"
+    )
     bot.google_api.search_books = AsyncMock(return_value=[])
     bot.open_lib_api.search_books = AsyncMock(return_value=[test_book])
     
@@ -102,28 +106,94 @@ async def test_search_books_with_openlib_results(bot, update, context):
 
 @pytest.mark.asyncio
 async def test_show_favorites_empty(bot, update, context):
-    bot.db.get_favorites = AsyncMock(return_value=[])
+    bot.db.get_favorites_page = AsyncMock(return_value={"books": [], "start": None, "prev": None, "next": None})
     await bot.show_favorites(update, context)
     update.message.reply_text.assert_called_with("У вас пока нет избранных книг")
 
 @pytest.mark.asyncio
 async def test_show_favorites_with_books(bot, update, context):
-    test_book = {
-        "title": "Test Book",
-        "authors": "Test Author",
-        "description": "Test Description",
-        "id": "test_id",
-        "thumbnail": "http://test.com/image.jpg"
-    }
-    bot.db.get_favorites = AsyncMock(return_value=[test_book])
+    test_book = BookRecord(
+        "test_id",
+        title="Test Book",
+        authors="Test Author",
+        thumbnail="http://test.com/image.jpg"
+    )
+    bot.db.get_favorites_page = AsyncMock(return_value={
+        "books": [test_book], "start": "1:test_id", "prev": None, "next": "1:test_id"
+    })
     await bot.show_favorites(update, context)
-    update.message.reply_photo.assert_called_once()
+    update.message.reply_text.assert_called_once()
+    args, kwargs = update.message.reply_text.call_args
+    assert "Test Book" in args[0]
+    buttons = [b for row in kwargs["reply_markup"].inline_keyboard for b in row]
+    assert [b.callback_data for b in buttons] == ["unfav_1:test_id|g:test_id", "favnext_1:test_id"]
+
+@pytest.mark.asyncio
+async def test_handle_button_click_next_page(bot, callback_query, context):
+    callback_query.data = "favnext_1:test_id"
+    callback_query.edit_message_text = AsyncMock()
+    update = MagicMock(spec=Update)
+    update.callback_query = callback_query
+    bot.db.get_favorites_page = AsyncMock(return_value={
+        "books": [BookRecord("b2", title="Book 2", authors="Author")],
+        "start": "2:b2", "prev": "2:b2", "next": None
+    })
+
+    await bot.handle_button_click(update, context)
+    bot.db.get_favorites_page.assert_awaited_once_with(123, "1:test_id", "after", bot.page_size)
+    assert "Book 2" in callback_query.edit_message_text.call_args[0][0]
+
+@pytest.mark.asyncio
+async def test_handle_button_click_remove_from_page(bot, callback_query, context):
+    callback_query.data = "unfav_1:first_id:test_id"
+    callback_query.edit_message_text = AsyncMock()
+    update = MagicMock(spec=Update)
+    update.callback_query = callback_query
+    bot.db.remove_favorite = AsyncMock(return_value=True)
+    bot.db.get_favorites_page = AsyncMock(return_value={"books": [], "start": None, "prev": None, "next": None})
+
+    await bot.handle_button_click(update, context)
+    bot.db.remove_favorite.assert_awaited_once_with(123, "test_id", "google")
+    bot.db.get_favorites_page.assert_any_await(123, "1:first_id", "from", bot.page_size)
+    callback_query.edit_message_text.assert_called_with("У вас пока нет избранных книг")
+
+@pytest.mark.asyncio
+async def test_handle_button_click_remove_google_book_with_ol_id(bot, callback_query, context):
+    # Провайдер едет в callback-данных: ID тома Google может начинаться с OL
+    callback_query.data = "unfav_1:g:OLfirst|g:OLgoogle"
+    callback_query.edit_message_text = AsyncMock()
+    update = MagicMock(spec=Update)
+    update.callback_query = callback_query
+    bot.db.remove_favorite = AsyncMock(return_value=True)
+    bot.db.get_favorites_page = AsyncMock(return_value={"books": [], "start": None, "prev": None, "next": None})
+
+    await bot.handle_button_click(update, context)
+    bot.db.remove_favorite.assert_awaited_once_with(123, "OLgoogle", "google")
+    bot.db.get_favorites_page.assert_any_await(123, "1:g:OLfirst", "from", bot.page_size)
+
+@pytest.mark.asyncio
+async def test_handle_button_click_remove_already_removed(bot, callback_query, context):
+    # Telegram отклоняет повторный ответ на callback: ответ должен быть один
+    callback_query.answer = AsyncMock(side_effect=[None, BadRequest("Query is too old")])
+    callback_query.data = "unfav_1:g:first_id|g:test_id"
+    callback_query.edit_message_text = AsyncMock()
+    update = MagicMock(spec=Update)
+    update.callback_query = callback_query
+    bot.db.remove_favorite = AsyncMock(return_value=False)
+    bot.db.get_favorites_page = AsyncMock(return_value={
+        "books": [BookRecord("b2", title="Book 2", authors="Author")], "start": "2:g:b2", "prev": None, "next": None
+    })
+
+    await bot.handle_button_click(update, context)
+    # Устаревшая страница перерисовывается, предупреждение показывается единственным ответом
+    assert "Book 2" in callback_query.edit_message_text.call_args[0][0]
+    callback_query.answer.assert_awaited_once_with("Книга не найдена в избранном", show_alert=True)
 
 @pytest.mark.asyncio
 async def test_handle_button_click_add(bot, callback_query, context):
     update = MagicMock(spec=Update)
     update.callback_query = callback_query
-    bot._get_book_data = AsyncMock(return_value={"id": "test_id", "title": "Test", "authors": "Author"})
+    bot._get_book_data = AsyncMock(return_value=BookRecord("test_id", title="Test", authors="Author"))
     bot.db.add_favorite = AsyncMock()
     
     await bot.handle_button_click(update, context)
@@ -162,24 +232,21 @@ async def test_handle_button_click_invalid_data(bot, callback_query, context):
 @pytest.mark.asyncio
 async def test_get_book_data_google(bot):
     test_data = {
-        "items": [{
-            "id": "test_id",
-            "volumeInfo": {
-                "title": "Test Book",
-                "authors": ["Test Author"],
-                "description": "Test Description",
-                "imageLinks": {"thumbnail": "http://test.com/image.jpg"}
-            }
-        }]
+        "id": "test_id",
+        "volumeInfo": {
+            "title": "Test Book",
+            "authors": ["Test Author"],
+            "description": "Test Description",
+            "imageLinks": {"thumbnail": "http://test.com/image.jpg"}
+        }
     }
     
-    with patch('requests.get') as mock_get:
-        mock_get.return_value.json.return_value = test_data
-        mock_get.return_value.raise_for_status.return_value = None
-        
+    with patch.object(bot.http, 'get_json', AsyncMock(return_value=test_data)) as mock_get:
         result = await bot._get_book_data("test_id")
         assert result["title"] == "Test Book"
         assert result["id"] == "test_id"
+        # Том запрашивается напрямую по ID, без полнотекстового поиска
+        assert mock_get.call_args[0][0] == f"{bot.google_api.BASE_URL}/test_id"
 
 @pytest.mark.asyncio
 async def test_get_book_data_openlib(bot):
@@ -193,27 +260,10 @@ async def test_get_book_data_openlib(bot):
     }
     author_data = {"name": "Test Author"}
 
-    # Мокируем session.get для OpenLibraryAPI
-    mock_session = MagicMock()
-    
-    # Первый вызов - получение данных книги
-    mock_book_response = MagicMock()
-    mock_book_response.json.return_value = work_data
-    mock_book_response.raise_for_status.return_value = None
-    
-    # Второй вызов - получение данных автора
-    mock_author_response = MagicMock()
-    mock_author_response.json.return_value = author_data
-    mock_author_response.raise_for_status.return_value = None
+    # Мокируем HTTP-клиент: первый вызов - данные книги, второй - данные автора
+    mock_get = AsyncMock(side_effect=[work_data, author_data])
     
-    # Настраиваем side_effect для последовательных вызовов
-    mock_session.get.side_effect = [
-        MagicMock(__enter__=MagicMock(return_value=mock_book_response)),
-        MagicMock(__enter__=MagicMock(return_value=mock_author_response))
-    ]
-    
-    # Подменяем session в open_lib_api
-    with patch.object(bot.open_lib_api, 'session', mock_session):
+    with patch.object(bot.http, 'get_json', mock_get):
         result = await bot._get_book_data(book_id)
         
         # Проверяем результат
@@ -223,6 +273,184 @@ async def test_get_book_data_openlib(bot):
         assert result["thumbnail"] == "https://covers.openlibrary.org/b/id/123-M.jpg"
         
         # Проверяем вызовы API
-        assert mock_session.get.call_count == 2
-        mock_session.get.assert_any_call(f"{bot.open_lib_api.BASE_URL}/works/{book_id}.json")
-        mock_session.get.assert_any_call(f"{bot.open_lib_api.BASE_URL}/authors/OL123A.json")
+        assert mock_get.await_count == 2
+        # Каждый запрос выполняется с адаптивным таймаутом провайдера
+        mock_get.assert_any_call(f"{bot.open_lib_api.BASE_URL}/works/{book_id}.json", timeout=ANY)
+        mock_get.assert_any_call(f"{bot.open_lib_api.BASE_URL}/authors/OL123A.json", timeout=ANY)
+
+@pytest.mark.asyncio
+async def test_search_books_uses_cache(bot, update, context):
+    test_book = BookRecord(
+        "test_id",
+        title="Test Book",
+        authors="Test Author",
+        description="Test Description"
+    )
+    bot.google_api.search_books = AsyncMock(return_value=[test_book])
+
+    await bot.search_books(update, context)
+    update.message.text = "  TEST "
+    await bot.search_books(update, context)
+
+    bot.google_api.search_books.assert_awaited_once()
+    assert update.message.reply_text.await_count == 2
+
+@pytest.mark.asyncio
+async def test_search_books_caches_negative_results(bot, update, context):
+    bot.google_api.search_books = AsyncMock(return_value=[])
+    bot.open_lib_api.search_books = AsyncMock(return_value=[])
+
+    await bot.search_books(update, context)
+    await bot.search_books(update, context)
+
+    bot.google_api.search_books.assert_awaited_once()
+    bot.open_lib_api.search_books.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_add_from_search_result_skips_network(bot, update, callback_query, context):
+    test_book = BookRecord(
+        "test_id",
+        title="Test Book",
+        authors="Test Author",
+        description="Test Description"
+    )
+    bot.google_api.search_books = AsyncMock(return_value=[test_book])
+    bot.db.add_favorite = AsyncMock()
+    await bot.search_books(update, context)
+
+    click = MagicMock(spec=Update)
+    click.callback_query = callback_query
+    with patch.object(bot.http, 'get_json', AsyncMock()) as mock_get:
+        await bot.handle_button_click(click, context)
+        mock_get.assert_not_awaited()
+
+    saved_book, user_id = bot.db.add_favorite.call_args[0]
+    assert saved_book.title == "Test Book"
+    assert user_id == 123
+    # В БД уходит та же запись, что лежит в кэше, без копии
+    assert saved_book is bot.book_cache.get("test_id")
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_searches_share_request(bot, update, context):
+    test_book = BookRecord("test_id", title="Test Book", authors="Test Author", description="")
+
+    async def search(query, max_results=5):
+        await asyncio.sleep(0.01)
+        return [test_book]
+    bot.google_api.search_books = AsyncMock(side_effect=search)
+
+    await asyncio.gather(*(bot.search_books(update, context) for _ in range(5)))
+
+    bot.google_api.search_books.assert_awaited_once()
+    assert update.message.reply_text.await_count == 5
+    assert bot.flights.stats()["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_concurrent_book_lookups_share_request(bot):
+    async def fetch(book_id):
+        await asyncio.sleep(0.01)
+        return BookRecord(book_id, title="Test")
+    bot._fetch_book_data = AsyncMock(side_effect=fetch)
+
+    results = await asyncio.gather(*(bot._get_book_data("test_id") for _ in range(3)))
+
+    bot._fetch_book_data.assert_awaited_once_with("test_id")
+    assert all(result["title"] == "Test" for result in results)
+
+@pytest.mark.asyncio
+async def test_get_book_data_caches_fetched_book(bot):
+    bot._fetch_book_data = AsyncMock(return_value=BookRecord("test_id", title="Test"))
+
+    await bot._get_book_data("test_id")
+    await bot._get_book_data("test_id")
+
+    bot._fetch_book_data.assert_awaited_once_with("test_id")
+
+@pytest.mark.asyncio
+async def test_search_books_album(bot, update, context):
+    books = [BookRecord(
+        f"id{i}",
+        title=f"Book {i}",
+        authors="Author",
+        description="Description",
+        thumbnail=f"http://test.com/{i}.jpg" if i != 1 else None
+    ) for i in range(3)]
+    bot.google_api.search_books = AsyncMock(return_value=books)
+    update.message.reply_media_group = AsyncMock()
+
+    await bot.search_books(update, context)
+
+    # Обложки одним альбомом, список и кнопки одним сообщением
+    media = update.message.reply_media_group.call_args.kwargs["media"]
+    assert [m.caption for m in media] == ["1. <b>Book 0</b>", "3. <b>Book 2</b>"]
+    update.message.reply_text.assert_called_once()
+    update.message.reply_photo.assert_not_called()
+    markup = update.message.reply_text.call_args.kwargs["reply_markup"]
+    buttons = [b for row in markup.inline_keyboard for b in row]
+    assert [b.callback_data for b in buttons] == ["add_id0", "add_id1", "add_id2"]
+
+@pytest.mark.asyncio
+async def test_search_books_album_cover_error(bot, update, context):
+    books = [BookRecord(f"id{i}", title=f"Book {i}", thumbnail=f"http://test.com/{i}.jpg") for i in range(2)]
+    bot.google_api.search_books = AsyncMock(return_value=books)
+    update.message.reply_media_group = AsyncMock(side_effect=BadRequest("Wrong type of the web page content"))
+
+    await bot.search_books(update, context)
+
+    # Без обложек список с кнопками добавления всё равно отправляется
+    update.message.reply_text.assert_called_once()
+    markup = update.message.reply_text.call_args.kwargs["reply_markup"]
+    assert [b.callback_data for row in markup.inline_keyboard for b in row] == ["add_id0", "add_id1"]
+
+@pytest.mark.asyncio
+async def test_search_books_messages_mode(bot, update, context):
+    bot.output_mode = "messages"
+    books = [BookRecord(f"id{i}", title=f"Book {i}", authors="Author") for i in range(2)]
+    bot.google_api.search_books = AsyncMock(return_value=books)
+
+    await bot.search_books(update, context)
+    assert update.message.reply_text.await_count == 2
+
+@pytest.mark.asyncio
+async def test_handle_button_click_add_keeps_other_buttons(bot, callback_query, context):
+    callback_query.data = "add_id1"
+    callback_query.message.reply_markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton("⭐ 1", callback_data="add_id0"),
+        InlineKeyboardButton("⭐ 2", callback_data="add_id1")
+    ]])
+    update = MagicMock(spec=Update)
+    update.callback_query = callback_query
+    bot._get_book_data = AsyncMock(return_value=BookRecord("id1", title="Test", authors="Author"))
+    bot.db.add_favorite = AsyncMock()
+
+    await bot.handle_button_click(update, context)
+    markup = callback_query.edit_message_reply_markup.call_args.kwargs["reply_markup"]
+    assert [(b.text, b.callback_data) for b in markup.inline_keyboard[0]] == [("⭐ 1", "add_id0"), ("✅ 2", "none")]
+
+@pytest.mark.asyncio
+async def test_metrics_after_search(bot, update, context):
+    bot.google_api.search_books = AsyncMock(return_value=[])
+    bot.open_lib_api.search_books = AsyncMock(return_value=[])
+
+    await bot.search_books(update, context)
+
+    text = REGISTRY.render()
+    assert 'bot_handler_duration_seconds_count{handler="search_books"}' in text
+    assert 'cache_misses_total{cache="search"}' in text
+    # Растущие значения экспортируются счётчиками, чтобы к ним был применим rate()
+    assert "# TYPE cache_hits_total counter" in text
+    assert "# TYPE bot_send_retries_total counter" in text
+    assert "# TYPE bot_update_queue_depth gauge" in text
+    assert 'upstream_breaker_open{provider="google"} 0' in text
+    assert "bot_update_queue_depth 0" in text
+    # Сбор метрик не строит Application
+    assert bot._application is None
+    assert bot.dispatch_stats()["queue_depth"] == 0
+    assert bot._application is None
+
+def test_application_built_on_first_use(bot):
+    # Создание бота не строит Application с HTTP-клиентами Bot API
+    assert bot._application is None
+    application = bot.application
+    assert application is bot.application
+    assert len(application.handlers[0]) == 5
@@ -0,0 +1,85 @@
+import pytest
+from app.src.cache import TTLCache, SearchCache
+from app.src.records import BookRecord
+
+
+class FakeSharedCache:
+    """Заглушка общего уровня кэша"""
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl):
+        self.data[key] = value
+
+
+class TestTTLCache:
+    def test_get_set(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+    def test_expiration(self, clock):
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=100)
+        clock.now = 50
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert len(cache) == 1
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" становится самым старым
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+
+
+@pytest.mark.asyncio
+class TestSearchCache:
+    async def test_key_normalization(self):
+        cache = SearchCache()
+        books = [BookRecord("1")]
+        await cache.set("google", "  Гарри   ПОТТЕР ", 5, "ru", books)
+        assert await cache.get("google", "гарри поттер", 5, "ru") is books
+        assert await cache.get("google", "гарри поттер", 10, "ru") is None
+        assert await cache.get("openlibrary", "гарри поттер", 5, "ru") is None
+
+    async def test_negative_results_expire_quickly(self, clock):
+        cache = SearchCache(ttl=100, negative_ttl=5)
+        cache.local._clock = clock
+        await cache.set("google", "nothing", 5, "ru", [])
+        assert await cache.get("google", "nothing", 5, "ru") == []
+        clock.now = 10
+        assert await cache.get("google", "nothing", 5, "ru") is None
+
+    async def test_shared_tier(self):
+        shared = FakeSharedCache()
+        writer = SearchCache(shared=shared)
+        reader = SearchCache(shared=shared)
+        book = BookRecord("1", title="Книга", authors="Автор", provider="google")
+        await writer.set("google", "test", 5, "ru", [book])
+        # В общий уровень записи попадают списками значений без имён полей
+        assert shared.data[writer.make_key("google", "test", 5, "ru")] == [book.pack()]
+
+        assert await reader.get("google", "test", 5, "ru") == [book]
+        assert reader.shared_hits == 1
+        # Повторное чтение обслуживается локальным уровнем
+        await reader.get("google", "test", 5, "ru")
+        assert reader.stats()["hits"] == 1
+
+    async def test_shared_tier_reads_legacy_dicts(self):
+        shared = FakeSharedCache()
+        cache = SearchCache(shared=shared)
+        # Записи в формате словарей, сохранённые до перехода на BookRecord
+        shared.data[cache.make_key("google", "test", 5, "ru")] = [{"id": "1", "title": "Книга"}]
+        assert await cache.get("google", "test", 5, "ru") == [BookRecord("1", title="Книга")]
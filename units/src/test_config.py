@@ -0,0 +1,31 @@
+import logging
+from unittest.mock import patch
+from app.src import config
+from app.src.config import StartupTimer, load_env
+
+
+def test_load_env_once():
+    with patch.object(config, "_loaded", False), patch("dotenv.load_dotenv") as load_dotenv:
+        load_env()
+        load_env()
+    assert load_dotenv.call_count == 1
+
+
+def test_startup_timer_phases(caplog):
+    timer = StartupTimer()
+    timer.mark("imports")
+    with timer.phase("schema"):
+        pass
+    timer.mark("initialize")
+    assert list(timer.phases) == ["imports", "schema", "initialize"]
+    assert all(seconds >= 0 for seconds in timer.phases.values())
+
+    with caplog.at_level(logging.INFO):
+        timer.update_handled()
+    first = timer.first_update
+    timer.update_handled()
+    assert timer.first_update == first
+    out = caplog.text
+    assert out.count("Запуск:") == 1
+    assert "до первого обновления" in out
+    assert timer.stats()["first_update"] == first
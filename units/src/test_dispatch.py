@@ -0,0 +1,77 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from app.src.dispatch import ChatOrderedUpdateProcessor
+
+
+def make_update(chat_id):
+    update = MagicMock()
+    update.effective_chat.id = chat_id
+    return update
+
+
+@pytest.mark.asyncio
+class TestChatOrderedUpdateProcessor:
+    async def test_per_chat_order_and_parallel_chats(self):
+        processor = ChatOrderedUpdateProcessor(4)
+        await processor.initialize()
+        log = []
+        running = set()
+        overlap = []
+
+        async def handle(chat_id, n):
+            # Внутри одного чата обработчики не пересекаются
+            assert chat_id not in running
+            running.add(chat_id)
+            overlap.append(len(running))
+            await asyncio.sleep(0.01 * (3 - n))
+            log.append((chat_id, n))
+            running.discard(chat_id)
+
+        tasks = [
+            asyncio.create_task(processor.process_update(make_update(chat_id), handle(chat_id, n)))
+            for n in range(3) for chat_id in (1, 2)
+        ]
+        await asyncio.gather(*tasks)
+
+        assert [n for chat_id, n in log if chat_id == 1] == [0, 1, 2]
+        assert [n for chat_id, n in log if chat_id == 2] == [0, 1, 2]
+        assert max(overlap) == 2
+        assert processor.stats() == {"in_flight": 0, "waiting": 0, "active_chats": 0}
+
+    async def test_global_limit(self):
+        processor = ChatOrderedUpdateProcessor(2)
+        await processor.initialize()
+        peak = 0
+
+        async def handle():
+            nonlocal peak
+            peak = max(peak, processor.in_flight)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(
+            processor.process_update(make_update(chat_id), handle()) for chat_id in range(10)
+        ))
+        assert peak == 2
+
+    async def test_busy_chat_does_not_block_others(self):
+        processor = ChatOrderedUpdateProcessor(2)
+        await processor.initialize()
+        release = asyncio.Event()
+        done = []
+
+        async def slow():
+            await release.wait()
+
+        async def fast():
+            done.append("fast")
+
+        # Очередь из пяти обновлений одного чата занимает только один слот
+        busy = [asyncio.create_task(processor.process_update(make_update(1), slow())) for _ in range(5)]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(processor.process_update(make_update(2), fast()), 1)
+        assert done == ["fast"]
+        assert processor.stats()["waiting"] == 4
+
+        release.set()
+        await asyncio.gather(*busy)
@@ -1,16 +1,16 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
 from app.src.google_books import GoogleBooksAPI
+from app.src.http_client import HttpClient
 import asyncio
-import requests
+import aiohttp
 
 @pytest.mark.asyncio
 class TestGoogleBooksAPI:
-    @patch('app.src.google_books.requests.get')
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
     async def test_search_books_success(self, mock_get):
-        # Настраиваем мок для requests.get
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        # Настраиваем мок для HttpClient.get_json
+        mock_get.return_value = {
             "items": [
                 {
                     "id": "test123",
@@ -23,8 +23,6 @@ class TestGoogleBooksAPI:
                 }
             ]
         }
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
 
         # Вызываем асинхронный метод
         api = GoogleBooksAPI()
@@ -37,23 +35,64 @@ class TestGoogleBooksAPI:
         assert books[0]["description"] == "Test description"
         assert books[0]["thumbnail"] == "http://test.com/cover.jpg"
 
-    @patch('app.src.google_books.requests.get')
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
     async def test_search_books_empty_response(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {}
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_get.return_value = {}
 
         api = GoogleBooksAPI()
         books = await api.search_books("Unknown")
 
         assert books == []
 
-    @patch('app.src.google_books.requests.get')
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
     async def test_search_books_error_handling(self, mock_get):
-        mock_get.side_effect = requests.exceptions.RequestException("API Error")
+        mock_get.side_effect = aiohttp.ClientError("API Error")
 
         api = GoogleBooksAPI()
         books = await api.search_books("Error Test")
 
         assert books == []
+
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_get_book(self, mock_get):
+        mock_get.return_value = {
+            "id": "test123",
+            "volumeInfo": {"title": "Test Book", "authors": ["Author 1", "Author 2"]}
+        }
+
+        api = GoogleBooksAPI()
+        book = await api.get_book("test123")
+
+        assert book["id"] == "test123"
+        assert book["authors"] == "Author 1, Author 2"
+        assert book["description"] == "Нет описания"
+        assert mock_get.call_args[0][0] == f"{GoogleBooksAPI.BASE_URL}/test123"
+
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_get_book_not_found(self, mock_get):
+        mock_get.side_effect = aiohttp.ClientError("Not Found")
+
+        api = GoogleBooksAPI()
+        assert await api.get_book("missing") is None
+
+    async def test_get_books_concurrently(self):
+        api = GoogleBooksAPI(batch_concurrency=3)
+        in_flight = 0
+        max_in_flight = 0
+
+        async def get_json(url, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            volume_id = url.rsplit("/", 1)[-1]
+            if volume_id == "missing":
+                raise aiohttp.ClientError("Not Found")
+            return {"id": volume_id, "volumeInfo": {"title": volume_id}}
+
+        api.http.get_json = get_json
+        books = await api.get_books(["a", "missing", "b", "c", "d"])
+
+        assert [b and b["id"] for b in books] == ["a", None, "b", "c", "d"]
+        assert max_in_flight == 3
@@ -0,0 +1,134 @@
+import pytest
+import asyncio
+import aiohttp
+from unittest.mock import AsyncMock, MagicMock
+from app.src.health import ProviderHealth, CircuitOpenError, percentile, CLOSED, OPEN, HALF_OPEN
+from app.src.google_books import GoogleBooksAPI
+
+
+def make_health(clock, **kwargs):
+    params = {
+        "min_calls": 4, "error_rate": 0.5, "cooldown": 10, "window_seconds": 60,
+        "timeout_min": 0.5, "timeout_max": 10, "timeout_factor": 2
+    }
+    params.update(kwargs)
+    return ProviderHealth("google", clock=clock, **params)
+
+
+def response_error(status):
+    return aiohttp.ClientResponseError(MagicMock(), (), status=status)
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+class TestProviderHealth:
+    def test_trips_on_error_rate(self, clock):
+        health = make_health(clock)
+        health.record(True, 0.1)
+        health.record(False, 0.1)
+        health.record(True, 0.1)
+        assert health.state == CLOSED
+        health.record(False, 0.1)
+        assert health.state == OPEN
+        assert not health.available()
+        assert not health.allow()
+
+    def test_half_open_probe(self, clock):
+        health = make_health(clock, min_calls=1)
+        health.record(False, 0.1)
+        assert health.state == OPEN
+
+        clock.now = 10
+        assert health.available()
+        # Пропускается только один пробный запрос
+        assert health.allow()
+        assert health.state == HALF_OPEN
+        assert not health.allow()
+
+        health.record(False, 0.1)
+        assert health.state == OPEN
+        assert health.trips == 2
+
+        clock.now = 20
+        assert health.allow()
+        health.record(True, 0.1)
+        assert health.state == CLOSED
+        assert not health.failing()
+
+    def test_old_samples_expire(self, clock):
+        health = make_health(clock)
+        for _ in range(3):
+            health.record(False, 0.1)
+        clock.now = 61
+        health.record(False, 0.1)
+        assert health.state == CLOSED
+
+    def test_adaptive_timeout(self, clock):
+        health = make_health(clock)
+        # Пока данных мало, используется верхняя граница
+        assert health.timeout() == 10
+        for latency in (0.1, 0.2, 0.3, 0.4):
+            health.record(True, latency)
+        assert health.timeout() == pytest.approx(0.8)
+        for _ in range(4):
+            health.record(True, 0.01)
+        assert health.timeout() == pytest.approx(0.8)
+        assert health.stats()["p50"] == pytest.approx(0.01)
+
+
+@pytest.mark.asyncio
+class TestProviderHealthCall:
+    async def test_passes_timeout_and_records(self, clock):
+        health = make_health(clock)
+        fn = AsyncMock(return_value={"ok": True})
+
+        assert await health.call(fn, "url", params={"q": 1}, timeout=3) == {"ok": True}
+        fn.assert_awaited_once_with("url", params={"q": 1}, timeout=3)
+        assert health.stats()["calls"] == 1
+
+    async def test_client_errors_do_not_count(self, clock):
+        health = make_health(clock, min_calls=1)
+        with pytest.raises(aiohttp.ClientResponseError):
+            await health.call(AsyncMock(side_effect=response_error(404)))
+        assert health.state == CLOSED
+
+        with pytest.raises(aiohttp.ClientResponseError):
+            await health.call(AsyncMock(side_effect=response_error(503)))
+        assert health.state == OPEN
+
+    async def test_open_circuit_fails_fast(self, clock):
+        health = make_health(clock, min_calls=1)
+        health.record(False, 1)
+        fn = AsyncMock()
+
+        with pytest.raises(CircuitOpenError):
+            await health.call(fn)
+        fn.assert_not_awaited()
+
+    async def test_cancelled_probe_releases_slot(self, clock):
+        health = make_health(clock, min_calls=1)
+        health.record(False, 1)
+        clock.now = 10
+
+        task = asyncio.create_task(health.call(lambda timeout: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        assert not health.available()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert health.available()
+
+    async def test_api_returns_empty_when_open(self, clock):
+        api = GoogleBooksAPI()
+        api.health = make_health(clock, min_calls=1)
+        api.health.record(False, 1)
+        api.http.get_json = AsyncMock()
+
+        assert await api.search_books("Книга") == []
+        api.http.get_json.assert_not_awaited()
+        assert api.health.failing()
@@ -0,0 +1,113 @@
+import pytest
+import pytest_asyncio
+import asyncio
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from app.src.http_client import HttpClient, HTTP_ERRORS
+
+
+@pytest_asyncio.fixture
+async def server():
+    async def volumes(request):
+        return web.json_response({"params": dict(request.query)})
+
+    async def broken(request):
+        return web.Response(status=500)
+
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get("/volumes", volumes)
+    app.router.add_get("/broken", broken)
+    app.router.add_get("/slow", slow)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+@pytest.mark.asyncio
+class TestHttpClient:
+    async def test_get_json(self, server):
+        client = HttpClient()
+        data = await client.get_json(str(server.make_url("/volumes")), params={"q": "test", "key": None})
+        await client.close()
+
+        # Параметры со значением None не отправляются
+        assert data == {"params": {"q": "test"}}
+
+    async def test_reuses_session(self, server):
+        client = HttpClient()
+        await client.get_json(str(server.make_url("/volumes")))
+        session = client._session
+        await client.get_json(str(server.make_url("/volumes")))
+        assert client._session is session
+        await client.close()
+        assert client._session is None
+
+    async def test_error_status(self, server):
+        client = HttpClient()
+        with pytest.raises(aiohttp.ClientResponseError):
+            await client.get_json(str(server.make_url("/broken")))
+        await client.close()
+
+    async def test_timeout(self, server):
+        client = HttpClient()
+        with pytest.raises(HTTP_ERRORS):
+            await client.get_json(str(server.make_url("/slow")), timeout=0.1)
+        await client.close()
+
+    async def test_pool_wait_stats(self, server):
+        client = HttpClient(pool_size=1)
+        url = str(server.make_url("/volumes"))
+        await asyncio.gather(client.get_json(url), client.get_json(url))
+        stats = client.stats()
+        # Второй запрос ждал, пока первый вернёт единственное соединение
+        assert stats["pool_waits"] == 1
+        assert stats["waiting"] == 0
+        assert stats["connections_created"] == 1
+        await client.close()
+
+
+def test_pool_settings(monkeypatch):
+    monkeypatch.setenv("HTTP_POOL_PER_HOST", "7")
+    client = HttpClient(pool_size=50, read_timeout=3)
+    assert client.pool_size == 50
+    assert client.per_host == 7
+    assert client.read_timeout == 3.0
+
+
+def test_explicit_zero_is_kept(monkeypatch):
+    monkeypatch.setenv("HTTP_POOL_SIZE", "100")
+    monkeypatch.setenv("HTTP_KEEPALIVE_TIMEOUT", "30")
+    client = HttpClient(pool_size=0, keepalive_timeout=0)
+    assert client.pool_size == 0
+    assert client.keepalive_timeout == 0.0
+
+
+def test_closes_session_of_previous_loop():
+    client = HttpClient()
+
+    async def fetch():
+        async def volumes(request):
+            return web.json_response({"items": []})
+
+        app = web.Application()
+        app.router.add_get("/volumes", volumes)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            await client.get_json(str(server.make_url("/volumes")))
+        finally:
+            await server.close()
+        return client._session
+
+    first = asyncio.run(fetch())
+    second = asyncio.run(fetch())
+    assert first is not second
+    assert first.closed
+    asyncio.run(client.close())
+    assert second.closed
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import create_engine
+from app.src.metrics import (
+    Registry, Counter, Histogram, REGISTRY, DB_LATENCY, HANDLER_LATENCY, HANDLER_ERRORS, timed_handler
+)
+from app.src.db import Database
+
+
+class TestMetrics:
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.counter("requests_total", "Запросы", ("handler",))
+        counter.inc("search")
+        counter.inc("search", amount=2)
+        assert counter.value("search") == 3
+        text = registry.render()
+        assert "# TYPE requests_total counter" in text
+        assert 'requests_total{handler="search"} 3' in text
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Задержка", ("handler",), buckets=(0.1, 1))
+        histogram.observe(0.05, "search")
+        histogram.observe(0.5, "search")
+        histogram.observe(5, "search")
+        text = registry.render()
+        assert 'latency_seconds_bucket{handler="search",le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{handler="search",le="1.0"} 2' in text
+        assert 'latency_seconds_bucket{handler="search",le="+Inf"} 3' in text
+        assert 'latency_seconds_count{handler="search"} 3' in text
+        assert 'latency_seconds_sum{handler="search"} 5.55' in text
+
+    def test_label_escaping(self):
+        counter = Counter("c", "doc", ("query",))
+        counter.inc('a "b"\n')
+        assert list(counter.samples())[0][1] == '{query="a \\"b\\"\\n"}'
+
+    def test_collectors(self):
+        registry = Registry()
+        registry.collector("bot", lambda: [("queue_depth", "Очередь", [({}, 1)])])
+        # Повторная регистрация заменяет прежнюю функцию
+        registry.collector("bot", lambda: [("queue_depth", "Очередь", [({}, 2)])])
+        registry.collector("broken", lambda: 1 / 0)
+        text = registry.render()
+        assert "queue_depth 2" in text
+        assert "queue_depth 1" not in text
+        assert "# TYPE queue_depth gauge" in text
+
+    def test_collector_counters(self):
+        registry = Registry()
+        registry.collector("cache", lambda: [("cache_hits_total", "Попадания", [({"cache": "book"}, 5)], "counter")])
+        text = registry.render()
+        assert "# TYPE cache_hits_total counter" in text
+        assert 'cache_hits_total{cache="book"} 5' in text
+
+    def test_timer(self):
+        histogram = Histogram("t", "doc")
+        with histogram.time():
+            pass
+        assert histogram.count() == 1
+
+
+@pytest.mark.asyncio
+class TestInstrumentation:
+    async def test_timed_handler(self):
+        @timed_handler("test_handler")
+        async def handler(fail):
+            if fail:
+                raise RuntimeError("boom")
+            return "ok"
+
+        before = HANDLER_LATENCY.count("test_handler")
+        assert await handler(False) == "ok"
+        with pytest.raises(RuntimeError):
+            await handler(True)
+        assert HANDLER_LATENCY.count("test_handler") == before + 2
+        assert HANDLER_ERRORS.value("test_handler") >= 1
+
+    async def test_database_methods_are_timed(self):
+        db = Database(create_engine("sqlite:///:memory:"), migrate=True)
+        before = DB_LATENCY.count("add_favorite")
+        await db.add_favorite({"id": "b1", "title": "T", "authors": "A", "user_id": 1})
+        await db.get_favorites_page(1)
+        assert DB_LATENCY.count("add_favorite") == before + 1
+        assert DB_LATENCY.count("get_favorites_page") >= 1
+        assert 'db_query_duration_seconds_count{method="add_favorite"}' in REGISTRY.render()
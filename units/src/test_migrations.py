@@ -0,0 +1,119 @@
+import os
+import pytest
+from unittest.mock import patch
+from datetime import timedelta
+from sqlalchemy import create_engine, inspect, select, text
+from app.src.migrations import upgrade, is_current, MIGRATIONS
+from app.src.db import Database, FavoriteBook, utcnow
+from app.src.bot import BookBot
+
+
+@pytest.fixture
+def legacy_engine():
+    # Схема favorite_books до перехода на составной ключ
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE favorite_books ("
+            "id VARCHAR PRIMARY KEY, title VARCHAR, authors VARCHAR, "
+            "description TEXT, thumbnail_url VARCHAR, user_id BIGINT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO favorite_books VALUES "
+            "('book1', 'Book 1', 'Author', 'Description', NULL, 12345), "
+            "('OL2W', 'Book 2', 'Author', 'Description', NULL, 54321)"
+        ))
+    return engine
+
+
+def test_upgrade_fresh_database():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        upgrade(conn)
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+    assert applied == {name for name, _, _ in MIGRATIONS}
+    columns = {c["name"] for c in inspect(engine).get_columns("favorite_books")}
+    assert columns == {"user_id", "provider", "book_id", "added_at"}
+
+
+@pytest.mark.asyncio
+async def test_upgrade_legacy_favorites(legacy_engine):
+    with legacy_engine.begin() as conn:
+        upgrade(conn)
+        # Повторный запуск ничего не меняет
+        upgrade(conn)
+
+    pk = inspect(legacy_engine).get_pk_constraint("favorite_books")["constrained_columns"]
+    assert pk == ["user_id", "provider", "book_id"]
+    with legacy_engine.connect() as conn:
+        catalog = conn.execute(text("SELECT provider, book_id, title FROM books ORDER BY book_id")).all()
+    assert catalog == [("openlibrary", "OL2W", "Book 2"), ("google", "book1", "Book 1")]
+    indexes = {index["name"] for index in inspect(legacy_engine).get_indexes("favorite_books")}
+    assert "idx_favorite_books_user_added" in indexes
+
+    # Время добавления перенесённых книг - UTC, как у новых записей приложения
+    with legacy_engine.connect() as conn:
+        added_at = conn.execute(select(FavoriteBook.__table__.c.added_at)).scalars().all()
+    assert all(abs(value - utcnow()) < timedelta(minutes=1) for value in added_at)
+
+    db = Database(legacy_engine, migrate=True)
+    await db.add_favorite({"id": "book3", "title": "Book 3", "authors": "Author", "user_id": 12345})
+    books = await db.get_favorites(12345)
+    assert [(book["id"], book["title"]) for book in books] == [("book1", "Book 1"), ("book3", "Book 3")]
+    assert await db.remove_favorite(54321, "OL2W") is True
+
+
+def test_upgrade_v1_favorites():
+    # Избранное после первой миграции: метаданные в каждой строке
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE favorite_books ("
+            "user_id BIGINT, book_id VARCHAR, title VARCHAR, authors VARCHAR, "
+            "description TEXT, thumbnail_url VARCHAR, added_at DATETIME NOT NULL, "
+            "PRIMARY KEY (user_id, book_id))"
+        ))
+        conn.execute(text("CREATE INDEX idx_favorite_books_user_added ON favorite_books (user_id, added_at, book_id)"))
+        conn.execute(text("CREATE TABLE schema_migrations (name VARCHAR PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO schema_migrations VALUES ('0001_favorite_books_composite_key')"))
+        conn.execute(text(
+            "INSERT INTO favorite_books VALUES "
+            "(1, 'book1', 'Book 1', 'Author', 'Description', NULL, '2025-01-01 00:00:00'), "
+            "(2, 'book1', 'Book 1', 'Author', 'Description', NULL, '2025-01-02 00:00:00')"
+        ))
+        upgrade(conn)
+        assert conn.execute(text("SELECT COUNT(*) FROM books")).scalar() == 1
+        assert conn.execute(text("SELECT COUNT(*) FROM favorite_books")).scalar() == 2
+
+
+def test_is_current():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        assert not is_current(conn)
+        upgrade(conn)
+        assert is_current(conn)
+        conn.execute(text(f"DELETE FROM schema_migrations WHERE name = '{MIGRATIONS[-1][0]}'"))
+        assert not is_current(conn)
+
+
+@pytest.mark.asyncio
+async def test_database_checks_schema_on_first_query(legacy_engine):
+    db = Database(legacy_engine)
+    # Конструктор не обращается к БД
+    assert not inspect(legacy_engine).has_table("schema_migrations")
+    with pytest.raises(RuntimeError, match="app.src.migrations"):
+        await db.get_favorites(12345)
+
+    db = Database(legacy_engine, migrate=True)
+    assert [book["id"] for book in await db.get_favorites(12345)] == ["book1"]
+    with legacy_engine.connect() as conn:
+        assert is_current(conn)
+
+
+@pytest.mark.asyncio
+async def test_bot_stops_on_stale_schema_at_startup(legacy_engine):
+    # Без DB_AUTO_MIGRATE устаревшая схема останавливает запуск, а не первый запрос пользователя
+    with patch.dict(os.environ, {"TELEGRAM_TOKEN": "123:test", "DB_AUTO_MIGRATE": "0"}):
+        bot = BookBot(legacy_engine)
+    with pytest.raises(RuntimeError, match="app.src.migrations"):
+        await bot._post_init(None)
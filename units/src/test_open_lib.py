@@ -1,8 +1,12 @@
 import pytest
-from unittest.mock import patch, MagicMock
-from app.src.open_lib import OpenLibraryAPI
+from unittest.mock import patch, AsyncMock, ANY
+from app.src.open_lib import OpenLibraryAPI, AuthorResolver
+from app.src.http_client import HttpClient
+from app.src.db import Database
+from sqlalchemy import create_engine
 import json
-import requests
+import asyncio
+import aiohttp
 
 @pytest.fixture
 def mock_book_data():
@@ -22,26 +26,13 @@ def mock_book_details():
 
 @pytest.mark.asyncio
 class TestOpenLibraryAPI:
-    @patch('app.src.open_lib.requests.Session')
-    async def test_search_books_success(self, mock_session, mock_book_data, mock_book_details):
-        # Setup mock responses
-        mock_search_response = MagicMock()
-        mock_search_response.json.return_value = {
-            "docs": [mock_book_data]
-        }
-        mock_search_response.raise_for_status.return_value = None
-
-        mock_details_response = MagicMock()
-        mock_details_response.json.return_value = mock_book_details
-        mock_details_response.raise_for_status.return_value = None
-
-        # Configure mock session
-        mock_session_instance = MagicMock()
-        mock_session_instance.get.side_effect = [
-            mock_search_response,  # First call for search
-            mock_details_response  # Second call for details
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_search_books_success(self, mock_get, mock_book_data, mock_book_details):
+        # Configure mock HTTP client
+        mock_get.side_effect = [
+            {"docs": [mock_book_data]},  # First call for search
+            mock_book_details  # Second call for details
         ]
-        mock_session.return_value = mock_session_instance
 
         # Test the method
         api = OpenLibraryAPI()
@@ -55,16 +46,10 @@ class TestOpenLibraryAPI:
         assert books[0]["thumbnail"] == "https://covers.openlibrary.org/b/id/123456-M.jpg"
         assert books[0]["id"] == "OL123W"
 
-    @patch('app.src.open_lib.requests.Session')
-    async def test_search_books_empty_result(self, mock_session):
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_search_books_empty_result(self, mock_get):
         # Setup empty response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"docs": []}
-        mock_response.raise_for_status.return_value = None
-
-        mock_session_instance = MagicMock()
-        mock_session_instance.get.return_value = mock_response
-        mock_session.return_value = mock_session_instance
+        mock_get.return_value = {"docs": []}
 
         # Test the method
         api = OpenLibraryAPI()
@@ -73,12 +58,10 @@ class TestOpenLibraryAPI:
         # Assertions
         assert books == []
 
-    @patch('app.src.open_lib.requests.Session')
-    async def test_search_books_error_handling(self, mock_session):
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_search_books_error_handling(self, mock_get):
         # Setup error response
-        mock_session_instance = MagicMock()
-        mock_session_instance.get.side_effect = requests.exceptions.RequestException("API Error")
-        mock_session.return_value = mock_session_instance
+        mock_get.side_effect = aiohttp.ClientError("API Error")
 
         # Test the method
         api = OpenLibraryAPI()
@@ -87,19 +70,93 @@ class TestOpenLibraryAPI:
         # Assertions
         assert books == []
 
-    def test_parse_results(self, mock_book_data):
+    async def test_parse_results(self, mock_book_data):
         api = OpenLibraryAPI()
+        api.http.get_json = AsyncMock(return_value={})
         
         test_data = {
             "docs": [mock_book_data]
         }
         
-        books = api._parse_results(test_data)
+        books = await api._parse_results(test_data)
         
         assert len(books) == 1
         assert books[0]["title"] == "Test Book"
         assert books[0]["authors"] == "Test Author"
 
+    @patch.object(HttpClient, 'get_json', new_callable=AsyncMock)
+    async def test_search_result_with_dict_description_is_saved(self, mock_get, mock_book_data):
+        mock_get.side_effect = [
+            {"docs": [mock_book_data]},
+            {"title": "Test Book", "description": {"type": "/type/text", "value": "Work description"}}
+        ]
+        books = await OpenLibraryAPI().search_books("Test")
+        assert books[0].description == "Work description"
+
+        # Запись из выдачи сохраняется в избранное без повторного запроса книги
+        db = Database(create_engine("sqlite:///:memory:"), migrate=True)
+        assert await db.add_favorite(books[0], 12345) is True
+        favorites = await db.get_favorites(12345)
+        assert [(book.id, book.description) for book in favorites] == [("OL123W", "Work description")]
+
+    async def test_parse_results_fetches_details_concurrently(self, mock_book_data):
+        api = OpenLibraryAPI(detail_concurrency=2)
+        in_flight = 0
+        max_in_flight = 0
+
+        async def get_json(url, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return {"description": url}
+
+        api.http.get_json = get_json
+        docs = [{**mock_book_data, "key": f"/works/OL{i}W"} for i in range(5)]
+
+        books = await api._parse_results({"docs": docs})
+
+        # Порядок результатов сохраняется, а одновременных запросов не больше лимита
+        assert [b["id"] for b in books] == [f"OL{i}W" for i in range(5)]
+        assert books[3]["description"].endswith("/works/OL3W.json")
+        assert max_in_flight == 2
+
+    async def test_parse_results_detail_deadline(self, mock_book_data):
+        api = OpenLibraryAPI(detail_timeout=0.05)
+
+        async def get_json(url, **kwargs):
+            if "OL1W" in url:
+                await asyncio.sleep(1)
+            return {"description": "Fast description"}
+
+        api.http.get_json = get_json
+        docs = [{**mock_book_data, "key": f"/works/OL{i}W"} for i in range(2)]
+
+        books = await api._parse_results({"docs": docs})
+
+        # Медленная книга возвращается без описания и не задерживает остальные
+        assert books[0]["description"] == "Fast description"
+        assert books[1]["description"] == "Нет описания"
+
+    async def test_detail_timeouts_do_not_trip_search_breaker(self, mock_book_data):
+        api = OpenLibraryAPI()
+
+        async def get_json(url, **kwargs):
+            if url.endswith("/search.json"):
+                return {"docs": [{**mock_book_data, "key": f"/works/OL{i}W"} for i in range(5)]}
+            raise asyncio.TimeoutError()
+
+        api.http.get_json = get_json
+        for _ in range(3):
+            await api.search_books("Test")
+
+        # Таймауты деталей учитываются отдельно и не делают поиск сбойным
+        assert api.details_health.stats()["error_rate"] == 1.0
+        assert api.health.stats()["error_rate"] == 0.0
+        assert api.health.state == "closed"
+        assert not api.health.failing()
+
     def test_get_cover_url(self):
         api = OpenLibraryAPI()
         
@@ -120,3 +177,68 @@ class TestOpenLibraryAPI:
         
         # Test with invalid description
         assert api._clean_description(None) == "None"
+
+
+class FakeAuthorStore:
+    """Заглушка хранилища авторов"""
+    def __init__(self, names=None):
+        self.names = dict(names or {})
+
+    async def get_authors(self, keys):
+        return {key: self.names[key] for key in keys if key in self.names}
+
+    async def save_authors(self, names):
+        self.names.update(names)
+
+
+@pytest.mark.asyncio
+class TestAuthorResolver:
+    async def test_resolve_deduplicates_and_caches(self):
+        api = OpenLibraryAPI()
+        api.http.get_json = AsyncMock(side_effect=lambda url, **kwargs: {"name": url})
+
+        names = await api.authors.resolve(["/authors/OL1A", "/authors/OL2A", "/authors/OL1A"])
+        assert set(names) == {"/authors/OL1A", "/authors/OL2A"}
+        assert api.http.get_json.await_count == 2
+
+        # Повторное разрешение обслуживается кэшем
+        await api.authors.resolve(["/authors/OL2A"])
+        assert api.http.get_json.await_count == 2
+
+    async def test_resolve_uses_store(self):
+        api = OpenLibraryAPI()
+        store = FakeAuthorStore({"/authors/OL1A": "Known Author"})
+        resolver = AuthorResolver(api, store)
+        api.http.get_json = AsyncMock(return_value={"name": "New Author"})
+
+        names = await resolver.resolve(["/authors/OL1A", "/authors/OL2A"])
+
+        assert names == {"/authors/OL1A": "Known Author", "/authors/OL2A": "New Author"}
+        api.http.get_json.assert_awaited_once_with(f"{OpenLibraryAPI.BASE_URL}/authors/OL2A.json", timeout=ANY)
+        assert store.names["/authors/OL2A"] == "New Author"
+
+    async def test_get_book_resolves_authors_in_one_wave(self):
+        api = OpenLibraryAPI()
+        in_flight = 0
+        max_in_flight = 0
+
+        async def get_json(url, **kwargs):
+            nonlocal in_flight, max_in_flight
+            if "/works/" in url:
+                return {
+                    "title": "Test Book",
+                    "covers": [123],
+                    "authors": [{"author": {"key": f"/authors/OL{i}A"}} for i in range(3)]
+                }
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return {"name": url.split("/")[-1]}
+
+        api.http.get_json = get_json
+        book = await api.get_book("OL1W")
+
+        assert book["authors"] == "OL0A.json, OL1A.json, OL2A.json"
+        assert book["thumbnail"] == "https://covers.openlibrary.org/b/id/123-M.jpg"
+        assert max_in_flight == 3
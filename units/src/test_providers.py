@@ -0,0 +1,153 @@
+import pytest
+import asyncio
+import time
+from app.src.health import ProviderHealth
+from app.src.records import BookRecord
+from app.src.providers import ProviderRouter, ProvidersUnavailable, merge_results, SEQUENTIAL, HEDGED, PARALLEL
+
+
+class FakeProvider:
+    def __init__(self, name, books, delay=0.0, error=None):
+        self.PROVIDER = name
+        self.books = books
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def search_books(self, query, max_results=5):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.books
+
+
+async def fetch(api, query, max_results):
+    return await api.search_books(query, max_results)
+
+
+def book(book_id, title, authors="Автор"):
+    return BookRecord(book_id, title=title, authors=authors)
+
+
+def make_router(google, openlib, mode, **kwargs):
+    return ProviderRouter([google, openlib], mode=mode, **kwargs)
+
+
+@pytest.mark.asyncio
+class TestProviderRouter:
+    async def test_sequential_fallback(self):
+        google = FakeProvider("google", [])
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+        router = make_router(google, openlib, SEQUENTIAL)
+
+        assert await router.search("книга", fetch) == openlib.books
+        assert google.calls == 1 and openlib.calls == 1
+        assert router.stats()["wins"] == {"google": 0, "openlibrary": 1}
+
+    async def test_sequential_skips_fallback(self):
+        google = FakeProvider("google", [book("g1", "Книга")])
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+        router = make_router(google, openlib, SEQUENTIAL)
+
+        assert await router.search("книга", fetch) == google.books
+        assert openlib.calls == 0
+
+    async def test_hedged_fast_primary(self):
+        google = FakeProvider("google", [book("g1", "Книга")], delay=0.01)
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+        router = make_router(google, openlib, HEDGED, hedge_delay=0.2)
+
+        assert await router.search("книга", fetch) == google.books
+        assert openlib.calls == 0
+        assert router.stats()["hedges"] == 0
+
+    async def test_hedged_slow_primary(self):
+        google = FakeProvider("google", [book("g1", "Книга")], delay=1.0)
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")], delay=0.01)
+        router = make_router(google, openlib, HEDGED, hedge_delay=0.05)
+
+        start = time.monotonic()
+        assert await router.search("книга", fetch) == openlib.books
+        assert time.monotonic() - start < 0.5
+        await asyncio.sleep(0.01)
+        # Проигравший запрос отменяется
+        assert google.cancelled
+        assert router.stats()["hedges"] == 1
+
+    async def test_hedged_empty_primary_starts_next_immediately(self):
+        google = FakeProvider("google", [])
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+        router = make_router(google, openlib, HEDGED, hedge_delay=10)
+
+        start = time.monotonic()
+        assert await router.search("книга", fetch) == openlib.books
+        assert time.monotonic() - start < 0.5
+
+    async def test_hedged_slow_primary_wins_if_hedge_empty(self):
+        google = FakeProvider("google", [book("g1", "Книга")], delay=0.1)
+        openlib = FakeProvider("openlibrary", [])
+        router = make_router(google, openlib, HEDGED, hedge_delay=0.01)
+
+        assert await router.search("книга", fetch) == google.books
+
+    async def test_provider_timeout(self):
+        google = FakeProvider("google", [book("g1", "Книга")], delay=1.0)
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+        router = make_router(google, openlib, SEQUENTIAL, timeouts={"google": 0.05})
+
+        start = time.monotonic()
+        assert await router.search("книга", fetch) == openlib.books
+        assert time.monotonic() - start < 0.5
+
+    async def test_provider_error(self):
+        google = FakeProvider("google", [], error=RuntimeError("boom"))
+        openlib = FakeProvider("openlibrary", [])
+        router = make_router(google, openlib, HEDGED)
+
+        # Один провайдер ответил пустой выдачей: книг нет, но это не ошибка
+        assert await router.search("книга", fetch) == []
+
+    @pytest.mark.parametrize("mode", [SEQUENTIAL, HEDGED, PARALLEL])
+    async def test_all_providers_failed(self, mode):
+        google = FakeProvider("google", [], error=RuntimeError("boom"))
+        openlib = FakeProvider("openlibrary", [], error=RuntimeError("boom"))
+        router = make_router(google, openlib, mode)
+
+        with pytest.raises(ProvidersUnavailable):
+            await router.search("книга", fetch)
+
+    async def test_parallel_merge(self):
+        google = FakeProvider("google", [book("g1", "Война и мир", "Толстой"), book("g2", "Анна Каренина", "Толстой")])
+        openlib = FakeProvider("openlibrary", [book("OL1W", "Война  и МИР", "толстой"), book("OL2W", "Детство", "Толстой")])
+        router = make_router(google, openlib, PARALLEL)
+
+        books = await router.search("толстой", fetch, max_results=5)
+        assert [b["id"] for b in books] == ["g1", "g2", "OL2W"]
+        assert google.calls == 1 and openlib.calls == 1
+
+    async def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            make_router(FakeProvider("google", []), FakeProvider("openlibrary", []), "random")
+
+
+def test_merge_results_limit():
+    results = [[book("g1", "A"), book("g2", "B")], [book("OL1W", "C")]]
+    assert [b["id"] for b in merge_results(results, 2)] == ["g1", "g2"]
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_is_skipped():
+    google = FakeProvider("google", [book("g1", "Книга")])
+    google.health = ProviderHealth("google", min_calls=1)
+    google.health.record(False, 1.0)
+    openlib = FakeProvider("openlibrary", [book("OL1W", "Книга")])
+    router = make_router(google, openlib, HEDGED, hedge_delay=10)
+
+    assert await router.search("книга", fetch) == openlib.books
+    assert google.calls == 0
@@ -0,0 +1,213 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter
+from app.src.rate_limit import TokenBucket, SendScheduler, INTERACTIVE, BULK
+
+
+class TestTokenBucket:
+    def test_burst_then_rate(self, clock):
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        # Третье сообщение ждёт пополнения корзины
+        assert bucket.reserve() == pytest.approx(0.5)
+        assert bucket.reserve() == pytest.approx(1.0)
+        clock.now = 1.0
+        assert bucket.reserve() == pytest.approx(0.5)
+
+    def test_pause(self, clock):
+        bucket = TokenBucket(rate=10, capacity=10, clock=clock)
+        bucket.pause(3)
+        assert bucket.reserve() == pytest.approx(3)
+        assert not bucket.idle()
+        clock.now = 3.0
+        assert bucket.blocked_for() == 0
+        assert bucket.reserve() == 0
+
+    def test_idle(self, clock):
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+        bucket.reserve()
+        assert not bucket.idle()
+        clock.now = 1.0
+        assert bucket.idle()
+
+    def test_priority_and_cost(self):
+        assert SendScheduler.priority_for("sendMessage", None) == INTERACTIVE
+        # Обложки - часть ответа пользователю, массовыми их делает только rate_limit_args
+        assert SendScheduler.priority_for("sendMediaGroup", None) == INTERACTIVE
+        assert SendScheduler.priority_for("sendPhoto", None) == INTERACTIVE
+        assert SendScheduler.priority_for("sendMessage", {"priority": BULK}) == BULK
+        assert SendScheduler.cost_for({"media": [1, 2, 3]}) == 3
+        assert SendScheduler.cost_for({"text": "hi"}) == 1
+
+    def test_retry_delay(self):
+        assert SendScheduler.retry_delay(RetryAfter(3)) == 3
+        assert SendScheduler.retry_delay(type("Error", (), {"retry_after": timedelta(seconds=2.5)})()) == 2.5
+
+
+def make_scheduler(**kwargs):
+    params = {"global_rate": 1000, "chat_rate": 1000, "chat_burst": 1000, "group_rate": 1000, "max_retries": 3}
+    params.update(kwargs)
+    return SendScheduler(**params)
+
+
+@pytest.mark.asyncio
+class TestSendScheduler:
+    async def test_sends_request(self):
+        scheduler = make_scheduler()
+
+        async def callback(text):
+            return {"text": text}
+
+        result = await scheduler.process_request(callback, ("hi",), {}, "sendMessage", {"chat_id": 1}, None)
+        assert result == {"text": "hi"}
+        stats = scheduler.stats()
+        assert stats["sent"] == 1
+        assert stats["wait"]["interactive"]["count"] == 1
+
+    async def test_retry_after_is_honored(self):
+        scheduler = make_scheduler()
+        calls = []
+
+        async def callback():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return True
+
+        assert await scheduler.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+        assert len(calls) == 2
+        # Повтор выполняется не раньше retry_after + 0.1 секунды
+        assert calls[1] - calls[0] >= 0.1
+        assert scheduler.stats()["retries"] == 1
+
+    async def test_retry_after_pauses_chat(self, clock):
+        scheduler = make_scheduler(clock=clock)
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+            clock.now += seconds
+
+        calls = []
+
+        async def callback():
+            calls.append(clock.now)
+            if len(calls) == 1:
+                raise RetryAfter(2)
+            return True
+
+        with patch("app.src.rate_limit.asyncio.sleep", sleep):
+            assert await scheduler.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+        assert calls[1] - calls[0] == pytest.approx(2.1)
+
+    async def test_album_is_one_message_in_chat(self):
+        scheduler = make_scheduler(chat_rate=1, chat_burst=2)
+        sent = []
+
+        async def callback(name):
+            sent.append(name)
+
+        # Альбом из пяти обложек и следующий за ним ответ укладываются в корзину чата
+        started = time.monotonic()
+        await scheduler.process_request(
+            callback, ("covers",), {}, "sendMediaGroup", {"chat_id": 1, "media": [1, 2, 3, 4, 5]}, None
+        )
+        await scheduler.process_request(callback, ("reply",), {}, "sendMessage", {"chat_id": 1}, None)
+        assert sent == ["covers", "reply"]
+        assert time.monotonic() - started < 0.5
+
+    async def test_retry_after_gives_up(self):
+        scheduler = make_scheduler(max_retries=1)
+
+        async def callback():
+            raise RetryAfter(0)
+
+        with pytest.raises(RetryAfter):
+            await scheduler.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+        assert scheduler.stats()["sent"] == 0
+
+    async def test_per_chat_limit(self):
+        scheduler = make_scheduler(chat_rate=20, chat_burst=1)
+        sent = []
+
+        async def callback(chat_id):
+            sent.append((chat_id, time.monotonic()))
+
+        start = time.monotonic()
+        await asyncio.gather(*[
+            scheduler.process_request(callback, (chat_id,), {}, "sendMessage", {"chat_id": chat_id}, None)
+            for chat_id in (1, 1, 1, 2)
+        ])
+        times = {chat_id: [t - start for c, t in sent if c == chat_id] for chat_id in (1, 2)}
+        # Второй чат не ждёт очереди первого
+        assert times[2][0] < 0.05
+        assert max(times[1]) >= 0.09
+
+    async def test_interactive_before_bulk(self):
+        scheduler = make_scheduler(global_rate=20)
+        scheduler._global.tokens = 0
+        order = []
+
+        async def callback(name):
+            order.append(name)
+
+        bulk = [
+            asyncio.create_task(scheduler.process_request(
+                callback, (f"cover{i}",), {}, "sendMediaGroup", {"chat_id": 100 + i, "media": [1]}, {"priority": BULK}
+            ))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        reply = asyncio.create_task(scheduler.process_request(
+            callback, ("reply",), {}, "sendMessage", {"chat_id": 1}, None
+        ))
+        await asyncio.gather(*bulk, reply)
+        # Ответ пользователю обгоняет обложки, ещё ждущие глобальный маркер
+        assert order.index("reply") <= 1
+        stats = scheduler.stats()
+        assert stats["wait"]["bulk"]["count"] == 3
+        assert stats["wait"]["interactive"]["count"] == 1
+
+    async def test_requests_without_chat_not_limited(self):
+        scheduler = make_scheduler(global_rate=1)
+        scheduler._global.tokens = 0
+
+        async def callback():
+            return True
+
+        assert await asyncio.wait_for(
+            scheduler.process_request(callback, (), {}, "answerCallbackQuery", {"callback_query_id": "1"}, None),
+            timeout=0.5
+        )
+
+    async def test_search_reply_not_behind_bulk(self):
+        scheduler = make_scheduler(global_rate=20)
+        scheduler._global.tokens = 0
+        order = []
+
+        async def callback(name):
+            order.append(name)
+
+        bulk = [
+            asyncio.create_task(scheduler.process_request(
+                callback, (f"bulk{i}",), {}, "sendMessage", {"chat_id": 100 + i}, {"priority": BULK}
+            ))
+            for i in range(5)
+        ]
+        await asyncio.sleep(0)
+
+        async def search_reply():
+            # Как в BookBot.search_books: сначала альбом обложек, затем сводка с кнопками
+            await scheduler.process_request(
+                callback, ("covers",), {}, "sendMediaGroup", {"chat_id": 1, "media": [1, 2]}, None
+            )
+            await scheduler.process_request(callback, ("summary",), {}, "sendMessage", {"chat_id": 1}, None)
+
+        await asyncio.gather(*bulk, search_reply())
+        # Весь ответ на поиск уходит раньше массовых отправок, вставших в очередь до него
+        assert order.index("summary") < order.index("bulk2")
+        assert scheduler.stats()["wait"]["bulk"]["count"] == 5
@@ -0,0 +1,46 @@
+import copy
+import json
+import pickle
+import pytest
+from app.src.records import BookRecord
+
+
+@pytest.fixture
+def book():
+    return BookRecord("id1", title="Книга", authors="Автор", description=None,
+                      thumbnail="http://test.com/cover.jpg", provider="google")
+
+
+def test_immutable(book):
+    with pytest.raises(AttributeError):
+        book.title = "Другая"
+    with pytest.raises(AttributeError):
+        book.user_id = 1
+    with pytest.raises(AttributeError):
+        del book.title
+    assert not hasattr(book, "__dict__")
+
+    changed = book.replace(title="Другая")
+    assert changed.title == "Другая" and book.title == "Книга"
+    assert changed.id == book.id
+
+
+def test_pack_roundtrip(book):
+    packed = json.loads(json.dumps(book.pack()))
+    assert BookRecord.unpack(packed) == book
+    assert hash(BookRecord.unpack(packed)) == hash(book)
+    assert BookRecord.from_dict({**book.to_dict(), "user_id": 1}) == book
+    assert pickle.loads(pickle.dumps(book)) == book
+    assert copy.copy(book) == book
+
+
+def test_read_as_mapping(book):
+    assert book["title"] == "Книга"
+    with pytest.raises(KeyError):
+        book["user_id"]
+    # Пустое поле считается отсутствующим, как ключ в словаре
+    assert book.get("description", "Нет описания") == "Нет описания"
+    assert book.get("thumbnail") == "http://test.com/cover.jpg"
+    assert "thumbnail" in book
+    assert "description" not in book
+    assert "user_id" not in book
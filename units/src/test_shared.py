@@ -0,0 +1,112 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from telegram import Update
+from app.src.records import BookRecord
+from app.src.shared import MemoryBackend, ShardedIngress, UpdateWorker, shard_for, queue_name
+from app.src.cache import SearchCache
+
+
+def make_update(update_id, chat_id, text="Книга"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1718000000,
+            "chat": {"id": chat_id, "type": "private", "first_name": "Test"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": text
+        }
+    }
+
+
+def test_shard_for_is_stable():
+    assert shard_for(123, 4) == shard_for(123, 4)
+    assert shard_for("user:5", 4) == shard_for("user:5", 4)
+    assert shard_for(None, 4) == 0
+    assert {shard_for(chat_id, 4) for chat_id in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.mark.asyncio
+class TestMemoryBackend:
+    async def test_get_set_ttl(self, clock):
+        backend = MemoryBackend(clock)
+        value = [{"id": "1"}]
+        await backend.set("key", value, 10)
+        stored = await backend.get("key")
+        assert stored == value
+        # Значение хранится копией, как в Redis
+        assert stored is not value
+        clock.now = 10
+        assert await backend.get("key") is None
+
+    async def test_queue(self):
+        backend = MemoryBackend()
+        await backend.push("q", {"n": 1})
+        await backend.push("q", {"n": 2})
+        assert await backend.qsize("q") == 2
+        assert await backend.pop("q") == {"n": 1}
+        assert await backend.pop("q") == {"n": 2}
+        assert await backend.pop("q", timeout=0.01) is None
+
+    async def test_search_cache_shared_tier(self):
+        backend = MemoryBackend()
+        first = SearchCache(shared=backend)
+        second = SearchCache(shared=backend)
+        await first.set("google", "Книга", 5, "ru", [BookRecord("1")])
+        assert await second.get("google", "книга", 5, "ru") == [BookRecord("1")]
+        assert second.stats()["shared_hits"] == 1
+
+
+@pytest.mark.asyncio
+class TestShardedIngress:
+    async def test_same_chat_same_worker(self):
+        backend = MemoryBackend()
+        ingress = ShardedIngress(backend, workers=3)
+        shards = [await ingress.route(make_update(n, 42)) for n in range(5)]
+        assert len(set(shards)) == 1
+        assert await backend.qsize(queue_name(shards[0])) == 5
+        stats = await ingress.stats()
+        assert sum(stats["routed"]) == 5
+        assert stats["queues"][shards[0]] == 5
+
+    async def test_callback_query_routed_by_chat(self):
+        backend = MemoryBackend()
+        ingress = ShardedIngress(backend, workers=4)
+        message_shard = await ingress.route(make_update(1, 77))
+        callback = {
+            "update_id": 2,
+            "callback_query": {
+                "id": "cb",
+                "chat_instance": "ci",
+                "from": {"id": 77, "is_bot": False, "first_name": "Test"},
+                "data": "add_1",
+                "message": make_update(1, 77)["message"]
+            }
+        }
+        assert await ingress.route(callback) == message_shard
+
+
+@pytest.mark.asyncio
+async def test_worker_moves_updates_in_order():
+    backend = MemoryBackend()
+    application = MagicMock()
+    application.bot = None
+    application.update_queue = asyncio.Queue()
+    for n in range(3):
+        await backend.push(queue_name(1), make_update(n, 5))
+    await backend.push(queue_name(0), make_update(99, 6))
+
+    worker = UpdateWorker(application, backend, worker_id=1, poll_timeout=0.01)
+    stop = asyncio.Event()
+    task = asyncio.create_task(worker.run(stop))
+    while worker.consumed < 3:
+        await asyncio.sleep(0.01)
+    stop.set()
+    await task
+
+    updates = [application.update_queue.get_nowait() for _ in range(3)]
+    assert all(isinstance(update, Update) for update in updates)
+    assert [update.update_id for update in updates] == [0, 1, 2]
+    # Чужая очередь не тронута
+    assert await backend.qsize(queue_name(0)) == 1
@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+from app.src.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_flight(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return ["book"]
+
+        results = await asyncio.gather(*(flights.do("q", fetch) for _ in range(10)))
+
+        assert calls == 1
+        assert all(result == ["book"] for result in results)
+        assert flights.stats() == {"in_flight": 0, "flights": 1, "coalesced": 9, "max_coalesced": 9}
+
+    async def test_sequential_calls_are_not_cached(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await flights.do("q", fetch) == 1
+        assert await flights.do("q", fetch) == 2
+        assert flights.stats()["coalesced"] == 0
+
+    async def test_different_keys(self):
+        flights = SingleFlight()
+
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(flights.do("a", lambda: fetch(1)), flights.do("b", lambda: fetch(2)))
+        assert results == [1, 2]
+        assert flights.stats()["flights"] == 2
+
+    async def test_error_is_shared(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("API Error")
+
+        results = await asyncio.gather(*(flights.do("q", fetch) for _ in range(3)), return_exceptions=True)
+        assert calls == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def test_cancelled_caller_does_not_cancel_flight(self):
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.create_task(flights.do("q", fetch))
+        second = asyncio.create_task(flights.do("q", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
@@ -0,0 +1,125 @@
+import json
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from app.src import tracing
+from app.src.tracing import Tracer, FileExporter, ZipkinExporter, NULL_SPAN, slow_traces
+from app.src.dispatch import ChatOrderedUpdateProcessor
+
+
+class ListExporter:
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append([span.to_zipkin() for span in spans])
+
+
+class TestTracer:
+    def test_sampling_off(self):
+        tracer = Tracer(0, ListExporter())
+        assert tracer.start_trace("update") is NULL_SPAN
+        assert tracer.span("db.get") is NULL_SPAN
+        assert Tracer(1.0, None).start_trace("update") is NULL_SPAN
+
+    def test_nested_spans(self):
+        exporter = ListExporter()
+        tracer = Tracer(1.0, exporter)
+        with tracer.start_trace("update", chat=1) as root:
+            with tracer.span("db.get_favorites_page") as child:
+                child.set_tag("rows", 3)
+            # До закрытия корня ничего не выгружается
+            assert exporter.batches == []
+        assert tracer.span("outside") is NULL_SPAN
+
+        spans = {span["name"]: span for span in exporter.batches[0]}
+        assert spans["db.get_favorites_page"]["parentId"] == root.span_id
+        assert spans["db.get_favorites_page"]["traceId"] == spans["update"]["traceId"]
+        assert spans["db.get_favorites_page"]["tags"] == {"rows": "3"}
+        assert spans["update"]["tags"] == {"chat": "1"}
+        assert "parentId" not in spans["update"]
+
+    def test_error_tag(self):
+        exporter = ListExporter()
+        tracer = Tracer(1.0, exporter)
+        with pytest.raises(RuntimeError):
+            with tracer.start_trace("update"):
+                raise RuntimeError("boom")
+        assert exporter.batches[0][0]["tags"]["error"] == "boom"
+
+    def test_file_export_and_slow_traces(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(1.0, FileExporter(str(path)))
+        with tracer.start_trace("fast"):
+            pass
+        with tracer.start_trace("slow") as root:
+            with tracer.span("google.search"):
+                pass
+        root_record = [json.loads(line) for line in path.read_text().splitlines()][-1]
+        assert root_record["name"] == "slow"
+        assert root_record["localEndpoint"]["serviceName"] == tracing.SERVICE_NAME
+
+        slow = slow_traces(str(path), min_ms=0)
+        assert len(slow) == 2
+        assert slow_traces(str(path), min_ms=10_000) == []
+        names = {root["name"]: children for _, root, children in slow}
+        assert [name for name, _ in names["slow"]] == ["google.search"]
+
+
+@pytest.mark.asyncio
+class TestAsyncTracing:
+    async def test_spans_in_gathered_tasks(self):
+        exporter = ListExporter()
+        tracer = Tracer(1.0, exporter)
+
+        async def call(name):
+            with tracer.span(name):
+                await asyncio.sleep(0.01)
+
+        with tracer.start_trace("update") as root:
+            await asyncio.gather(call("search.google"), call("search.openlibrary"))
+
+        spans = exporter.batches[0]
+        assert len(spans) == 3
+        assert {span.get("parentId") for span in spans if span["name"] != "update"} == {root.span_id}
+
+    async def test_dispatch_root_span(self, monkeypatch):
+        exporter = ListExporter()
+        monkeypatch.setattr(tracing, "TRACER", Tracer(1.0, exporter))
+        processor = ChatOrderedUpdateProcessor(2)
+        await processor.initialize()
+        update = MagicMock()
+        update.effective_chat.id = 7
+        update.update_id = 100
+
+        async def handle():
+            with tracing.span("handler.search"):
+                pass
+
+        await processor.process_update(update, handle())
+        spans = {span["name"]: span for span in exporter.batches[0]}
+        assert spans["update"]["tags"]["chat"] == "7"
+        assert "queued_ms" in spans["update"]["tags"]
+        assert spans["handler.search"]["parentId"] == spans["update"]["id"]
+
+    async def test_file_export_off_loop(self, tmp_path):
+        path = tmp_path / "traces.jsonl"
+        tracer = Tracer(1.0, FileExporter(str(path)))
+
+        for name in ("first", "second"):
+            with tracer.start_trace(name):
+                pass
+        # В цикле событий export не пишет в файл сам: запись уходит в пул потоков
+        assert not path.exists()
+        await tracer.close()
+        assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["first", "second"]
+
+    async def test_zipkin_close(self):
+        exporter = ZipkinExporter("http://127.0.0.1:9/api/v2/spans")
+        tracer = Tracer(1.0, exporter)
+        with tracer.start_trace("update"):
+            pass
+        await tracer.close()
+        # Отправка завершена (с ошибкой соединения), своя сессия закрыта
+        assert not exporter._tasks
+        assert exporter.http is None
@@ -0,0 +1,99 @@
+import pytest
+import pytest_asyncio
+import asyncio
+from unittest.mock import MagicMock
+from aiohttp.test_utils import TestServer, TestClient
+from telegram import Update
+from app.src.webhook import WebhookServer, SECRET_HEADER
+from app.src.shared import MemoryBackend, ShardedIngress, queue_name, shard_for
+
+# Записанное обновление Telegram с текстовым сообщением
+RECORDED_UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 42,
+        "date": 1718000000,
+        "chat": {"id": 123, "type": "private", "first_name": "Test"},
+        "from": {"id": 123, "is_bot": False, "first_name": "Test"},
+        "text": "Гарри Поттер"
+    }
+}
+
+
+@pytest.fixture
+def application():
+    application = MagicMock()
+    application.bot = None
+    application.update_queue = asyncio.Queue()
+    return application
+
+
+@pytest_asyncio.fixture
+async def client(application):
+    server = WebhookServer(application, secret_token="secret", path="/telegram")
+    client = TestClient(TestServer(server.make_app()))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+class TestWebhookServer:
+    async def test_update_is_queued(self, client, application):
+        response = await client.post("/telegram", json=RECORDED_UPDATE, headers={SECRET_HEADER: "secret"})
+        assert response.status == 200
+
+        update = application.update_queue.get_nowait()
+        assert isinstance(update, Update)
+        assert update.update_id == 10001
+        assert update.message.text == "Гарри Поттер"
+
+    async def test_wrong_secret_rejected(self, client, application):
+        response = await client.post("/telegram", json=RECORDED_UPDATE, headers={SECRET_HEADER: "wrong"})
+        assert response.status == 403
+        response = await client.post("/telegram", json=RECORDED_UPDATE)
+        assert response.status == 403
+        assert application.update_queue.empty()
+
+    async def test_invalid_body(self, client, application):
+        response = await client.post("/telegram", data="not json", headers={SECRET_HEADER: "secret"})
+        assert response.status == 400
+        assert application.update_queue.empty()
+
+    async def test_health(self, client, application):
+        await application.update_queue.put(object())
+        response = await client.get("/healthz")
+        assert response.status == 200
+        assert await response.json() == {"status": "ok", "queue": 1}
+
+
+@pytest.mark.asyncio
+async def test_ingress_mode_routes_to_worker_queue():
+    backend = MemoryBackend()
+    server = WebhookServer(secret_token="secret", ingress=ShardedIngress(backend, workers=2))
+    client = TestClient(TestServer(server.make_app()))
+    await client.start_server()
+    try:
+        response = await client.post("/telegram", json=RECORDED_UPDATE, headers={SECRET_HEADER: "secret"})
+        assert response.status == 200
+        shard = shard_for(123, 2)
+        assert await backend.pop(queue_name(shard), timeout=0.01) == RECORDED_UPDATE
+
+        response = await client.get("/healthz")
+        assert (await response.json())["routed"][shard] == 1
+    finally:
+        await client.close()
+
+
+def test_secret_required(application):
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        WebhookServer(application, secret_token=None)
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        WebhookServer(secret_token="", ingress=MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_metrics_not_on_public_port(client):
+    # Метрики отдаёт MetricsServer на внутреннем порту, а не порт webhook
+    response = await client.get("/metrics")
+    assert response.status == 404